@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+History lookup benchmark
+
+Grows a scratch chat_history.db step by step and times
+ChatDatabase.get_session_history for one fixed-size session at every
+step, once through the session index and once with the index disabled.
+The indexed column should stay flat while the scan column grows with
+the table.
+
+    python benchmarks/bench_history.py --sizes 10000,100000,1000000
+    python benchmarks/bench_history.py --json history.json
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from common import write_json
+
+from chat_app.database import ChatDatabase
+from chat_app.database.chat_db import SESSION_HISTORY_SQL
+
+SCAN_HISTORY_SQL = SESSION_HISTORY_SQL.replace("FROM chat_messages", "FROM chat_messages NOT INDEXED")
+
+
+def fill(db: ChatDatabase, rows: int, session_size: int) -> None:
+    """Append `rows` messages spread over sessions of `session_size` messages"""
+    written = 0
+    while written < rows:
+        session_id = db.create_session("server", "127.0.0.1", 65432)
+        count = min(session_size, rows - written)
+        db.save_messages((session_id, "Peer", f"message {written + i} of the benchmark", "received")
+                         for i in range(count))
+        written += count
+
+
+def time_query(db: ChatDatabase, sql: str, session_id: int, repeats: int) -> float:
+    """Median wall time of one query in milliseconds"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        db._query(sql, (session_id,))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(sizes, session_size: int, repeats: int, db_file: str) -> list:
+    db = ChatDatabase(db_file)
+    probe_session = db.create_session("server", "127.0.0.1", 65432)
+    db.save_messages((probe_session, "Peer", f"probe {i}", "received") for i in range(session_size))
+
+    results = []
+    total = session_size
+    for size in sorted(sizes):
+        if size > total:
+            fill(db, size - total, session_size)
+            total = size
+        results.append({
+            "rows": total,
+            "indexed_ms": time_query(db, SESSION_HISTORY_SQL, probe_session, repeats),
+            "scan_ms": time_query(db, SCAN_HISTORY_SQL, probe_session, max(1, repeats // 5)),
+        })
+    db.close()
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="comma separated total message counts to measure at")
+    parser.add_argument("--session-size", type=int, default=200, help="messages per session")
+    parser.add_argument("--repeats", type=int, default=50, help="timed runs per measurement")
+    parser.add_argument("--db", help="database file (default: temporary file)")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db or os.path.join(tmp, "bench_history.db")
+        results = run(sizes, args.session_size, args.repeats, db_file)
+
+    parameters = {key: value for key, value in vars(args).items() if key != "json"}
+    write_json("history", parameters, results, args.json)
+    if args.json == "-":
+        return
+    print(f"{'rows':>12} {'indexed ms':>12} {'scan ms':>12}")
+    for row in results:
+        print(f"{row['rows']:>12,} {row['indexed_ms']:>12.3f} {row['scan_ms']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark
+
+Starts a headless server (python -m chat_app serve) in a child process,
+connects many simulated clients to it from a single selectors loop and
+sends messages at a fixed rate from some of them. Every message carries
+its send time; a handful of observer clients decrypt what they receive
+and record the end-to-end latency, while the rest only count frames.
+
+Reports messages sent and delivered per second and p50/p99/p999 latency.
+
+    python benchmarks/bench_load.py --clients 2000 --rate 500 --duration 10
+    python benchmarks/bench_load.py --backend asyncio --json load.json
+    python benchmarks/bench_load.py --workers 4 --clients 4000
+"""
+
+import argparse
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, percentiles, write_json
+
+from chat_app.network.protocol import FrameDecoder, KIND_MESSAGE, iter_message_frames
+from chat_app.utils.crypto import XorCipher
+
+KEY = "bench_key_123"
+
+
+class SimClient:
+    __slots__ = ('sock', 'decoder', 'outbuf', 'observer', 'writing')
+
+    def __init__(self, sock: socket.socket, observer: bool):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.outbuf = bytearray()
+        self.observer = observer
+        self.writing = False
+
+
+def start_server(port: int, backend: str, workers: int, db_file: str = None) -> subprocess.Popen:
+    command = [sys.executable, "-m", "chat_app", "serve", "--host", "127.0.0.1", "--port", str(port),
+               "--key", KEY, "--backend", backend, "--workers", str(workers), "--log-file", os.devnull]
+    command += ["--db", db_file] if db_file else ["--no-db"]
+    server = subprocess.Popen(command, cwd=ROOT)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.02)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def connect_clients(port: int, count: int, observers: int):
+    clients = []
+    for index in range(count):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        clients.append(SimClient(sock, index < observers))
+    return clients
+
+
+def run(clients_count: int, senders: int, observers: int, rate: float, duration: float,
+        size: int, port: int, backend: str, workers: int, persist: bool) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(port, backend, workers, os.path.join(tmp, "load.db") if persist else None)
+        try:
+            return _drive(clients_count, senders, observers, rate, duration, size, port)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def _drive(clients_count, senders, observers, rate, duration, size, port) -> dict:
+    cipher = XorCipher(KEY)
+    clients = connect_clients(port, clients_count, observers)
+    # Senders are taken from the end so observers hear every sender
+    sending = clients[-senders:]
+    selector = selectors.DefaultSelector()
+    for client in clients:
+        selector.register(client.sock, selectors.EVENT_READ, client)
+    time.sleep(0.5)  # let the server register every connection
+
+    latencies = []
+    delivered = 0
+    sent = 0
+    padding = "x" * max(0, size - 32)
+
+    def send(client: SimClient, data: bytes) -> None:
+        if not client.outbuf:
+            try:
+                done = client.sock.send(data)
+            except BlockingIOError:
+                done = 0
+            if done == len(data):
+                return
+            data = data[done:]
+        client.outbuf += data
+        if not client.writing:
+            client.writing = True
+            selector.modify(client.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    def service(timeout: float) -> None:
+        nonlocal delivered
+        for key, mask in selector.select(timeout):
+            client = key.data
+            if mask & selectors.EVENT_WRITE:
+                done = client.sock.send(client.outbuf)
+                del client.outbuf[:done]
+                if not client.outbuf:
+                    client.writing = False
+                    selector.modify(client.sock, selectors.EVENT_READ, client)
+            if mask & selectors.EVENT_READ:
+                try:
+                    data = client.sock.recv(262144)
+                except BlockingIOError:
+                    continue
+                now = time.perf_counter_ns()
+                for frame in client.decoder.feed(data):
+                    if frame.kind != KIND_MESSAGE:
+                        continue
+                    delivered += 1
+                    if client.observer:
+                        sent_at = int(cipher.decrypt(frame.payload).split(" ", 2)[1])
+                        latencies.append((now - sent_at) / 1e6)
+
+    start = time.perf_counter()
+    interval = 1.0 / rate
+    next_send = start
+    while True:
+        now = time.perf_counter()
+        if now - start >= duration:
+            break
+        while next_send <= now:
+            text = f"{sent} {time.perf_counter_ns()} {padding}"
+            send(sending[sent % len(sending)], b"".join(iter_message_frames(cipher, text)))
+            sent += 1
+            next_send += interval
+        service(max(0.0, next_send - time.perf_counter()))
+    send_seconds = time.perf_counter() - start
+
+    # Drain what is still in flight
+    expected = sent * (clients_count - 1)
+    drain_deadline = time.perf_counter() + 10
+    while delivered < expected and time.perf_counter() < drain_deadline:
+        service(0.1)
+    elapsed = time.perf_counter() - start
+
+    for client in clients:
+        client.sock.close()
+    selector.close()
+
+    return {
+        "clients": clients_count,
+        "senders": len(sending),
+        "message_bytes": size,
+        "sent": sent,
+        "delivered": delivered,
+        "expected": expected,
+        "sent_per_s": sent / send_seconds,
+        "delivered_per_s": delivered / elapsed,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000, help="simulated clients")
+    parser.add_argument("--senders", type=int, default=50, help="clients that send messages")
+    parser.add_argument("--observers", type=int, default=10, help="clients that measure latency")
+    parser.add_argument("--rate", type=float, default=200, help="messages sent per second, in total")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to send for")
+    parser.add_argument("--size", type=int, default=100, help="approximate message size in bytes")
+    parser.add_argument("--port", type=int, default=56500)
+    parser.add_argument("--backend", choices=("selectors", "asyncio"), default="selectors")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--persist", action="store_true", help="let the server record messages")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    senders = max(1, min(args.senders, args.clients - args.observers))
+    result = run(args.clients, senders, args.observers, args.rate, args.duration,
+                 args.size, args.port, args.backend, args.workers, args.persist)
+    parameters = {key: value for key, value in vars(args).items() if key != "json"}
+    write_json("load", parameters, [result], args.json)
+
+    if args.json != "-":
+        latency = result["latency_ms"]
+        print(f"sent      {result['sent']:>10,}  ({result['sent_per_s']:,.0f}/s)")
+        print(f"delivered {result['delivered']:>10,}  ({result['delivered_per_s']:,.0f}/s)"
+              f"  of {result['expected']:,} expected")
+        if latency:
+            print(f"latency   p50 {latency['p50']:.2f} ms  p99 {latency['p99']:.2f} ms"
+                  f"  p999 {latency['p999']:.2f} ms  max {latency['max']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the cipher and the database
+
+- cipher: XorCipher encrypt/decrypt and the raw transform, by payload size
+- wire: message encode and decode in each negotiable wire mode (base64
+  or binary, with or without compression), with bytes on the wire
+- writes: ChatDatabase.save_message (one transaction each) and
+  enqueue_message (batched by the MessageWriter) per message
+- queries: history page, full session history, session list and message
+  search, timed as the table grows through --sizes rows
+
+    python benchmarks/bench_micro.py --json micro.json
+    python benchmarks/bench_micro.py --only cipher --only wire
+    python benchmarks/bench_micro.py --sizes 10000,1000000,10000000
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from common import write_json
+from bench_history import fill
+
+from chat_app.database import ChatDatabase
+from chat_app.network.protocol import FrameDecoder, MessageAssembler, iter_message_frames
+from chat_app.utils.crypto import XorCipher
+
+CIPHER_SIZES = (64, 1024, 64 * 1024, 1024 * 1024)
+WIRE_SIZES = (100, 1024, 64 * 1024, 1024 * 1024)
+WIRE_MODES = {
+    "base64": {},
+    "binary": {"binary": True},
+    "base64+zlib": {"compress": True},
+    "binary+zlib": {"binary": True, "compress": True},
+}
+
+
+def timed(func, repeats: int) -> float:
+    """Median wall time of func() in microseconds"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def bench_cipher(repeats: int) -> list:
+    cipher = XorCipher("benchmark_key_123")
+    results = []
+    for size in CIPHER_SIZES:
+        text = "x" * size
+        data = text.encode()
+        encrypted = cipher.encrypt(text)
+        cipher.transform(data)  # warm the keystream cache and the NumPy import
+        count = max(5, min(repeats, (16 * 1024 * 1024) // size))
+        for op, func in (("encrypt", lambda: cipher.encrypt(text)),
+                         ("decrypt", lambda: cipher.decrypt(encrypted)),
+                         ("transform", lambda: cipher.transform(data))):
+            micros = timed(func, count)
+            results.append({"op": op, "bytes": size, "us": micros, "mb_per_s": size / micros})
+    return results
+
+
+def sample_text(size: int) -> str:
+    """Chat-like text: log lines with varying numbers"""
+    lines = []
+    length = 0
+    while length < size:
+        line = f"2025-01-01T12:{len(lines) % 60:02d}:00Z INFO request {len(lines) * 7919} served in {len(lines) % 97} ms\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)[:size]
+
+
+def bench_wire(repeats: int) -> list:
+    cipher = XorCipher("benchmark_key_123")
+    results = []
+    for size in WIRE_SIZES:
+        text = sample_text(size)
+        count = max(5, min(repeats, (16 * 1024 * 1024) // size))
+        for mode, options in WIRE_MODES.items():
+            frames = b"".join(iter_message_frames(cipher, text, **options))
+
+            def decode():
+                assembler = MessageAssembler(cipher)
+                for frame in FrameDecoder().feed(frames):
+                    assembler.feed(frame)
+
+            results.append({
+                "mode": mode,
+                "bytes": size,
+                "wire_bytes": len(frames),
+                "encode_us": timed(lambda: b"".join(iter_message_frames(cipher, text, **options)), count),
+                "decode_us": timed(decode, count),
+            })
+    return results
+
+
+def bench_writes(db_file: str, count: int) -> list:
+    db = ChatDatabase(db_file)
+    session_id = db.create_session("server", "127.0.0.1", 65432)
+    results = []
+
+    start = time.perf_counter()
+    for i in range(count):
+        db.save_message(session_id, "Peer", f"save {i}", "received")
+    results.append({"op": "save_message", "messages": count,
+                    "us_per_message": (time.perf_counter() - start) * 1e6 / count})
+
+    start = time.perf_counter()
+    for i in range(count):
+        db.enqueue_message(session_id, "Peer", f"enqueue {i}", "received")
+    enqueued = time.perf_counter() - start
+    db.flush()
+    flushed = time.perf_counter() - start
+    results.append({"op": "enqueue_message", "messages": count,
+                    "us_per_message": enqueued * 1e6 / count,
+                    "us_per_message_persisted": flushed * 1e6 / count})
+    db.close()
+    return results
+
+
+def bench_queries(db_file: str, sizes, session_size: int, repeats: int) -> list:
+    db = ChatDatabase(db_file)
+    probe_session = db.create_session("server", "127.0.0.1", 65432)
+    db.save_messages((probe_session, "Peer", f"probe {i}", "received") for i in range(session_size))
+
+    queries = {
+        "history_page": lambda: db.get_session_history_page(probe_session, 500),
+        "session_history": lambda: db.get_session_history(probe_session),
+        "sessions_page": lambda: db.get_sessions_page(100),
+        "search_rare": lambda: db.search_messages_page("probe", 100),
+        "search_common": lambda: db.search_messages_page("benchmark", 100),
+    }
+
+    results = []
+    total = session_size
+    for size in sorted(sizes):
+        if size > total:
+            fill(db, size - total, session_size)
+            total = size
+        for name, query in queries.items():
+            results.append({"op": name, "rows": total, "us": timed(query, repeats)})
+    db.close()
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=("cipher", "wire", "writes", "queries"), action="append",
+                        help="run only these groups (repeatable)")
+    parser.add_argument("--sizes", default="10000,1000000,10000000",
+                        help="comma separated total message counts for the query group")
+    parser.add_argument("--session-size", type=int, default=200, help="messages per session")
+    parser.add_argument("--writes", type=int, default=2000, help="messages written in the write group")
+    parser.add_argument("--repeats", type=int, default=50, help="timed runs per measurement")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    groups = args.only or ["cipher", "wire", "writes", "queries"]
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if "cipher" in groups:
+            results["cipher"] = bench_cipher(args.repeats)
+        if "wire" in groups:
+            results["wire"] = bench_wire(args.repeats)
+        if "writes" in groups:
+            results["writes"] = bench_writes(os.path.join(tmp, "writes.db"), args.writes)
+        if "queries" in groups:
+            results["queries"] = bench_queries(os.path.join(tmp, "queries.db"), sizes,
+                                               args.session_size, args.repeats)
+
+    parameters = {key: value for key, value in vars(args).items() if key != "json"}
+    write_json("micro", parameters, results, args.json)
+    if args.json == "-":
+        return
+
+    for row in results.get("cipher", []):
+        print(f"{row['op']:<10} {row['bytes']:>9,} B {row['us']:>12.1f} us {row['mb_per_s']:>10.1f} MB/s")
+    for row in results.get("wire", []):
+        print(f"{row['mode']:<12} {row['bytes']:>9,} B -> {row['wire_bytes']:>9,} B"
+              f" encode {row['encode_us']:>10.1f} us decode {row['decode_us']:>10.1f} us")
+    for row in results.get("writes", []):
+        print(f"{row['op']:<16} {row['us_per_message']:>8.1f} us/message")
+    for row in results.get("queries", []):
+        print(f"{row['op']:<16} {row['rows']:>12,} rows {row['us']:>12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Shared helpers for the benchmark scripts
+
+Every benchmark can write its results as one JSON document of the form
+
+    {"benchmark": ..., "environment": {...}, "parameters": {...}, "results": [...]}
+
+so runs can be diffed with benchmarks/compare.py.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def environment() -> dict:
+    """Describe the machine and checkout a run was made on"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def percentiles(samples, points=(50, 99, 99.9)) -> dict:
+    """Nearest-rank percentiles of a list of numbers, keyed p50/p99/p999"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {}
+    for point in points:
+        rank = max(0, min(len(ordered) - 1, int(round(point / 100 * len(ordered))) - 1))
+        result["p" + f"{point:g}".replace(".", "")] = ordered[rank]
+    result["max"] = ordered[-1]
+    return result
+
+
+def write_json(name: str, parameters: dict, results, path: str = None) -> dict:
+    """Wrap results in the common document and write it to `path` ('-' for stdout)"""
+    document = {
+        "benchmark": name,
+        "environment": environment(),
+        "parameters": parameters,
+        "results": results,
+    }
+    if path == "-":
+        json.dump(document, sys.stdout, indent=2)
+        print()
+    elif path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    return document
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark JSON files
+
+Matches result rows of the same benchmark by their non-measurement
+fields and prints the change of every timing and rate. Exits with status
+1 if anything regressed by more than --threshold percent, so it can gate
+a CI job.
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+
+# Measurements where a bigger number is better; every other number is a cost
+HIGHER_IS_BETTER = ("_per_s", "mb_per_s", "delivered")
+IDENTITY_FIELDS = ("op", "mode", "rows", "bytes", "messages", "clients", "senders", "message_bytes")
+
+
+def _rows(document):
+    results = document["results"]
+    if isinstance(results, dict):
+        for group, rows in results.items():
+            for row in rows:
+                yield group, row
+    else:
+        for row in results:
+            yield "", row
+
+
+def _metrics(row, prefix=""):
+    for key, value in row.items():
+        if key in IDENTITY_FIELDS:
+            continue
+        if isinstance(value, dict):
+            yield from _metrics(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix + key, value
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> int:
+    def keyed(document):
+        return {(group, tuple((field, row[field]) for field in IDENTITY_FIELDS if field in row)): row
+                for group, row in _rows(document)}
+
+    before, after = keyed(baseline), keyed(candidate)
+    regressions = 0
+    for key, row in after.items():
+        if key not in before:
+            continue
+        old_metrics = dict(_metrics(before[key]))
+        label = " ".join(str(value) for _, value in key[1]) or key[0] or baseline["benchmark"]
+        for metric, new in _metrics(row):
+            old = old_metrics.get(metric)
+            if not old:
+                continue
+            change = (new - old) / old * 100
+            worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+            flag = "REGRESSION" if worse > threshold else ""
+            regressions += bool(flag)
+            print(f"{label:<32} {metric:<28} {old:>14.3f} {new:>14.3f} {change:>+8.1f}% {flag}")
+    return regressions
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    if baseline["benchmark"] != candidate["benchmark"]:
+        parser.error(f"cannot compare {baseline['benchmark']!r} with {candidate['benchmark']!r} results")
+
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"{regressions} regression(s) above {args.threshold:g}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-"""
-Socket Chat Application
-"""
+"""
+Socket Chat Application
+"""
 __version__ = "1.0.0"
\ No newline at end of file
@@ -0,0 +1,188 @@
+# chat_app/cli.py
+"""
+Command line entry point
+
+    python -m chat_app                 start the GUI (default)
+    python -m chat_app serve --port N  run a headless relay server
+
+The serve command only imports the network, crypto and database layers,
+so it needs no display and never loads Tkinter.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+import threading
+from typing import List, Optional
+
+DEFAULT_KEY = "default_key_123"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="chat_app", description="Socket chat application")
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("gui", help="start the graphical client/server (default)")
+
+    serve = commands.add_parser("serve", help="run a headless relay server")
+    serve.add_argument("--host", default="0.0.0.0", help="address to listen on (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=65432, help="port to listen on (default: %(default)s)")
+    serve.add_argument("--key", default=os.environ.get("CHAT_APP_KEY", DEFAULT_KEY),
+                       help="encryption key (default: $CHAT_APP_KEY or the built-in key)")
+    serve.add_argument("--db", default="chat_history.db", help="history database file (default: %(default)s)")
+    serve.add_argument("--no-db", action="store_true", help="do not record the session")
+    serve.add_argument("--log-file", help="append the log here instead of stdout")
+    serve.add_argument("--metrics-port", type=int,
+                       help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics "
+                            "(worker N of a cluster uses PORT+N)")
+    serve.add_argument("--backend", choices=("selectors", "asyncio"), default="selectors",
+                       help="network implementation (default: %(default)s)")
+    serve.add_argument("--workers", type=int, default=1,
+                       help="worker processes sharing the port via SO_REUSEPORT (default: %(default)s)")
+    serve.add_argument("--queue-limit", type=int, default=4 * 1024 * 1024, metavar="BYTES",
+                       help="most bytes queued for one client (default: %(default)s; 0 for no limit)")
+    serve.add_argument("--overflow", choices=("drop_oldest", "disconnect", "backpressure"), default="drop_oldest",
+                       help="what to do when a client's queue is full (default: %(default)s)")
+    serve.add_argument("--federate", action="store_true", help="accept links from other server nodes")
+    serve.add_argument("--peer", action="append", default=[], type=_address, metavar="HOST:PORT",
+                       help="link to another server node (repeatable; implies --federate)")
+    return parser
+
+
+def _address(value: str):
+    host, _, port = value.rpartition(":")
+    if not host or not port.isdigit():
+        raise argparse.ArgumentTypeError(f"expected HOST:PORT, got {value!r}")
+    return host, int(port)
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Run the relay server until interrupted"""
+    if args.workers > 1:
+        from .network.cluster import run_cluster
+        from .utils import DualOutput
+
+        # The hub logs where the workers do
+        log_stream = open(args.log_file, "a", encoding="utf-8") if args.log_file else sys.stdout
+        try:
+            return run_cluster(args.workers, lambda index, link: _run_server(args, link, index),
+                               max_queue_bytes=args.queue_limit, overflow=args.overflow,
+                               logger=DualOutput(None, stream=log_stream))
+        finally:
+            if log_stream is not sys.stdout:
+                log_stream.close()
+    return _run_server(args)
+
+
+def _run_server(args: argparse.Namespace, link: Optional[socket.socket] = None, index: int = 0) -> int:
+    """Run one server process; `link` connects cluster worker `index` to the others"""
+    if args.metrics_port:
+        from .utils.metrics import start_http_server
+        start_http_server(args.metrics_port + index)
+
+    from .network import AsyncChatServer, ChatServer, FederatedServer
+    from .utils import DualOutput, get_cipher, set_global_key
+
+    log_stream = open(args.log_file, "a", encoding="utf-8") if args.log_file else sys.stdout
+    db_manager = None
+    session_id = None
+    if not args.no_db:
+        from .database import ChatDatabase
+        db_manager = ChatDatabase(args.db)
+        session_id = db_manager.create_session("server", args.host, args.port)
+
+    def replay_source(after, before):
+        # Messages older than the server's replay buffer, for reconnecting clients
+        return db_manager.get_messages_by_seq(session_id, after, before)
+
+    set_global_key(args.key)
+    logger = DualOutput(None, db_manager, session_id, stream=log_stream)
+    stopped = threading.Event()
+
+    def on_connect(addr):
+        logger.output(f"Clients connected: {server.client_count}")
+
+    def on_disconnect():
+        logger.output(f"Clients connected: {server.client_count}")
+
+    if args.backend == "asyncio":
+        server = AsyncChatServer(args.host, args.port, logger,
+                                 on_connect=on_connect,
+                                 on_disconnect=on_disconnect,
+                                 on_receive=lambda msg: None,
+                                 cipher=get_cipher(),
+                                 max_queue_bytes=args.queue_limit,
+                                 overflow=args.overflow)
+    elif args.federate or args.peer:
+        server = FederatedServer(args.host, args.port, logger,
+                                 on_connect=on_connect,
+                                 on_disconnect=on_disconnect,
+                                 on_receive=lambda msg: None,
+                                 cipher=get_cipher(),
+                                 peers=args.peer,
+                                 max_queue_bytes=args.queue_limit,
+                                 overflow=args.overflow,
+                                 replay_source=replay_source if db_manager else None)
+    else:
+        server = ChatServer(args.host, args.port, logger,
+                            on_connect=on_connect,
+                            on_disconnect=on_disconnect,
+                            on_receive=lambda msg: None,
+                            cipher=get_cipher(),
+                            reuse_port=link is not None,
+                            max_queue_bytes=args.queue_limit,
+                            overflow=args.overflow,
+                            replay_source=replay_source if db_manager else None)
+        if link is not None:
+            server.add_link(link)
+
+    try:
+        if args.backend == "asyncio":
+            return asyncio.run(_serve_async(server, logger))
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopped.set())
+        if not server.start():
+            return 1
+        stopped.wait()
+        logger.output("Shutting down")
+        server.stop()
+        return 0
+    finally:
+        if db_manager:
+            db_manager.end_session(session_id)
+            db_manager.close()
+        if log_stream is not sys.stdout:
+            log_stream.close()
+
+
+async def _serve_async(server, logger) -> int:
+    """Run an AsyncChatServer on this thread's event loop until signalled"""
+    if not await server.start():
+        return 1
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+    await stopped.wait()
+    logger.output("Shutting down")
+    await server.stop()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        if args.workers > 1 and args.backend != "selectors":
+            parser.error("--workers needs the selectors backend")
+        if (args.federate or args.peer) and (args.workers > 1 or args.backend != "selectors"):
+            parser.error("--federate and --peer need a single selectors-backend process")
+        return serve(args)
+
+    from .main import main as gui_main
+    gui_main()
+    return 0
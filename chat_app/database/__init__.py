@@ -1,4 +1,5 @@
-# chat_app/database/__init__.py
-from .chat_db import ChatDatabase
-
-__all__ = ['ChatDatabase']
\ No newline at end of file
+# chat_app/database/__init__.py
+from .chat_db import ChatDatabase
+from .message_writer import MessageWriter
+
+__all__ = ['ChatDatabase', 'MessageWriter']
\ No newline at end of file
@@ -1,137 +1,528 @@
-# chat_app/database/chat_db.py
-import sqlite3
-import os
-from datetime import datetime
-from typing import List, Tuple, Optional
-
-class ChatDatabase:
-    """SQLite database manager for chat history"""
-    
-    def __init__(self, db_file: str = "chat_history.db"):
-        self.db_file = db_file
-        self.init_database()
-        
-    def init_database(self) -> None:
-        """Initialize database tables"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        # Create sessions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_type TEXT NOT NULL,
-                host TEXT,
-                port INTEGER,
-                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ended_at TIMESTAMP,
-                status TEXT DEFAULT 'active'
-            )
-        ''')
-        
-        # Create messages table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                sender TEXT NOT NULL,
-                message TEXT NOT NULL,
-                msg_type TEXT NOT NULL,
-                FOREIGN KEY (session_id) REFERENCES chat_sessions(id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-    def create_session(self, session_type: str, host: str, port: int) -> int:
-        """Create new chat session"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO chat_sessions (session_type, host, port, status)
-            VALUES (?, ?, ?, 'active')
-        ''', (session_type, host, port))
-        session_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return session_id
-        
-    def end_session(self, session_id: int) -> None:
-        """Mark session as ended"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE chat_sessions 
-            SET ended_at = CURRENT_TIMESTAMP, status = 'ended'
-            WHERE id = ?
-        ''', (session_id,))
-        conn.commit()
-        conn.close()
-        
-    def save_message(self, session_id: int, sender: str, message: str, msg_type: str) -> None:
-        """Save message to database"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO chat_messages (session_id, sender, message, msg_type)
-            VALUES (?, ?, ?, ?)
-        ''', (session_id, sender, message, msg_type))
-        conn.commit()
-        conn.close()
-        
-    def get_session_history(self, session_id: int) -> List[Tuple]:
-        """Get all messages from a session"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT timestamp, sender, message, msg_type 
-            FROM chat_messages 
-            WHERE session_id = ?
-            ORDER BY timestamp ASC
-        ''', (session_id,))
-        results = cursor.fetchall()
-        conn.close()
-        return results
-        
-    def get_all_sessions(self) -> List[Tuple]:
-        """Get all chat sessions"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, session_type, host, port, started_at, ended_at, status
-            FROM chat_sessions
-            ORDER BY started_at DESC
-        ''')
-        results = cursor.fetchall()
-        conn.close()
-        return results
-        
-    def search_messages(self, keyword: str) -> List[Tuple]:
-        """Search messages by keyword"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT m.timestamp, m.sender, m.message, m.msg_type, s.session_type
-            FROM chat_messages m
-            JOIN chat_sessions s ON m.session_id = s.id
-            WHERE m.message LIKE ?
-            ORDER BY m.timestamp DESC
-        ''', (f'%{keyword}%',))
-        results = cursor.fetchall()
-        conn.close()
-        return results
-        
-    def delete_session(self, session_id: int) -> None:
-        """Delete a session and its messages"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM chat_messages WHERE session_id = ?', (session_id,))
-        cursor.execute('DELETE FROM chat_sessions WHERE id = ?', (session_id,))
-        conn.commit()
-        conn.close()
-        
-    def get_db_path(self) -> str:
-        """Get absolute path to database file"""
-        return os.path.abspath(self.db_file)
\ No newline at end of file
+# chat_app/database/chat_db.py
+import sqlite3
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
+from .message_writer import MessageWriter
+from .migrations import migrate
+from ..utils.metrics import REGISTRY
+
+_save_time = REGISTRY.histogram("chat_db_save_message_seconds", "ChatDatabase.save_message duration")
+
+# Statements are kept as module constants so sqlite3's per-connection
+# statement cache sees identical SQL text and reuses the prepared statement.
+INSERT_SESSION_SQL = '''
+    INSERT INTO chat_sessions (session_type, host, port, status)
+    VALUES (?, ?, ?, 'active')
+'''
+
+END_SESSION_SQL = '''
+    UPDATE chat_sessions
+    SET ended_at = CURRENT_TIMESTAMP, status = 'ended'
+    WHERE id = ?
+'''
+
+INSERT_MESSAGE_SQL = '''
+    INSERT INTO chat_messages (session_id, sender, message, msg_type, seq)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+MESSAGES_BY_SEQ_SQL = '''
+    SELECT seq, message
+    FROM chat_messages
+    WHERE session_id = ? AND seq > ? AND seq < ?
+    ORDER BY seq
+    LIMIT ?
+'''
+
+SESSION_HISTORY_SQL = '''
+    SELECT timestamp, sender, message, msg_type
+    FROM chat_messages
+    WHERE session_id = ?
+    ORDER BY timestamp ASC
+'''
+
+ALL_SESSIONS_SQL = '''
+    SELECT id, session_type, host, port, started_at, ended_at, status
+    FROM chat_sessions
+    ORDER BY started_at DESC
+'''
+
+SEARCH_MESSAGES_SQL = '''
+    SELECT m.timestamp, m.sender, m.message, m.msg_type, s.session_type
+    FROM chat_messages m
+    JOIN chat_sessions s ON m.session_id = s.id
+    WHERE m.message LIKE ?
+    ORDER BY m.timestamp DESC
+'''
+
+FTS_SEARCH_SQL = '''
+    SELECT m.timestamp, m.sender, m.message, m.msg_type, s.session_type
+    FROM chat_messages_fts f
+    JOIN chat_messages m ON m.id = f.rowid
+    JOIN chat_sessions s ON m.session_id = s.id
+    WHERE chat_messages_fts MATCH ?
+    ORDER BY f.rank
+'''
+
+FTS_SNIPPET_SEARCH_SQL = '''
+    SELECT m.timestamp, m.sender,
+           snippet(chat_messages_fts, 0, char(2), char(3), '…', 16),
+           m.msg_type, s.session_type
+    FROM chat_messages_fts f
+    JOIN chat_messages m ON m.id = f.rowid
+    JOIN chat_sessions s ON m.session_id = s.id
+    WHERE chat_messages_fts MATCH ?
+    ORDER BY f.rank
+'''
+
+# Keyset pagination: pages continue from the (sort key, id) of the last
+# row seen, so every page is an index range scan however deep it is.
+HISTORY_PAGE_FIRST_SQL = '''
+    SELECT id, timestamp, sender, message, msg_type
+    FROM chat_messages
+    WHERE session_id = ?
+    ORDER BY timestamp ASC, id ASC
+    LIMIT ?
+'''
+
+HISTORY_PAGE_AFTER_SQL = '''
+    SELECT id, timestamp, sender, message, msg_type
+    FROM chat_messages
+    WHERE session_id = ?
+      AND (timestamp, id) > (SELECT timestamp, id FROM chat_messages WHERE id = ?)
+    ORDER BY timestamp ASC, id ASC
+    LIMIT ?
+'''
+
+HISTORY_PAGE_LAST_SQL = '''
+    SELECT id, timestamp, sender, message, msg_type
+    FROM chat_messages
+    WHERE session_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+HISTORY_PAGE_BEFORE_SQL = '''
+    SELECT id, timestamp, sender, message, msg_type
+    FROM chat_messages
+    WHERE session_id = ?
+      AND (timestamp, id) < (SELECT timestamp, id FROM chat_messages WHERE id = ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+SESSIONS_PAGE_FIRST_SQL = '''
+    SELECT id, session_type, host, port, started_at, ended_at, status
+    FROM chat_sessions
+    ORDER BY started_at DESC, id DESC
+    LIMIT ?
+'''
+
+SESSIONS_PAGE_BEFORE_SQL = '''
+    SELECT id, session_type, host, port, started_at, ended_at, status
+    FROM chat_sessions
+    WHERE (started_at, id) < (?, ?)
+    ORDER BY started_at DESC, id DESC
+    LIMIT ?
+'''
+
+SEARCH_PAGE_SQL = '''
+    SELECT m.id, m.timestamp, m.sender, m.message, m.msg_type, s.session_type
+    FROM chat_messages m
+    JOIN chat_sessions s ON m.session_id = s.id
+    WHERE m.message LIKE ? AND m.id < ?
+    ORDER BY m.id DESC
+    LIMIT ?
+'''
+
+FTS_SEARCH_PAGE_SQL = '''
+    SELECT m.id, m.timestamp, m.sender, m.message, m.msg_type, s.session_type
+    FROM chat_messages_fts f
+    JOIN chat_messages m ON m.id = f.rowid
+    JOIN chat_sessions s ON m.session_id = s.id
+    WHERE chat_messages_fts MATCH ? AND f.rowid < ?
+    ORDER BY f.rowid DESC
+    LIMIT ?
+'''
+
+FTS_SNIPPET_SEARCH_PAGE_SQL = '''
+    SELECT m.id, m.timestamp, m.sender,
+           snippet(chat_messages_fts, 0, char(2), char(3), '…', 16),
+           m.msg_type, s.session_type
+    FROM chat_messages_fts f
+    JOIN chat_messages m ON m.id = f.rowid
+    JOIN chat_sessions s ON m.session_id = s.id
+    WHERE chat_messages_fts MATCH ? AND f.rowid < ?
+    ORDER BY f.rowid DESC
+    LIMIT ?
+'''
+
+# Ranked pages continue from the (rank, rowid) of the last row seen; rank
+# is trailing so the caller can take the cursor from the last row
+FTS_RANKED_PAGE_SQL = '''
+    SELECT m.id, m.timestamp, m.sender, {message}, m.msg_type, s.session_type, f.rank
+    FROM chat_messages_fts f
+    JOIN chat_messages m ON m.id = f.rowid
+    JOIN chat_sessions s ON m.session_id = s.id
+    WHERE chat_messages_fts MATCH ?{after}
+    ORDER BY f.rank, f.rowid
+    LIMIT ?
+'''
+_SNIPPET_COLUMN = "snippet(chat_messages_fts, 0, char(2), char(3), '…', 16)"
+_AFTER_RANK = ' AND (f.rank, f.rowid) > (?, ?)'
+
+FTS_RANKED_FIRST_SQL = FTS_RANKED_PAGE_SQL.format(message='m.message', after='')
+FTS_RANKED_AFTER_SQL = FTS_RANKED_PAGE_SQL.format(message='m.message', after=_AFTER_RANK)
+FTS_SNIPPET_RANKED_FIRST_SQL = FTS_RANKED_PAGE_SQL.format(message=_SNIPPET_COLUMN, after='')
+FTS_SNIPPET_RANKED_AFTER_SQL = FTS_RANKED_PAGE_SQL.format(message=_SNIPPET_COLUMN, after=_AFTER_RANK)
+
+DELETE_SESSION_MESSAGES_SQL = 'DELETE FROM chat_messages WHERE session_id = ?'
+DELETE_SESSION_SQL = 'DELETE FROM chat_sessions WHERE id = ?'
+
+MAX_ROWID = 2 ** 63 - 1
+
+# Markers wrapped around matched terms by search_messages(highlight=True)
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+def build_fts_query(keyword: str) -> str:
+    """Translate search box input into an FTS5 MATCH expression
+
+    Words are matched as whole tokens and all must be present; a trailing
+    `*` makes a word a prefix search and "double quoted" text is matched as
+    a phrase. Everything else is quoted so user input cannot inject FTS5
+    operators or cause syntax errors.
+    """
+    terms = []
+    for index, part in enumerate(keyword.split('"')):
+        if index % 2:
+            # Inside double quotes: one phrase
+            if part.strip():
+                terms.append('"' + part.strip() + '"')
+            continue
+        for word in part.split():
+            prefix = word.endswith('*')
+            word = word.rstrip('*')
+            if word:
+                terms.append('"' + word + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+class ChatDatabase:
+    """SQLite database manager for chat history
+
+    Connections are long-lived: a single writer connection serialised by a
+    lock, plus one reader connection per thread, closed again once its
+    thread has exited. The database runs in WAL
+    mode so history reads never block message writes. enqueue_message()
+    hands rows to a background MessageWriter that commits them in batches.
+    """
+
+    CACHE_SIZE_KIB = 8192
+    BUSY_TIMEOUT = 5.0
+    STATEMENT_CACHE_SIZE = 128
+    MAX_READERS = 8
+
+    def __init__(self, db_file: str = "chat_history.db"):
+        self.db_file = db_file
+        self._in_memory = db_file == ":memory:" or db_file.startswith("file::memory:")
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        # thread ident -> (thread, its reader connection)
+        self._readers: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._readers_lock = threading.Lock()
+        self._message_writer: Optional[MessageWriter] = None
+        self._writer = self._connect()
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the tuned pragmas applied"""
+        conn = sqlite3.connect(self.db_file,
+                               timeout=self.BUSY_TIMEOUT,
+                               check_same_thread=False,
+                               cached_statements=self.STATEMENT_CACHE_SIZE)
+        if not self._in_memory:
+            conn.execute('PRAGMA journal_mode=WAL')
+        # In WAL mode NORMAL only syncs at checkpoints, not on every commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{self.CACHE_SIZE_KIB}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        """Get this thread's reader connection, opening it on first use
+
+        Returns None when reads must go through the writer instead: for
+        in-memory databases (each connection would be a separate database)
+        or once the reader pool is full.
+        """
+        conn = getattr(self._local, 'reader', None)
+        if conn is None:
+            if self._in_memory:
+                return None
+            with self._readers_lock:
+                self._prune_readers()
+                if len(self._readers) >= self.MAX_READERS:
+                    return None
+                conn = self._connect()
+                conn.execute('PRAGMA query_only=ON')
+                self._readers[threading.get_ident()] = (threading.current_thread(), conn)
+            self._local.reader = conn
+        return conn
+
+    def _prune_readers(self) -> None:
+        """Close the readers of threads that have exited; needs _readers_lock
+
+        Thread idents are reused, so a new thread may also find its ident
+        still mapped to a dead thread's connection.
+        """
+        for ident, (thread, conn) in list(self._readers.items()):
+            if not thread.is_alive():
+                del self._readers[ident]
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Tuple]:
+        """Run a read-only query and return all rows"""
+        conn = self._reader()
+        if conn is None:
+            with self._write_lock:
+                return self._writer.execute(sql, params).fetchall()
+        return conn.execute(sql, params).fetchall()
+
+    def init_database(self) -> None:
+        """Create or upgrade the schema to the current version"""
+        with self._write_lock:
+            self.schema_version = migrate(self._writer)
+            self.fts_enabled = self._writer.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages_fts'"
+            ).fetchone() is not None
+
+    def create_session(self, session_type: str, host: str, port: int) -> int:
+        """Create new chat session"""
+        with self._write_lock, self._writer as conn:
+            cursor = conn.execute(INSERT_SESSION_SQL, (session_type, host, port))
+            return cursor.lastrowid
+
+    def end_session(self, session_id: int) -> None:
+        """Mark session as ended, durably persisting queued messages first"""
+        self.flush(durable=True)
+        with self._write_lock, self._writer as conn:
+            conn.execute(END_SESSION_SQL, (session_id,))
+
+    def save_message(self, session_id: int, sender: str, message: str, msg_type: str,
+                     seq: Optional[int] = None) -> None:
+        """Save message to database"""
+        start = time.perf_counter_ns()
+        with self._write_lock, self._writer as conn:
+            conn.execute(INSERT_MESSAGE_SQL, (session_id, sender, message, msg_type, seq))
+        _save_time.record(time.perf_counter_ns() - start)
+
+    def save_messages(self, rows: Iterable[Tuple]) -> None:
+        """Save (session_id, sender, message, msg_type[, seq]) rows in one transaction"""
+        rows = (row if len(row) == 5 else (*row, None) for row in rows)
+        with self._write_lock, self._writer as conn:
+            conn.executemany(INSERT_MESSAGE_SQL, rows)
+
+    def enqueue_message(self, session_id: int, sender: str, message: str, msg_type: str,
+                        seq: Optional[int] = None) -> bool:
+        """Queue a message for batched background persistence; False if it was dropped"""
+        writer = self._message_writer
+        if writer is None:
+            with self._write_lock:
+                if self._message_writer is None:
+                    self._message_writer = MessageWriter(self)
+                writer = self._message_writer
+        return writer.enqueue(session_id, sender, message, msg_type, seq)
+
+    def flush(self, durable: bool = False) -> None:
+        """Commit queued messages; durable also checkpoints the WAL to disk"""
+        if self._message_writer:
+            self._message_writer.flush()
+        if durable and not self._in_memory:
+            with self._write_lock:
+                self._writer.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def get_messages_by_seq(self, session_id: int, after_seq: int, before_seq: int,
+                            limit: int = 10000) -> List[Tuple[int, str]]:
+        """(seq, message) rows of a session with after_seq < seq < before_seq, in order"""
+        self.flush()
+        return self._query(MESSAGES_BY_SEQ_SQL, (session_id, after_seq, before_seq, limit))
+
+    def get_session_history(self, session_id: int) -> List[Tuple]:
+        """Get all messages from a session"""
+        return self._query(SESSION_HISTORY_SQL, (session_id,))
+
+    def get_all_sessions(self) -> List[Tuple]:
+        """Get all chat sessions"""
+        return self._query(ALL_SESSIONS_SQL)
+
+    def search_messages(self, keyword: str, highlight: bool = False) -> List[Tuple]:
+        """Search messages by keyword, best matches first
+
+        Uses the FTS5 index when available (see build_fts_query for the
+        syntax). With highlight=True the message column holds a snippet with
+        matches wrapped in HIGHLIGHT_START/HIGHLIGHT_END. Without FTS5 this
+        falls back to a substring LIKE scan, newest first.
+        """
+        if self.fts_enabled:
+            query = build_fts_query(keyword)
+            if query:
+                sql = FTS_SNIPPET_SEARCH_SQL if highlight else FTS_SEARCH_SQL
+                return self._query(sql, (query,))
+        return self._query(SEARCH_MESSAGES_SQL, (f'%{keyword}%',))
+
+    def get_session_history_page(self, session_id: int, page_size: int = 500,
+                                 after_id: Optional[int] = None,
+                                 before_id: Optional[int] = None,
+                                 newest: bool = False) -> Tuple[List[Tuple], Optional[int]]:
+        """Get one page of a session's messages in chronological order
+
+        Rows are (id, timestamp, sender, message, msg_type). Pages start at
+        the oldest message, just after `after_id`, just before `before_id`,
+        or at the newest messages when `newest` is set. The returned cursor
+        is the id to pass as after_id (or before_id when paging backwards)
+        for the next page, or None once the end is reached.
+        """
+        if before_id is not None:
+            rows = self._query(HISTORY_PAGE_BEFORE_SQL, (session_id, before_id, page_size))
+        elif newest:
+            rows = self._query(HISTORY_PAGE_LAST_SQL, (session_id, page_size))
+        elif after_id is not None:
+            rows = self._query(HISTORY_PAGE_AFTER_SQL, (session_id, after_id, page_size))
+        else:
+            rows = self._query(HISTORY_PAGE_FIRST_SQL, (session_id, page_size))
+
+        if before_id is not None or newest:
+            rows.reverse()
+            cursor = rows[0][0] if len(rows) == page_size else None
+        else:
+            cursor = rows[-1][0] if len(rows) == page_size else None
+        return rows, cursor
+
+    def iter_session_history(self, session_id: int, page_size: int = 500) -> Iterator[Tuple]:
+        """Lazily yield a session's (timestamp, sender, message, msg_type) rows"""
+        cursor = None
+        while True:
+            rows, cursor = self.get_session_history_page(session_id, page_size, after_id=cursor)
+            for row in rows:
+                yield row[1:]
+            if cursor is None:
+                return
+
+    def get_sessions_page(self, page_size: int = 100,
+                          before: Optional[Tuple[str, int]] = None) -> Tuple[List[Tuple], Optional[Tuple[str, int]]]:
+        """Get one page of sessions, newest first
+
+        `before` is the (started_at, id) cursor returned by the previous
+        page; the returned cursor is None once all sessions were listed.
+        """
+        if before is None:
+            rows = self._query(SESSIONS_PAGE_FIRST_SQL, (page_size,))
+        else:
+            rows = self._query(SESSIONS_PAGE_BEFORE_SQL, (before[0], before[1], page_size))
+        cursor = (rows[-1][4], rows[-1][0]) if len(rows) == page_size else None
+        return rows, cursor
+
+    def iter_sessions(self, page_size: int = 100) -> Iterator[Tuple]:
+        """Lazily yield every session row, newest first"""
+        cursor = None
+        while True:
+            rows, cursor = self.get_sessions_page(page_size, before=cursor)
+            yield from rows
+            if cursor is None:
+                return
+
+    def search_messages_page(self, keyword: str, page_size: int = 100,
+                             before_id: Optional[int] = None,
+                             highlight: bool = False) -> Tuple[List[Tuple], Optional[int]]:
+        """Get one page of search results, newest first
+
+        Rows are (id, timestamp, sender, message, msg_type, session_type).
+        Pages are keyed on message id rather than rank so that deep pages
+        stay cheap; pass the returned cursor as before_id for the next page.
+        """
+        upper = before_id if before_id is not None else MAX_ROWID
+        query = build_fts_query(keyword) if self.fts_enabled else ''
+        if query:
+            sql = FTS_SNIPPET_SEARCH_PAGE_SQL if highlight else FTS_SEARCH_PAGE_SQL
+            rows = self._query(sql, (query, upper, page_size))
+        else:
+            rows = self._query(SEARCH_PAGE_SQL, (f'%{keyword}%', upper, page_size))
+        cursor = rows[-1][0] if len(rows) == page_size else None
+        return rows, cursor
+
+    def search_messages_ranked_page(self, keyword: str, page_size: int = 100,
+                                    after: Optional[Tuple] = None,
+                                    highlight: bool = False) -> Tuple[List[Tuple], Optional[Tuple]]:
+        """Get one page of search results, best matches first
+
+        Rows are (id, timestamp, sender, message, msg_type, session_type),
+        as from search_messages_page(). Pages are keyed on (rank, id); pass
+        the returned cursor as `after` for the next page. Without FTS5
+        results come newest first, as from search_messages_page().
+        """
+        query = build_fts_query(keyword) if self.fts_enabled else ''
+        if not query:
+            rows, cursor = self.search_messages_page(keyword, page_size, after and after[1], highlight)
+            return rows, (None, cursor) if cursor is not None else None
+
+        if after is None:
+            sql = FTS_SNIPPET_RANKED_FIRST_SQL if highlight else FTS_RANKED_FIRST_SQL
+            rows = self._query(sql, (query, page_size))
+        else:
+            sql = FTS_SNIPPET_RANKED_AFTER_SQL if highlight else FTS_RANKED_AFTER_SQL
+            rows = self._query(sql, (query, after[0], after[1], page_size))
+        cursor = (rows[-1][-1], rows[-1][0]) if len(rows) == page_size else None
+        return [row[:-1] for row in rows], cursor
+
+    def iter_search_results(self, keyword: str, page_size: int = 100,
+                            highlight: bool = False) -> Iterator[Tuple]:
+        """Lazily yield (timestamp, sender, message, msg_type, session_type) matches"""
+        cursor = None
+        while True:
+            rows, cursor = self.search_messages_page(keyword, page_size, cursor, highlight)
+            for row in rows:
+                yield row[1:]
+            if cursor is None:
+                return
+
+    def delete_session(self, session_id: int) -> None:
+        """Delete a session and its messages"""
+        with self._write_lock, self._writer as conn:
+            conn.execute(DELETE_SESSION_MESSAGES_SQL, (session_id,))
+            conn.execute(DELETE_SESSION_SQL, (session_id,))
+
+    def interrupt(self, thread_id: int) -> None:
+        """Abort the query currently running on a thread's reader connection"""
+        with self._readers_lock:
+            reader = self._readers.get(thread_id)
+        if reader is not None and reader[0].is_alive():
+            reader[1].interrupt()
+
+    def get_db_path(self) -> str:
+        """Get absolute path to database file"""
+        return os.path.abspath(self.db_file)
+
+    def close(self) -> None:
+        """Flush queued messages, then close every connection"""
+        if self._message_writer:
+            self._message_writer.close()
+            self._message_writer = None
+        with self._readers_lock:
+            readers, self._readers = list(self._readers.values()), {}
+            # Forget every thread's reader, so later reads open fresh ones
+            self._local = threading.local()
+        for _, conn in readers:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        with self._write_lock:
+            self._writer.close()
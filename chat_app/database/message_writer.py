@@ -0,0 +1,133 @@
+# chat_app/database/message_writer.py
+import atexit
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple
+from ..utils.metrics import REGISTRY
+
+_commit_time = REGISTRY.histogram("chat_db_batch_commit_seconds", "MessageWriter batch commit duration")
+_persisted = REGISTRY.counter("chat_db_messages_persisted_total", "Messages committed by the MessageWriter")
+_dropped = REGISTRY.counter("chat_db_messages_dropped_total", "Messages not queued because the MessageWriter was full")
+_failed = REGISTRY.counter("chat_db_messages_failed_total", "Messages the MessageWriter could not commit")
+_failed_batches = REGISTRY.counter("chat_db_batch_failures_total", "MessageWriter batches retried row by row")
+
+
+class _FlushRequest:
+    """Queue marker: everything enqueued before it must be committed"""
+
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class MessageWriter:
+    """Write-behind stage that persists chat messages in batches
+
+    Producers only append to a bounded queue. A single background thread
+    drains it and commits each batch in one executemany() transaction once
+    `batch_size` rows are waiting or `flush_interval` seconds have passed
+    since the first queued row. enqueue() never blocks, since it runs on
+    network threads: when the queue is full the row is dropped and
+    counted in chat_db_messages_dropped_total rather than growing memory
+    or stalling the event loop on a slow disk.
+
+    A batch that fails to commit is rolled back and retried one row per
+    transaction, so a bad row costs only itself; rows that still fail
+    are counted in chat_db_messages_failed_total.
+    """
+
+    def __init__(self, db, batch_size: int = 256, flush_interval: float = 0.05,
+                 max_queue: int = 10000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="MessageWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        REGISTRY.gauge("chat_db_writer_pending", "Messages queued for the MessageWriter", fn=self._queue.qsize)
+
+    def enqueue(self, session_id: int, sender: str, message: str, msg_type: str,
+                seq: Optional[int] = None) -> bool:
+        """Queue a message for persistence; False if the queue was full and it was dropped"""
+        if self._closed:
+            raise RuntimeError("MessageWriter is closed")
+        try:
+            self._queue.put_nowait((session_id, sender, message, msg_type, seq))
+        except queue.Full:
+            _dropped.inc()
+            return False
+        return True
+
+    @property
+    def pending(self) -> int:
+        """Approximate number of queued, uncommitted rows"""
+        return self._queue.qsize()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every message queued so far is committed"""
+        if self._closed or not self._thread.is_alive():
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self) -> None:
+        """Flush outstanding messages and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _run(self) -> None:
+        batch: List[Tuple] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Batch full, interval elapsed, flush requested or stopping
+            if batch:
+                self._commit(batch)
+                batch = []
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+    def _commit(self, batch: List[Tuple]) -> None:
+        start = time.perf_counter_ns()
+        try:
+            self.db.save_messages(batch)
+        except Exception:
+            # save_messages rolled the batch back; find the rows that fail
+            _failed_batches.inc()
+            for row in batch:
+                try:
+                    self.db.save_messages((row,))
+                except Exception:
+                    _failed.inc()
+                else:
+                    _persisted.inc()
+            return
+        _persisted.inc(len(batch))
+        _commit_time.record(time.perf_counter_ns() - start)
@@ -0,0 +1,159 @@
+# chat_app/database/migrations.py
+"""
+Versioned schema migrations for chat_history.db
+
+The schema version is stored in SQLite's `PRAGMA user_version`. Each
+migration runs once, in order, inside its own transaction together with
+the version bump, so an interrupted upgrade never leaves a database
+half-migrated. The version is re-read after the write lock is taken, so
+processes opening a new database at the same time apply each step only
+once. Append new migrations to MIGRATIONS; never edit or reorder
+ones that have shipped.
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+def _create_base_tables(conn: sqlite3.Connection) -> None:
+    # Databases created before versioning already have these tables
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_type TEXT NOT NULL,
+            host TEXT,
+            port INTEGER,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ended_at TIMESTAMP,
+            status TEXT DEFAULT 'active'
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sender TEXT NOT NULL,
+            message TEXT NOT NULL,
+            msg_type TEXT NOT NULL,
+            FOREIGN KEY (session_id) REFERENCES chat_sessions(id)
+        )
+    ''')
+
+
+def _index_messages_by_session(conn: sqlite3.Connection) -> None:
+    # Serves get_session_history's filter and sort, and delete_session
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_session_timestamp
+        ON chat_messages (session_id, timestamp)
+    ''')
+
+
+def _index_sessions_by_start(conn: sqlite3.Connection) -> None:
+    # Lets get_all_sessions read sessions in order instead of sorting
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_started_at
+        ON chat_sessions (started_at)
+    ''')
+
+
+def _create_fts_index(conn: sqlite3.Connection) -> None:
+    # External-content FTS5 index over chat_messages.message, kept in sync
+    # by triggers. SQLite builds without FTS5 skip it; search uses LIKE.
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts
+            USING fts5(message, content='chat_messages', content_rowid='id')
+        ''')
+    except sqlite3.OperationalError as e:
+        if 'fts5' in str(e):
+            return
+        raise
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts (rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts (chat_messages_fts, rowid, message)
+            VALUES ('delete', old.id, old.message);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF message ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts (chat_messages_fts, rowid, message)
+            VALUES ('delete', old.id, old.message);
+            INSERT INTO chat_messages_fts (rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+    # Backfill messages stored before the index existed
+    conn.execute("INSERT INTO chat_messages_fts (chat_messages_fts) VALUES ('rebuild')")
+
+
+def _add_message_seq(conn: sqlite3.Connection) -> None:
+    # Wire sequence number a server gave a message, so reconnecting
+    # clients can be replayed what they missed; NULL for other rows
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(chat_messages)')}
+    if 'seq' not in columns:
+        conn.execute('ALTER TABLE chat_messages ADD COLUMN seq INTEGER')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_session_seq
+        ON chat_messages (session_id, seq) WHERE seq IS NOT NULL
+    ''')
+
+
+def _cover_session_history(conn: sqlite3.Connection) -> None:
+    # The (session_id, timestamp) index still cost a table lookup per row
+    # for the selected columns. This one holds every column the history
+    # queries read, with id next so (timestamp, id) pages come out in
+    # index order, at the cost of a second copy of each message's text.
+    # It serves delete_session as well, so the narrower index goes.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_session_history
+        ON chat_messages (session_id, timestamp, id, sender, msg_type, message)
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_chat_messages_session_timestamp')
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "base tables", _create_base_tables),
+    (2, "index messages by session and timestamp", _index_messages_by_session),
+    (3, "index sessions by start time", _index_sessions_by_start),
+    (4, "full-text search index", _create_fts_index),
+    (5, "message sequence numbers", _add_message_seq),
+    (6, "covering index for session history", _cover_session_history),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Read the schema version recorded in the database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply all pending migrations and return the resulting schema version"""
+    version = get_schema_version(conn)
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Another process may have migrated while we waited for the lock
+            version = get_schema_version(conn)
+            if target > version:
+                apply(conn)
+                conn.execute(f'PRAGMA user_version = {int(target)}')
+                version = target
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise RuntimeError(f"Migration {target} ({description}) failed: {e}") from e
+
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than "
+                           f"supported version {SCHEMA_VERSION}")
+    return version
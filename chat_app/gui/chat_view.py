@@ -2,24 +2,59 @@
 import tkinter as tk
 import tkinter.font as tkfont
 from tkinter import scrolledtext
+import itertools
 import queue
+import threading
 import time
 from collections import deque
+from ..utils.metrics import REGISTRY
+
+_queue_wait = REGISTRY.histogram("chat_gui_queue_wait_seconds", "Time from queue_message to the Tk thread")
+_render_time = REGISTRY.histogram("chat_gui_render_frame_seconds", "Text insert time per rendered batch")
 
 
 class ChatView:
     """Base chat view component"""
 
-    def __init__(self, root, is_server=False):
+    # Rendering scheduler: lines are drawn in batches once per frame
+    FRAME_MS = 16
+    FRAME_BUDGET_MS = 8.0
+    # Queued lines beyond which the typewriter effect is skipped
+    INSTANT_BACKLOG = 3
+    # Quiet period after which a lone new line is typed out again
+    IDLE_SECONDS = 0.5
+    # Live scrollback: older lines are trimmed in bulk. The most recent
+    # SCROLLBACK_MESSAGES stay in memory and can be shown again; anything
+    # older is in History
+    SCROLLBACK_LINES = 5000
+    SCROLLBACK_SLACK = 500
+    SCROLLBACK_MESSAGES = 20000
+
+    def __init__(self, root, is_server=False, scrollback_lines: int = SCROLLBACK_LINES,
+                 scrollback_messages: int = SCROLLBACK_MESSAGES):
         self.root = root
         self.is_server = is_server
+        self.scrollback_lines = scrollback_lines
         self.message_queue = queue.Queue()
+        self._wakeup_lock = threading.Lock()
+        self._wakeup_pending = False
         self._status_anim_state = False
         self._header_pulse_index = 0
         self._header_pulse_colors = ["#0d1f0d", "#113311", "#153f15", "#113311"]
         self._typewriter_queue = deque()
         self._typing_active = False
         self._typing_delay_ms = 16
+        self._typing_line = None  # (text, tag, next index) while typing
+        self._render_scheduled = False
+        self._lines_per_frame = 50
+        self._last_render = 0.0
+        # Ring buffer of (text, tag, line count) for recent messages; the
+        # oldest `_hidden` of them have been trimmed from the display
+        self._scrollback = deque(maxlen=max(scrollback_messages, scrollback_lines + self.SCROLLBACK_SLACK))
+        self._hidden = 0
+        self._display_lines = 0
+        self._line_limit = scrollback_lines  # raised while earlier messages are shown again
+        self._trimmed_messages = 0  # messages not on screen, in the buffer or not
         self.primary_font, self.secondary_font = self._select_retro_fonts()
 
         # Role-based retro-futuristic palettes
@@ -57,6 +92,11 @@ class ChatView:
         self._icon_image = self._create_window_icon()
         self.root.iconphoto(True, self._icon_image)
 
+        REGISTRY.gauge("chat_gui_message_queue_depth", "Messages waiting for the Tk thread",
+                       fn=self.message_queue.qsize)
+        REGISTRY.gauge("chat_gui_render_backlog", "Lines waiting to be drawn",
+                       fn=lambda: len(self._typewriter_queue))
+
         self.create_widgets()
         self.process_queue()
         self.animate_status()
@@ -164,6 +204,9 @@ class ChatView:
         self.chat_display.tag_configure("sent", foreground=self.colors['sent'], font=(self.secondary_font, 14, 'bold'))
         self.chat_display.tag_configure("system", foreground=self.colors['success'], font=(self.secondary_font, 13, 'italic'))
         self.chat_display.tag_configure("error", foreground=self.colors['danger'], font=(self.secondary_font, 13, 'bold'))
+        self.chat_display.tag_configure("scrollback", foreground=self.colors['muted'], underline=True,
+                                        font=(self.secondary_font, 11, 'italic'))
+        self.chat_display.tag_bind("scrollback", "<Button-1>", lambda e: self.show_earlier())
 
         # Input area
         input_frame = tk.Frame(main_frame, bg=self.colors['bg'])
@@ -230,34 +273,183 @@ class ChatView:
             prefix = f"[{timestamp}] :: "
             body_tag = "system"
 
-        # Queue the entire line as one typewriter payload to avoid interleaving
+        # Queue the entire line as one payload to avoid interleaving
         # prefixes and message bodies when multiple updates arrive quickly.
         self._typewriter_queue.append((f"{prefix}{text}\n", body_tag))
-        if not self._typing_active:
-            self._process_typewriter_queue()
+        self._schedule_render()
+
+    def _schedule_render(self, delay_ms: int = 0):
+        if not self._render_scheduled:
+            self._render_scheduled = True
+            self.root.after(delay_ms, self._render_frame)
+
+    def _render_frame(self):
+        """Draw queued lines for one frame
+
+        When idle, a lone new line is typed out a character per frame.
+        Otherwise as many whole lines as fit in the frame budget go out in
+        a single insert and a single scroll. Once INSTANT_BACKLOG lines are
+        waiting, a line still being typed is completed at once so the
+        display never falls behind.
+        """
+        self._render_scheduled = False
+        queue_ = self._typewriter_queue
+
+        if self._typing_line and len(queue_) < self.INSTANT_BACKLOG:
+            self._type_step()
+            return
+
+        if (not self._typing_line and len(queue_) == 1
+                and time.monotonic() - self._last_render > self.IDLE_SECONDS):
+            text, tag = queue_.popleft()
+            self._trim_scrollback()
+            self._track_lines(text, tag)
+            self._typing_line = (text, tag, 0)
+            self._typing_active = True
+            self._type_step()
+            return
 
-    def _process_typewriter_queue(self):
-        if not self._typewriter_queue:
+        chunks = []
+        if self._typing_line:
+            text, tag, index = self._typing_line
+            chunks += [text[index:], tag]
+            self._typing_line = None
             self._typing_active = False
+        count = min(len(queue_), self._lines_per_frame)
+        for _ in range(count):
+            text, tag = queue_.popleft()
+            self._track_lines(text, tag)
+            chunks += (text, tag)
+
+        started = time.perf_counter()
+        self._insert_chunks(chunks)
+        self._trim_scrollback()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _render_time.record(int(elapsed_ms * 1e6))
+
+        # Adapt the batch size so one frame's insert stays within budget
+        if count and elapsed_ms > 0:
+            estimate = int(count * self.FRAME_BUDGET_MS / elapsed_ms)
+            self._lines_per_frame = max(10, min(5000, estimate))
+        self._last_render = time.monotonic()
+        if queue_:
+            self._schedule_render(self.FRAME_MS)
+
+    def _type_step(self):
+        text, tag, index = self._typing_line
+        # Newlines were never delayed; emit them with the preceding character
+        end = index + 1
+        if end < len(text) and text[end] == "\n":
+            end += 1
+        self._insert_chunks([text[index:end], tag])
+        self._last_render = time.monotonic()
+        if end >= len(text):
+            self._typing_line = None
+            self._typing_active = False
+            if self._typewriter_queue:
+                self._schedule_render(self.FRAME_MS)
+            return
+        self._typing_line = (text, tag, end)
+        self._schedule_render(self._typing_delay_ms)
+
+    def _track_lines(self, text: str, tag: str) -> None:
+        scrollback = self._scrollback
+        if len(scrollback) == scrollback.maxlen:
+            # The oldest message leaves the buffer; take it off screen first
+            if not self._hidden:
+                self._hide_oldest(1, scrollback[0][2])
+            self._hidden -= 1
+        lines = text.count("\n")
+        scrollback.append((text, tag, lines))
+        self._display_lines += lines
+
+    def _trim_scrollback(self) -> None:
+        """Drop the oldest messages once the display exceeds its limit
+
+        Trimming waits for SCROLLBACK_SLACK extra lines so the Text widget
+        is cut in one delete every few hundred lines, not on every insert.
+        Whole messages are removed and replaced by a single marker line.
+        Messages shown again by show_earlier() stay until the view is
+        scrolled back to the end.
+        """
+        if self._line_limit > self.scrollback_lines and self.chat_display.yview()[1] >= 1.0:
+            self._line_limit = self.scrollback_lines
+        if self._display_lines <= self._line_limit + self.SCROLLBACK_SLACK:
             return
+        removed_lines = 0
+        removed_messages = 0
+        for _, _, lines in itertools.islice(self._scrollback, self._hidden, None):
+            if self._display_lines - removed_lines <= self._line_limit:
+                break
+            removed_lines += lines
+            removed_messages += 1
+        if removed_messages:
+            self._hide_oldest(removed_messages, removed_lines)
+
+    def _hide_oldest(self, messages: int, lines: int) -> None:
+        """Delete the oldest `messages` on screen, `lines` lines in all"""
+        # Line 1 is the marker once anything has been trimmed
+        first = 2 if self._trimmed_messages else 1
+        self._hidden += messages
+        self._trimmed_messages += messages
+        self._display_lines -= lines
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.delete(f"{first}.0", f"{first + lines}.0")
+        self._update_marker(replace=first == 2)
+        self.chat_display.config(state=tk.DISABLED)
 
-        self._typing_active = True
-        text, tag = self._typewriter_queue.popleft()
-        self._type_next_character(text, tag, 0)
+    def show_earlier(self) -> None:
+        """Show trimmed messages again, a page at a time, from the buffer
 
-    def _type_next_character(self, text: str, tag: str, index: int):
-        if index >= len(text):
-            self._typing_active = False
-            self._process_typewriter_queue()
+        Once the buffer has none left, History (when the window has one)
+        opens on the session instead.
+        """
+        if not self._hidden:
+            if hasattr(self, 'open_history'):
+                self.open_history()
             return
+        chunks = []
+        lines = 0
+        count = 0
+        while count < self._hidden and lines < self.SCROLLBACK_SLACK:
+            text, tag, line_count = self._scrollback[self._hidden - 1 - count]
+            chunks[:0] = (text, tag)
+            lines += line_count
+            count += 1
+        self._hidden -= count
+        self._trimmed_messages -= count
+        self._display_lines += lines
+        # Keep them on screen while they are being read
+        self._line_limit = max(self._line_limit, self._display_lines)
 
         self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.insert(tk.END, text[index], tag)
-        self.chat_display.see(tk.END)
+        self.chat_display.insert("2.0", *chunks)
+        self._update_marker(replace=True)
         self.chat_display.config(state=tk.DISABLED)
+        self.chat_display.see("1.0")
 
-        delay = 1 if text[index] == "\n" else self._typing_delay_ms
-        self.root.after(delay, lambda: self._type_next_character(text, tag, index + 1))
+    def _update_marker(self, replace: bool) -> None:
+        """Write the marker line, replacing the current one; the widget must be writable"""
+        if replace:
+            self.chat_display.delete("1.0", "2.0")
+        if not self._trimmed_messages:
+            return
+        if self._hidden:
+            action = " - click to show earlier"
+        elif hasattr(self, 'open_history'):
+            action = " - click to open History"
+        else:
+            action = ""
+        marker = f"··· {self._trimmed_messages:,} earlier messages trimmed from view{action} ···\n"
+        self.chat_display.insert("1.0", marker, "scrollback")
+
+    def _insert_chunks(self, chunks):
+        if not chunks:
+            return
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.insert(tk.END, *chunks)
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state=tk.DISABLED)
 
     def _select_retro_fonts(self):
         preferred_primary = ["Orbitron", "Audiowide", "Exo 2", "Rajdhani", "Michroma", "BankGothic Md BT"]
@@ -301,18 +493,38 @@ class ChatView:
         return icon
 
     def process_queue(self):
-        """Process message queue for thread-safe GUI updates"""
+        """Process message queue for thread-safe GUI updates
+
+        Runs on the Tk thread only when queue_message has signalled new
+        data, so an idle window does no work at all.
+        """
+        # Re-arm before draining: anything queued from here on gets a new wakeup
+        with self._wakeup_lock:
+            self._wakeup_pending = False
         try:
             while True:
-                msg, msg_type = self.message_queue.get_nowait()
+                msg, msg_type, queued_at = self.message_queue.get_nowait()
+                _queue_wait.record(time.perf_counter_ns() - queued_at)
                 self.add_message(msg, msg_type)
         except queue.Empty:
             pass
-        self.root.after(100, self.process_queue)
 
     def queue_message(self, text: str, msg_type: str = "system") -> None:
-        """Add message to queue"""
-        self.message_queue.put((text, msg_type))
+        """Add message to queue; safe to call from any thread
+
+        A burst of messages coalesces into a single wakeup of the Tk loop.
+        """
+        self.message_queue.put((text, msg_type, time.perf_counter_ns()))
+        with self._wakeup_lock:
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        try:
+            self.root.after(0, self.process_queue)
+        except (RuntimeError, tk.TclError):
+            # Tk loop not running (yet, or any more); the next message retries
+            with self._wakeup_lock:
+                self._wakeup_pending = False
 
     def toggle_connection(self):
         pass
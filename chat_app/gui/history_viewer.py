@@ -1,14 +1,26 @@
 # chat_app/gui/history_viewer.py
 import tkinter as tk
-from tkinter import scrolledtext, messagebox, ttk
+from tkinter import messagebox, ttk
+from .query_executor import QueryExecutor
+from .transcript_view import TranscriptPane
+from ..database.chat_db import HIGHLIGHT_START, HIGHLIGHT_END
 
 
 class HistoryViewer:
     """Window to view chat history"""
 
-    def __init__(self, parent, db_manager):
+    PAGE_SIZE = 200
+    MAX_SEARCH_RESULTS = 2000
+
+    def __init__(self, parent, db_manager, session_id=None):
         self.db_manager = db_manager
+        # Session to select once it shows up in the list
+        self._select_session = session_id
         self.window = tk.Toplevel(parent)
+        # Database work runs on worker threads; results come back via Tk
+        self.executor = QueryExecutor(self.window, interrupt=getattr(db_manager, 'interrupt', None))
+        self.window.bind('<Destroy>', self._on_destroy)
+        self._search_count = 0
         self.window.title("Archive Terminal")
         self.window.geometry("800x600")
         self.window.configure(bg="#050b05")
@@ -127,8 +139,11 @@ class HistoryViewer:
                  bg=self.colors['bg'], fg=self.colors['text'],
                  font=('Courier', 12, 'bold')).pack(pady=(0, 5))
 
-        self.chat_display = scrolledtext.ScrolledText(
+        # Only the rows around the viewport are loaded into the widget
+        self.transcript = TranscriptPane(
             right_frame,
+            self._message_chunks,
+            self.executor,
             wrap=tk.WORD,
             bg=self.colors['secondary'],
             fg=self.colors['text'],
@@ -139,7 +154,8 @@ class HistoryViewer:
             relief=tk.FLAT,
             state=tk.DISABLED
         )
-        self.chat_display.pack(fill=tk.BOTH, expand=True)
+        self.transcript.pack(fill=tk.BOTH, expand=True)
+        self.chat_display = self.transcript.text
 
         # Configure tags
         for tag, color in [("timestamp", self.colors['muted']),
@@ -148,23 +164,45 @@ class HistoryViewer:
                            ("system", self.colors['success']),
                            ("error", "#ff6b6b")]:
             self.chat_display.tag_configure(tag, foreground=color)
+        self.chat_display.tag_configure("match", background="#1f541f", foreground="#c4ff6f")
 
     def animate_header(self):
         self._title_glow_index = (self._title_glow_index + 1) % len(self._title_glow)
         self.title_label.config(fg=self._title_glow[self._title_glow_index])
         self.window.after(380, self.animate_header)
 
+    def _on_destroy(self, event):
+        if event.widget is self.window:
+            self.executor.shutdown()
+
+    def _show_error(self, error):
+        messagebox.showerror("Archive", f"Database query failed: {error}", parent=self.window)
+
     def load_sessions(self):
-        """Load all sessions into the list"""
+        """Load all sessions into the list, one page at a time"""
         for item in self.session_list.get_children():
             self.session_list.delete(item)
 
-        sessions = self.db_manager.get_all_sessions()
+        def pages():
+            cursor = None
+            while True:
+                rows, cursor = self.db_manager.get_sessions_page(self.PAGE_SIZE, before=cursor)
+                yield rows
+                if cursor is None:
+                    return
+
+        self.executor.submit("sessions", pages, on_chunk=self._add_sessions, on_error=self._show_error)
+
+    def _add_sessions(self, sessions):
         for session in sessions:
             session_id, sess_type, host, port, started, ended, status = session
             host_port = f"{host}:{port}" if host and port else "N/A"
             date_str = started[:16] if started else "Unknown"
-            self.session_list.insert('', tk.END, values=(session_id, sess_type, host_port, date_str))
+            item = self.session_list.insert('', tk.END, values=(session_id, sess_type, host_port, date_str))
+            if session_id == self._select_session:
+                self._select_session = None
+                self.session_list.selection_set(item)
+                self.session_list.see(item)
 
     def on_session_select(self, event=None):
         """Display selected session messages"""
@@ -175,30 +213,22 @@ class HistoryViewer:
         item = self.session_list.item(selection[0])
         session_id = item['values'][0]
 
-        self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.delete(1.0, tk.END)
-
-        messages = self.db_manager.get_session_history(session_id)
+        def fetch_page(after_id=None, before_id=None):
+            return self.db_manager.get_session_history_page(
+                session_id, self.PAGE_SIZE, after_id=after_id, before_id=before_id)
 
-        if not messages:
-            self.chat_display.insert(tk.END, "No messages in this session.\n", "system")
-        else:
-            for msg in messages:
-                timestamp, sender, message, msg_type = msg
-                time_str = timestamp[11:16] if timestamp else "???"
+        self.transcript.load(fetch_page, empty_text="No messages in this session.\n")
 
-                self.chat_display.insert(tk.END, f"[{time_str}] ", "timestamp")
+    def _message_chunks(self, row):
+        """Text.insert arguments for one (id, timestamp, sender, message, msg_type) row"""
+        _, timestamp, sender, message, msg_type = row
+        time_str = timestamp[11:16] if timestamp else "???"
 
-                if msg_type == "received":
-                    self.chat_display.insert(tk.END, f"<< {sender}: ", "received")
-                    self.chat_display.insert(tk.END, f"{message}\n", "received")
-                elif msg_type == "sent":
-                    self.chat_display.insert(tk.END, f">> {sender}: ", "sent")
-                    self.chat_display.insert(tk.END, f"{message}\n", "sent")
-                else:
-                    self.chat_display.insert(tk.END, f":: {message}\n", "system")
-
-        self.chat_display.config(state=tk.DISABLED)
+        if msg_type == "received":
+            return [f"[{time_str}] ", "timestamp", f"<< {sender}: {message}\n", "received"]
+        elif msg_type == "sent":
+            return [f"[{time_str}] ", "timestamp", f">> {sender}: {message}\n", "sent"]
+        return [f"[{time_str}] ", "timestamp", f":: {message}\n", "system"]
 
     def search(self):
         """Search messages"""
@@ -207,23 +237,62 @@ class HistoryViewer:
             messagebox.showwarning("Search", "Please enter a search term")
             return
 
+        self.transcript.clear()
         self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.delete(1.0, tk.END)
-
-        results = self.db_manager.search_messages(keyword)
+        self.chat_display.insert(tk.END, f"Scanning for '{keyword}'...\n\n", "system")
+        self.chat_display.config(state=tk.DISABLED)
+        self._search_count = 0
+
+        def pages():
+            cursor = None
+            fetched = 0
+            while fetched < self.MAX_SEARCH_RESULTS:
+                rows, cursor = self.db_manager.search_messages_ranked_page(
+                    keyword, self.PAGE_SIZE, after=cursor, highlight=True)
+                fetched += len(rows)
+                yield rows
+                if cursor is None:
+                    return
+
+        def finished(_):
+            if not self._search_count:
+                summary = f"No messages found containing '{keyword}'\n"
+            elif self._search_count >= self.MAX_SEARCH_RESULTS:
+                order = "best" if self.db_manager.fts_enabled else "newest"
+                summary = f"Showing the {order} {self._search_count} matching messages:\n"
+            else:
+                summary = f"Found {self._search_count} messages:\n"
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.delete("1.0", "2.0")
+            self.chat_display.insert("1.0", summary, "system")
+            self.chat_display.config(state=tk.DISABLED)
 
-        if not results:
-            self.chat_display.insert(tk.END, f"No messages found containing '{keyword}'\n", "system")
-        else:
-            self.chat_display.insert(tk.END, f"Found {len(results)} messages:\n\n", "system")
-            for msg in results:
-                timestamp, sender, message, msg_type, sess_type = msg
-                timestamp_str = timestamp[:16] if timestamp else "???"
-                self.chat_display.insert(tk.END, f"[{timestamp_str}] ({sess_type}) {sender}: ", "system")
-                self.chat_display.insert(tk.END, f"{message}\n", msg_type if msg_type in ["received", "sent"] else "system")
+        # Shares the transcript channel: a new search or session selection
+        # cancels whatever is still loading there
+        self.executor.submit(self.transcript.channel, pages, on_result=finished,
+                             on_chunk=self._add_search_results, on_error=self._show_error)
 
+    def _add_search_results(self, results):
+        self._search_count += len(results)
+        self.chat_display.config(state=tk.NORMAL)
+        for msg in results:
+            _, timestamp, sender, message, msg_type, sess_type = msg
+            timestamp_str = timestamp[:16] if timestamp else "???"
+            self.chat_display.insert(tk.END, f"[{timestamp_str}] ({sess_type}) {sender}: ", "system")
+            self._insert_highlighted(f"{message}\n", msg_type if msg_type in ["received", "sent"] else "system")
         self.chat_display.config(state=tk.DISABLED)
 
+    def _insert_highlighted(self, text: str, tag: str) -> None:
+        """Insert search snippet text, tagging the marked matches"""
+        chunks = []
+        for index, part in enumerate(text.split(HIGHLIGHT_START)):
+            if index == 0:
+                chunks += [part, tag]
+                continue
+            match, _, rest = part.partition(HIGHLIGHT_END)
+            chunks += [match, (tag, "match"), rest, tag]
+        self.chat_display.insert(tk.END, *chunks)
+
     def delete_selected(self):
         """Delete selected session"""
         selection = self.session_list.selection()
@@ -236,9 +305,12 @@ class HistoryViewer:
 
         if messagebox.askyesno("Confirm Delete",
                                f"Delete session {session_id}? This cannot be undone."):
-            self.db_manager.delete_session(session_id)
-            self.load_sessions()
-            self.chat_display.config(state=tk.NORMAL)
-            self.chat_display.delete(1.0, tk.END)
-            self.chat_display.insert(tk.END, "Session deleted.\n", "system")
-            self.chat_display.config(state=tk.DISABLED)
+            def deleted(_):
+                self.load_sessions()
+                self.transcript.clear()
+                self.chat_display.config(state=tk.NORMAL)
+                self.chat_display.insert(tk.END, "Session deleted.\n", "system")
+                self.chat_display.config(state=tk.DISABLED)
+
+            self.executor.submit(f"delete-{session_id}", lambda: self.db_manager.delete_session(session_id),
+                                 on_result=deleted, on_error=self._show_error)
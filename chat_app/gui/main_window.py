@@ -343,7 +343,7 @@ class ServerGUI(ChatView):
     def open_history(self):
         """Open history viewer"""
         if self.db_manager:
-            HistoryViewer(self.root, self.db_manager)
+            HistoryViewer(self.root, self.db_manager, self.session_id)
         else:
             messagebox.showwarning("History", "Database not available")
         
@@ -368,23 +368,38 @@ class ServerGUI(ChatView):
             on_connect=self.on_client_connect,
             on_disconnect=self.on_client_disconnect,
             on_receive=lambda msg: None,
-            cipher=self.cipher
+            cipher=self.cipher,
+            replay_source=self.replay_source if self.db_manager else None
         )
         
         if self.server.start():
             self.update_ui_state(True, is_server=True)
+
+    def replay_source(self, after, before):
+        """Recorded messages the server no longer buffers, for reconnecting clients"""
+        return self.db_manager.get_messages_by_seq(self.session_id, after, before)
             
     def on_client_connect(self, addr):
         """Callback when client connects"""
-        self.root.after(0, lambda: self.status_label.config(
-            text="● Connected", fg=self.colors['success']))
+        self.root.after(0, self._refresh_client_status)
         
     def on_client_disconnect(self):
         """Callback when client disconnects"""
-        self.root.after(0, lambda: self.status_label.config(
-            text="● Waiting", fg="#c4ff6f"))
-        self.root.after(0, lambda: self.message_entry.config(state=tk.DISABLED))
-        self.root.after(0, lambda: self.send_btn.config(state=tk.DISABLED))
+        self.root.after(0, self._refresh_client_status)
+
+    def _refresh_client_status(self):
+        """Reflect the number of connected clients in the header"""
+        if not self.server or not self.server.running:
+            return
+        count = self.server.client_count
+        if count:
+            self.status_label.config(text=f"● Connected ({count})", fg=self.colors['success'])
+            self.message_entry.config(state=tk.NORMAL)
+            self.send_btn.config(state=tk.NORMAL)
+        else:
+            self.status_label.config(text="● Waiting", fg="#c4ff6f")
+            self.message_entry.config(state=tk.DISABLED)
+            self.send_btn.config(state=tk.DISABLED)
             
     def send_message(self):
         if self.server and self.message_entry.get():
@@ -409,6 +424,7 @@ class ClientGUI(ChatView):
         super().__init__(root, is_server=False)
         self.db_manager = db_manager
         self.session_id = None
+        self.session_address = None  # (host, port) the open session belongs to
         self.client = None
         self.cipher = get_cipher()
         
@@ -503,7 +519,7 @@ class ClientGUI(ChatView):
     def open_history(self):
         """Open history viewer"""
         if self.db_manager:
-            HistoryViewer(self.root, self.db_manager)
+            HistoryViewer(self.root, self.db_manager, self.session_id)
         else:
             messagebox.showwarning("History", "Database not available")
         
@@ -517,26 +533,37 @@ class ClientGUI(ChatView):
         host = self.host_entry.get()
         port = int(self.port_entry.get())
         
-        # Create database session
-        if self.db_manager:
+        # Create database session, or keep recording into the open one
+        # when linking to the same server again (e.g. after a failed attempt)
+        if self.db_manager and (self.session_id is None or self.session_address != (host, port)):
+            if self.session_id is not None:
+                self.db_manager.end_session(self.session_id)
             self.session_id = self.db_manager.create_session("client", host, port)
+            self.session_address = (host, port)
             self.logger.set_session(self.session_id)
         
-        # Create client instance with cipher
+        # Create client instance with cipher; it reconnects by itself
+        # and queues messages while the server is away
         self.client = ChatClient(
             host, port, self.logger,
             on_connect=self.on_connect,
             on_disconnect=self.on_disconnect,
             on_receive=lambda msg: None,
-            cipher=self.cipher
+            cipher=self.cipher,
+            reconnect=True,
+            on_reconnecting=self.on_reconnecting
         )
         
         if self.client.connect():
             self.update_ui_state(True, is_server=False)
             
     def on_connect(self):
-        """Callback when connected"""
-        pass
+        """Callback when connected, or reconnected"""
+        self.root.after(0, lambda: self.update_ui_state(True, is_server=False))
+        
+    def on_reconnecting(self, delay: float):
+        """Callback when the connection dropped and a retry is scheduled"""
+        self.root.after(0, lambda: self.status_label.config(text="● RECONNECTING", fg=self.colors['warn']))
         
     def on_disconnect(self):
         """Callback when disconnected"""
@@ -554,5 +581,6 @@ class ClientGUI(ChatView):
         if self.db_manager and self.session_id:
             self.db_manager.end_session(self.session_id)
             self.session_id = None
+            self.session_address = None
             
         self.update_ui_state(False, is_server=False)
@@ -0,0 +1,149 @@
+# chat_app/gui/query_executor.py
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# Worker threads shared by every QueryExecutor. A fixed set of threads
+# keeps ChatDatabase's per-thread reader connections reused across
+# history windows instead of one set being opened for each window.
+WORKERS = 2
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="HistoryQuery")
+        return _pool
+
+
+class QueryTicket:
+    """Handle for one submitted query; cancelling it drops pending results"""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.cancelled = False
+        self.thread_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self._interrupt: Optional[Callable[[int], None]] = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            # Abort a SQLite statement that is still running for this ticket
+            if self.thread_id is not None and self._interrupt:
+                self._interrupt(self.thread_id)
+
+    def _set_running(self, thread_id: Optional[int]) -> bool:
+        with self._lock:
+            self.thread_id = thread_id
+            return not self.cancelled
+
+
+class QueryExecutor:
+    """Runs database work off the Tk thread and delivers results on it
+
+    Each query is submitted on a named channel; submitting a new query on
+    a channel cancels the one still in flight there, so only the latest
+    session selection or search is ever rendered. A query function may
+    return a plain result or an iterator: iterator items are delivered
+    one by one through `on_chunk` as they are produced. Results are
+    handed back through the Tk event loop, a frame-sized time budget at a
+    time, so rendering never stalls the UI. Queries run on a worker pool
+    shared by all executors.
+    """
+
+    POLL_MS = 16
+    FRAME_BUDGET = 0.008
+
+    def __init__(self, widget, interrupt: Optional[Callable[[int], None]] = None):
+        self.widget = widget
+        self.interrupt = interrupt
+        self._pool = _shared_pool()
+        self._results: "queue.Queue" = queue.Queue()
+        self._channels: Dict[str, QueryTicket] = {}
+        self._outstanding = 0
+        self._pump_id = None
+        self._closed = False
+
+    def submit(self, channel: str, func: Callable, on_result: Optional[Callable] = None,
+               on_chunk: Optional[Callable] = None, on_error: Optional[Callable] = None) -> QueryTicket:
+        """Run func() on a worker; must be called from the Tk thread"""
+        self.cancel(channel)
+        ticket = QueryTicket(channel)
+        ticket._interrupt = self.interrupt
+        self._channels[channel] = ticket
+        self._outstanding += 1
+        self._pool.submit(self._run, ticket, func, on_result, on_chunk, on_error)
+        self._schedule_pump()
+        return ticket
+
+    def cancel(self, channel: str) -> None:
+        """Cancel the query in flight on a channel, if any"""
+        ticket = self._channels.pop(channel, None)
+        if ticket:
+            ticket.cancel()
+
+    def shutdown(self) -> None:
+        """Cancel everything and stop delivering results"""
+        self._closed = True
+        for channel in list(self._channels):
+            self.cancel(channel)
+        if self._pump_id is not None:
+            try:
+                self.widget.after_cancel(self._pump_id)
+            except Exception:
+                pass
+            self._pump_id = None
+
+    def _run(self, ticket: QueryTicket, func, on_result, on_chunk, on_error) -> None:
+        """Worker thread: execute the query and queue its output"""
+        callback, value = None, None
+        if ticket._set_running(threading.get_ident()):
+            try:
+                result = func()
+                if on_chunk is not None and hasattr(result, '__next__'):
+                    for chunk in result:
+                        if ticket.cancelled:
+                            break
+                        self._results.put((ticket, False, on_chunk, chunk))
+                    result = None
+                callback, value = on_result, result
+            except sqlite3.OperationalError as e:
+                # An interrupt for a cancelled ticket is expected
+                callback, value = (None if ticket.cancelled else on_error), e
+            except Exception as e:
+                callback, value = on_error, e
+            finally:
+                ticket._set_running(None)
+        self._results.put((ticket, True, callback, value))
+
+    def _schedule_pump(self) -> None:
+        if self._pump_id is None and not self._closed:
+            self._pump_id = self.widget.after(self.POLL_MS, self._pump)
+
+    def _pump(self) -> None:
+        """Tk thread: deliver queued results within one frame budget"""
+        self._pump_id = None
+        deadline = time.perf_counter() + self.FRAME_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                ticket, final, callback, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if final:
+                self._outstanding -= 1
+                if self._channels.get(ticket.channel) is ticket:
+                    del self._channels[ticket.channel]
+            if callback is not None and not ticket.cancelled:
+                callback(value)
+        if self._outstanding > 0:
+            self._schedule_pump()
@@ -0,0 +1,179 @@
+# chat_app/gui/transcript_view.py
+import tkinter as tk
+from tkinter import scrolledtext
+from collections import deque
+
+
+class TranscriptPane:
+    """Virtualized, lazily loaded transcript view
+
+    Only a window of rows is kept in the Text widget. Pages are fetched
+    from the database as the user scrolls toward either edge, and rows
+    that fall far outside the view are dropped again, so opening or
+    scrolling a session costs the same however long it is.
+
+    `fetch_page(after_id=None, before_id=None)` must return (rows, cursor)
+    in chronological order with the row id first, as
+    ChatDatabase.get_session_history_page does; it runs on the
+    QueryExecutor's workers. `render_row(row)` returns the alternating
+    text/tag arguments for Text.insert.
+    """
+
+    EDGE_FRACTION = 0.15
+
+    def __init__(self, parent, render_row, executor, channel: str = "transcript",
+                 max_rows: int = 1000, **text_options):
+        self.render_row = render_row
+        self.executor = executor
+        self.channel = channel
+        self.max_rows = max_rows
+
+        self.text = scrolledtext.ScrolledText(parent, **text_options)
+        self.text['yscrollcommand'] = self._on_yscroll
+
+        self._fetch_page = None
+        self._rows = deque()  # (row id, text lines) for every loaded row
+        self._has_before = False
+        self._has_after = False
+        self._check_pending = False
+        self._loading = False
+
+    def pack(self, **kwargs):
+        self.text.pack(**kwargs)
+
+    def clear(self) -> None:
+        """Empty the view and stop lazy loading"""
+        self.executor.cancel(self.channel)
+        self._fetch_page = None
+        self._loading = False
+        self._rows.clear()
+        self._has_before = self._has_after = False
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text.config(state=tk.DISABLED)
+
+    def load(self, fetch_page, empty_text: str = "No messages.\n") -> None:
+        """Show a new transcript, fetching only its first page"""
+        self.clear()
+        self._fetch_page = fetch_page
+
+        def deliver(result):
+            rows, cursor = result
+            if not rows:
+                self.text.config(state=tk.NORMAL)
+                self.text.insert(tk.END, empty_text, "system")
+                self.text.config(state=tk.DISABLED)
+                return
+            self._append(rows)
+            self._has_after = cursor is not None
+            self._schedule_check()
+
+        self._request(fetch_page, deliver)
+
+    def _request(self, func, deliver) -> None:
+        """Fetch a page on a worker; superseded requests are cancelled"""
+        self._loading = True
+
+        def on_result(result):
+            self._loading = False
+            deliver(result)
+
+        def on_error(error):
+            self._loading = False
+            self.text.config(state=tk.NORMAL)
+            self.text.insert(tk.END, f"Failed to load messages: {error}\n", "error")
+            self.text.config(state=tk.DISABLED)
+
+        self.executor.submit(self.channel, func, on_result=on_result, on_error=on_error)
+
+    def _on_yscroll(self, first, last) -> None:
+        self.text.vbar.set(first, last)
+        self._schedule_check()
+
+    def _schedule_check(self) -> None:
+        # Loading changes the widget, which re-enters the scroll callback
+        if self._fetch_page and not self._check_pending:
+            self._check_pending = True
+            self.text.after_idle(self._check_edges)
+
+    def _check_edges(self) -> None:
+        self._check_pending = False
+        if not self._fetch_page or not self._rows or self._loading:
+            return
+        fetch_page = self._fetch_page
+        first, last = self.text.yview()
+        if last >= 1.0 - self.EDGE_FRACTION and self._has_after:
+            after_id = self._rows[-1][0]
+
+            def deliver_after(result):
+                rows, cursor = result
+                self._has_after = cursor is not None
+                if rows:
+                    self._append(rows)
+                    self._trim_top()
+
+            self._request(lambda: fetch_page(after_id=after_id), deliver_after)
+        elif first <= self.EDGE_FRACTION and self._has_before:
+            before_id = self._rows[0][0]
+
+            def deliver_before(result):
+                rows, cursor = result
+                self._has_before = cursor is not None
+                if rows:
+                    self._prepend(rows)
+                    self._trim_bottom()
+
+            self._request(lambda: fetch_page(before_id=before_id), deliver_before)
+
+    def _render(self, rows):
+        chunks = []
+        counts = []
+        for row in rows:
+            row_chunks = self.render_row(row)
+            chunks += row_chunks
+            counts.append((row[0], sum(text.count('\n') for text in row_chunks[::2])))
+        return chunks, counts
+
+    def _top_line(self) -> int:
+        return int(self.text.index('@0,0').split('.')[0])
+
+    def _append(self, rows) -> None:
+        chunks, counts = self._render(rows)
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(tk.END, *chunks)
+        self.text.config(state=tk.DISABLED)
+        self._rows.extend(counts)
+
+    def _prepend(self, rows) -> None:
+        chunks, counts = self._render(rows)
+        added = sum(lines for _, lines in counts)
+        top = self._top_line()
+        self.text.config(state=tk.NORMAL)
+        self.text.insert('1.0', *chunks)
+        self.text.config(state=tk.DISABLED)
+        self._rows.extendleft(reversed(counts))
+        # Keep the same content at the top of the view
+        self.text.yview(f"{top + added}.0")
+
+    def _trim_top(self) -> None:
+        excess = len(self._rows) - self.max_rows
+        if excess <= 0:
+            return
+        removed = sum(self._rows.popleft()[1] for _ in range(excess))
+        top = self._top_line()
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', f"{removed + 1}.0")
+        self.text.config(state=tk.DISABLED)
+        self.text.yview(f"{max(1, top - removed)}.0")
+        self._has_before = True
+
+    def _trim_bottom(self) -> None:
+        excess = len(self._rows) - self.max_rows
+        if excess <= 0:
+            return
+        removed = sum(self._rows.pop()[1] for _ in range(excess))
+        kept = sum(lines for _, lines in self._rows)
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(f"{kept + 1}.0", tk.END)
+        self.text.config(state=tk.DISABLED)
+        self._has_after = True
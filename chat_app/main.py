@@ -1,27 +1,34 @@
-#!/usr/bin/env python3
-"""
-Main entry point for chat application
-"""
-
-import sys
-import os
-
-# Add parent directory to path when running directly
-if __name__ == "__main__":
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from chat_app.database import ChatDatabase
-from chat_app.gui import ModeSelector
-
-def main():
-    """Main entry point"""
-    # Initialize database
-    db_manager = ChatDatabase()
-    print(f"Database initialized: {db_manager.get_db_path()}")
-    
-    # Start mode selector
-    app = ModeSelector(db_manager)
-    app.run()
-
-if __name__ == "__main__":
+#!/usr/bin/env python3
+"""
+Main entry point for chat application
+"""
+
+import sys
+import os
+
+# Add parent directory to path when running directly
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.database import ChatDatabase
+from chat_app.gui import ModeSelector
+
+def main():
+    """Main entry point"""
+    # Initialize database
+    db_manager = ChatDatabase()
+    print(f"Database initialized: {db_manager.get_db_path()}")
+
+    # Optional Prometheus endpoint, e.g. CHAT_APP_METRICS_PORT=9100
+    metrics_port = os.environ.get("CHAT_APP_METRICS_PORT")
+    if metrics_port:
+        from chat_app.utils.metrics import start_http_server
+        start_http_server(int(metrics_port))
+        print(f"Metrics available at http://127.0.0.1:{metrics_port}/metrics")
+    
+    # Start mode selector
+    app = ModeSelector(db_manager)
+    app.run()
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,11 @@
-# chat_app/network/__init__.py
-from .server import ChatServer
-from .client import ChatClient
-
-__all__ = ['ChatServer', 'ChatClient']
\ No newline at end of file
+# chat_app/network/__init__.py
+from .server import ChatServer
+from .client import ChatClient
+from .aio import AsyncChatServer, AsyncChatClient, EventLoopThread, ThreadedChatServer, ThreadedChatClient
+from .cluster import ClusterHub, run_cluster
+from .federation import FederatedServer
+from .protocol import FrameDecoder, FrameError, encode_frame
+
+__all__ = ['ChatServer', 'ChatClient', 'AsyncChatServer', 'AsyncChatClient', 'EventLoopThread',
+           'ThreadedChatServer', 'ThreadedChatClient', 'ClusterHub', 'run_cluster', 'FederatedServer',
+           'FrameDecoder', 'FrameError', 'encode_frame']
\ No newline at end of file
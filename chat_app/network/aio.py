@@ -0,0 +1,557 @@
+# chat_app/network/aio.py
+"""
+asyncio implementations of the chat server and client
+
+AsyncChatServer and AsyncChatClient speak the same framed, XOR-encrypted
+protocol as ChatServer and ChatClient and take the same logger and
+callbacks, but run entirely on an asyncio event loop using streams.
+Their start/connect/stop/disconnect methods are coroutines; send() is a
+plain method that must be called on the loop.
+
+Code running outside the loop, such as the Tk GUI, uses
+ThreadedChatServer and ThreadedChatClient instead. They run the async
+classes on one shared EventLoopThread and expose the blocking,
+thread-safe interface of ChatServer and ChatClient, so they can be
+swapped in without touching the caller.
+"""
+
+import asyncio
+import concurrent.futures
+import socket
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+from ..utils.crypto import XorCipher, get_cipher
+from ..utils.metrics import REGISTRY
+from .protocol import (FrameDecoder, FrameError, MessageAssembler, RelayMessage, encode_frame,
+                       encode_hello, decode_hello, client_hello, negotiate, accepted_features,
+                       iter_message_frames, KIND_MESSAGE, KIND_HELLO, FLAG_MORE, FLAG_COMPRESSED,
+                       FLAG_BINARY, FEATURE_FLAGS)
+from .server import MAX_QUEUE_BYTES, OVERFLOW_POLICIES
+
+
+RECV_SIZE = 65536
+
+_bytes_dropped = REGISTRY.counter("chat_server_bytes_dropped_total", "Queued bytes dropped for slow clients")
+_slow_disconnects = REGISTRY.counter("chat_server_slow_disconnects_total", "Clients disconnected for not reading")
+
+
+class _Connection:
+    """Per-connection state of an AsyncChatServer"""
+
+    __slots__ = ('reader', 'writer', 'addr', 'decoder', 'assembler', 'relay', 'accepts',
+                 'outq', 'queued', 'wakeup', 'drained', 'write_task')
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, cipher: XorCipher):
+        self.reader = reader
+        self.writer = writer
+        self.addr = writer.get_extra_info('peername')
+        self.decoder = FrameDecoder()
+        self.assembler = MessageAssembler(cipher)
+        self.relay: List[bytes] = []  # frames of a fragmented message still arriving
+        self.accepts = 0  # feature flags negotiated with KIND_HELLO
+        self.outq: deque = deque()  # messages the transport has not taken yet
+        self.queued = 0  # bytes in outq
+        self.wakeup = asyncio.Event()  # set when outq has data for the write task
+        self.drained = asyncio.Event()  # clear while the connection is congested
+        self.drained.set()
+        self.write_task: Optional[asyncio.Task] = None
+
+
+class AsyncChatServer:
+    """asyncio multi-client server with XOR encryption
+
+    Each client is served by one task on the event loop. Messages are
+    fanned out still encrypted; writes go to the transports' buffers, so
+    a slow reader never holds up the loop. Once a transport's buffer
+    passes its high-water mark, further messages wait in a per-client queue bounded by
+    `max_queue_bytes`, drained by a write task, and `overflow` picks
+    what happens when it fills, as in ChatServer.
+    """
+
+    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
+                 cipher: Optional[XorCipher] = None, backlog: int = socket.SOMAXCONN,
+                 max_queue_bytes: int = MAX_QUEUE_BYTES, overflow: str = 'drop_oldest'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.host = host
+        self.port = port
+        self.logger = logger
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.on_receive = on_receive
+        self.backlog = backlog
+        self.max_queue_bytes = max_queue_bytes
+        self.overflow = overflow
+
+        self.cipher = cipher or get_cipher()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections: Dict[asyncio.StreamWriter, _Connection] = {}
+        self.running = False
+        self._congested: Dict[_Connection, None] = {}
+
+    @property
+    def client_count(self) -> int:
+        """Number of currently connected clients"""
+        return len(self.connections)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Bytes queued for each client, keyed by host:port"""
+        return {f"{conn.addr[0]}:{conn.addr[1]}": conn.queued + conn.writer.transport.get_write_buffer_size()
+                for conn in list(self.connections.values())}
+
+    async def start(self) -> bool:
+        """Start listening"""
+        try:
+            self.server = await asyncio.start_server(self._serve_client, self.host, self.port,
+                                                     backlog=self.backlog, reuse_address=True)
+        except Exception as e:
+            self.logger.output(f"Failed to start server: {e}", "error", "System")
+            return False
+
+        self.running = True
+        self.logger.output(f"Server started on {self.host}:{self.port} (XOR encryption enabled)", "system", "System")
+        return True
+
+    async def serve_forever(self) -> None:
+        """Start the server if needed and serve until cancelled"""
+        if not self.running and not await self.start():
+            return
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = _Connection(reader, writer, self.cipher)
+        self.connections[writer] = conn
+        self.logger.output(f"Client connected from {conn.addr[0]}:{conn.addr[1]}", "system", "System")
+
+        # Notify GUI
+        self.on_connect(conn.addr)
+
+        try:
+            while self.running:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    self.logger.output(f"Client {conn.addr[0]}:{conn.addr[1]} disconnected", "system", "System")
+                    break
+                if not self._handle_data(conn, data):
+                    break
+                # Backpressure: read nothing more until backed-up clients catch up
+                for congested in list(self._congested):
+                    if congested is not conn:
+                        await congested.drained.wait()
+        except (ConnectionError, OSError) as e:
+            if self.running:
+                self.logger.output(f"Client error: {e}", "error", "System")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._close_connection(conn)
+
+    def _handle_data(self, conn: _Connection, data: bytes) -> bool:
+        """Decrypt and relay what arrived; returns False to drop the client"""
+        try:
+            frames = conn.decoder.feed(data)
+        except FrameError as e:
+            self.logger.output(f"Protocol error from {conn.addr[0]}:{conn.addr[1]}: {e}", "error", "System")
+            return False
+
+        relay = []
+        for frame in frames:
+            if frame.kind == KIND_HELLO:
+                conn.accepts, reply = negotiate(decode_hello(frame.payload))
+                conn.writer.write(encode_hello(**reply))
+                continue
+            if frame.kind != KIND_MESSAGE:
+                continue
+
+            # Decrypt received data, joining fragments of large messages
+            try:
+                decrypted = conn.assembler.feed(frame)
+            except FrameError as e:
+                self.logger.output(f"Protocol error from {conn.addr[0]}:{conn.addr[1]}: {e}", "error", "System")
+                return False
+            except ValueError as e:
+                self.logger.output(f"Dropped message from {conn.addr[0]}: {e}", "error", "System")
+                conn.relay.clear()
+                continue
+
+            # Fragments are held back until their message is complete, so
+            # messages from different senders never interleave on the wire
+            conn.relay.append(encode_frame(frame.payload, flags=frame.flags))
+            if not frame.flags & FLAG_MORE:
+                relay.append(RelayMessage(self.cipher, b''.join(conn.relay),
+                                          frame.flags & FEATURE_FLAGS, decrypted))
+                conn.relay.clear()
+
+            # Show only chat content in the UI (no encrypted/base64 payload)
+            if decrypted is not None:
+                self.logger.output(decrypted, "received", f"Client({conn.addr[0]})")
+
+        # Relay the still-encrypted frames to every other client in one write
+        if relay:
+            self._broadcast(relay, exclude=conn)
+        return True
+
+    def _broadcast(self, messages: List[RelayMessage], exclude: Optional[_Connection] = None) -> None:
+        encoded: Dict[int, bytes] = {}
+        for conn in list(self.connections.values()):
+            if conn is exclude or conn.writer.is_closing():
+                continue
+            data = encoded.get(conn.accepts)
+            if data is None:
+                data = encoded[conn.accepts] = b''.join(message.encoded(conn.accepts) for message in messages)
+            if data:
+                self._queue_data(conn, data)
+
+    def _queue_data(self, conn: _Connection, data: bytes) -> None:
+        transport = conn.writer.transport
+        if not conn.outq and transport.get_write_buffer_size() < transport.get_write_buffer_limits()[1]:
+            # The transport is keeping up: hand the data straight over
+            conn.writer.write(data)
+            return
+
+        if self.max_queue_bytes and conn.queued + len(data) > self.max_queue_bytes:
+            if self.overflow == 'disconnect':
+                _slow_disconnects.inc()
+                self.logger.output(f"Disconnected slow client {conn.addr[0]}:{conn.addr[1]} "
+                                   f"({conn.queued} bytes queued)", "error", "System")
+                self._close_connection(conn)
+                return
+            if self.overflow == 'drop_oldest':
+                while conn.outq and conn.queued + len(data) > self.max_queue_bytes:
+                    dropped = len(conn.outq.popleft())
+                    conn.queued -= dropped
+                    _bytes_dropped.inc(dropped)
+            elif conn not in self._congested:
+                self._congested[conn] = None
+                conn.drained.clear()
+                self.logger.output(f"Client {conn.addr[0]}:{conn.addr[1]} is not keeping up; "
+                                   f"holding back senders", "system", "System")
+
+        conn.outq.append(data)
+        conn.queued += len(data)
+        if conn.write_task is None:
+            conn.write_task = asyncio.get_running_loop().create_task(self._write_queued(conn))
+        conn.wakeup.set()
+
+    async def _write_queued(self, conn: _Connection) -> None:
+        """Feed a connection's queue to its transport as fast as the client reads"""
+        try:
+            while True:
+                await conn.wakeup.wait()
+                conn.wakeup.clear()
+                while conn.outq:
+                    data = conn.outq.popleft()
+                    conn.queued -= len(data)
+                    conn.writer.write(data)
+                    await conn.writer.drain()
+                    if conn in self._congested and conn.queued <= self.max_queue_bytes // 2:
+                        self._release(conn)
+        except (ConnectionError, OSError):
+            self._close_connection(conn)
+        except asyncio.CancelledError:
+            pass
+
+    def _release(self, conn: _Connection) -> None:
+        self._congested.pop(conn, None)
+        conn.drained.set()
+
+    def _close_connection(self, conn: _Connection, notify: bool = True) -> None:
+        if self.connections.pop(conn.writer, None) is None:
+            return
+        self._release(conn)
+        if conn.write_task is not None:
+            conn.write_task.cancel()
+        conn.writer.close()
+        if notify:
+            self.on_disconnect()
+
+    def send(self, message: str) -> bool:
+        """Broadcast encrypted message to all connected clients"""
+        if self.connections and self.running:
+            if self._congested:
+                self.logger.output(f"Send held back: {len(self._congested)} client(s) not keeping up", "error", "System")
+                return False
+            try:
+                self._broadcast([RelayMessage.from_text(self.cipher, message, FEATURE_FLAGS)])
+                self.logger.output(message, "sent", "You")
+                return True
+            except Exception as e:
+                self.logger.output(f"Send failed: {e}", "error", "System")
+                return False
+        return False
+
+    async def stop(self) -> None:
+        """Stop the server and close every connection"""
+        if not self.running:
+            return
+        self.running = False
+        self.server.close()
+        for conn in list(self.connections.values()):
+            self._close_connection(conn, notify=False)
+        await self.server.wait_closed()
+        self.logger.output("Server stopped", "system", "System")
+
+    def set_encryption_key(self, key: str) -> None:
+        """Update encryption key"""
+        self.cipher.set_key(key)
+        self.logger.output(f"Encryption key updated", "system", "System")
+
+
+class AsyncChatClient:
+    """asyncio client with XOR encryption"""
+
+    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
+                 cipher: Optional[XorCipher] = None):
+        self.host = host
+        self.port = port
+        self.logger = logger
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.on_receive = on_receive
+
+        self.cipher = cipher or get_cipher()
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.receive_task: Optional[asyncio.Task] = None
+        self.running = False
+        self.features = 0  # feature flags the server agreed to
+
+    async def connect(self) -> bool:
+        """Connect to server"""
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        except Exception as e:
+            self.logger.output(f"Connection failed: {e}", "error", "System")
+            return False
+
+        sock = self.writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Offer compression and binary frames; until the server answers, send plain ones
+        self.features = 0
+        self.writer.write(client_hello())
+        self.running = True
+        self.logger.output(f"Connected to server at {self.host}:{self.port} (XOR encryption enabled)", "system", "System")
+
+        # Notify GUI
+        self.on_connect()
+
+        self.receive_task = asyncio.get_running_loop().create_task(self._receive_messages())
+        return True
+
+    async def _receive_messages(self) -> None:
+        """Receive and decrypt messages from server"""
+        decoder = FrameDecoder()
+        assembler = MessageAssembler(self.cipher)
+        try:
+            while self.running:
+                data = await self.reader.read(RECV_SIZE)
+                if not data:
+                    self.running = False
+                    self.logger.output("Server disconnected", "system", "System")
+                    self.on_disconnect()
+                    break
+
+                for frame in decoder.feed(data):
+                    if frame.kind == KIND_HELLO:
+                        self.features = accepted_features(decode_hello(frame.payload))
+                        continue
+                    if frame.kind != KIND_MESSAGE:
+                        continue
+
+                    # Decrypt received data, joining fragments of large messages
+                    try:
+                        decrypted = assembler.feed(frame)
+                    except ValueError as e:
+                        self.logger.output(f"Dropped message: {e}", "error", "System")
+                        continue
+
+                    # Show only chat content in the UI (no encrypted/base64 payload)
+                    if decrypted is not None:
+                        self.logger.output(decrypted, "received", "Server")
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if self.running:
+                self.running = False
+                self.logger.output(f"Receive error: {e}", "error", "System")
+                self.on_disconnect()
+
+    def send(self, message: str) -> bool:
+        """Send encrypted message to server"""
+        if self.writer and self.running:
+            try:
+                # Encrypt message; large ones are streamed in fragments
+                compress = bool(self.features & FLAG_COMPRESSED)
+                binary = bool(self.features & FLAG_BINARY)
+                for frame in iter_message_frames(self.cipher, message, compress=compress, binary=binary):
+                    self.writer.write(frame)
+                self.logger.output(message, "sent", "You")
+                return True
+            except Exception as e:
+                self.logger.output(f"Send failed: {e}", "error", "System")
+                return False
+        return False
+
+    async def disconnect(self) -> None:
+        """Disconnect from server"""
+        self.running = False
+        if self.receive_task:
+            self.receive_task.cancel()
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.logger.output("Disconnected from server", "system", "System")
+        self.on_disconnect()
+
+    def set_encryption_key(self, key: str) -> None:
+        """Update encryption key"""
+        self.cipher.set_key(key)
+        self.logger.output(f"Encryption key updated", "system", "System")
+
+
+class EventLoopThread:
+    """An asyncio event loop running in a daemon thread
+
+    Other threads hand work to the loop with run() and call(), which
+    block until it is done; callbacks from the async classes run on the
+    loop thread, just as the threaded classes call them from their own
+    network threads.
+    """
+
+    TIMEOUT = 10.0
+
+    _shared: Optional['EventLoopThread'] = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> 'EventLoopThread':
+        """The process-wide loop used by the threaded facades"""
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared._thread.is_alive():
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, name: str = "ChatEventLoop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = TIMEOUT):
+        """Run a coroutine on the loop and wait for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    def call(self, func: Callable, *args, timeout: Optional[float] = TIMEOUT):
+        """Call a plain function on the loop and wait for its result"""
+        if threading.current_thread() is self._thread:
+            return func(*args)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def invoke():
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.loop.call_soon_threadsafe(invoke)
+        return future.result(timeout)
+
+    def stop(self) -> None:
+        """Stop the loop once pending callbacks have run"""
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=2.0)
+
+
+class ThreadedChatServer:
+    """Blocking, thread-safe facade over AsyncChatServer
+
+    Drop-in replacement for ChatServer: every method may be called from
+    any thread, and callbacks arrive on the event loop thread.
+    """
+
+    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
+                 cipher: Optional[XorCipher] = None, backlog: int = socket.SOMAXCONN,
+                 max_queue_bytes: int = MAX_QUEUE_BYTES, overflow: str = 'drop_oldest'):
+        self._loop = EventLoopThread.shared()
+        self.server = AsyncChatServer(host, port, logger, on_connect, on_disconnect, on_receive,
+                                      cipher=cipher, backlog=backlog, max_queue_bytes=max_queue_bytes,
+                                      overflow=overflow)
+
+    @property
+    def running(self) -> bool:
+        return self.server.running
+
+    @property
+    def client_count(self) -> int:
+        return self.server.client_count
+
+    def queue_depths(self) -> Dict[str, int]:
+        return self._loop.call(self.server.queue_depths)
+
+    def start(self) -> bool:
+        return self._loop.run(self.server.start())
+
+    def send(self, message: str) -> bool:
+        if not self.running:
+            return False
+        return self._loop.call(self.server.send, message)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self._loop.run(self.server.stop())
+
+    def set_encryption_key(self, key: str) -> None:
+        self.server.set_encryption_key(key)
+
+
+class ThreadedChatClient:
+    """Blocking, thread-safe facade over AsyncChatClient
+
+    Drop-in replacement for ChatClient: every method may be called from
+    any thread, and callbacks arrive on the event loop thread.
+    """
+
+    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
+                 cipher: Optional[XorCipher] = None):
+        self._loop = EventLoopThread.shared()
+        self.client = AsyncChatClient(host, port, logger, on_connect, on_disconnect, on_receive, cipher=cipher)
+
+    @property
+    def running(self) -> bool:
+        return self.client.running
+
+    def connect(self) -> bool:
+        return self._loop.run(self.client.connect())
+
+    def send(self, message: str) -> bool:
+        if not self.running:
+            return False
+        return self._loop.call(self.client.send, message)
+
+    def disconnect(self) -> None:
+        self._loop.run(self.client.disconnect())
+
+    def set_encryption_key(self, key: str) -> None:
+        self.client.set_encryption_key(key)
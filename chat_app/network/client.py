@@ -1,98 +1,340 @@
-# chat_app/network/client.py
-import socket
-import threading
-from typing import Optional
-from ..utils.crypto import XorCipher, get_cipher
-
-class ChatClient:
-    """Client network handler with XOR encryption"""
-    
-    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
-                 cipher: Optional[XorCipher] = None):
-        self.host = host
-        self.port = port
-        self.logger = logger
-        self.on_connect = on_connect
-        self.on_disconnect = on_disconnect
-        self.on_receive = on_receive
-        
-        self.cipher = cipher or get_cipher()
-        self.client_socket: Optional[socket.socket] = None
-        self.receive_thread: Optional[threading.Thread] = None
-        self.running = False
-        
-    def connect(self) -> bool:
-        """Connect to server"""
-        try:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.connect((self.host, self.port))
-            
-            self.running = True
-            self.logger.output(f"Connected to server at {self.host}:{self.port} (XOR encryption enabled)", "system", "System")
-            
-            # Notify GUI
-            self.on_connect()
-            
-            # Start receive thread
-            self.receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
-            self.receive_thread.start()
-            return True
-            
-        except Exception as e:
-            self.logger.output(f"Connection failed: {e}", "error", "System")
-            return False
-            
-    def _receive_messages(self) -> None:
-        """Receive and decrypt messages from server"""
-        try:
-            while self.running:
-                data = self.client_socket.recv(4096)  # Larger buffer for base64
-                if not data:
-                    self.logger.output("Server disconnected", "system", "System")
-                    self.on_disconnect()
-                    break
-                    
-                # Decrypt received data
+# chat_app/network/client.py
+import random
+import socket
+import threading
+import uuid
+from collections import deque
+from typing import Callable, Optional
+from ..utils.crypto import XorCipher, get_cipher
+from .protocol import (FrameDecoder, MessageAssembler, client_hello, decode_hello, accepted_features,
+                       iter_message_frames, encode_seq, encode_ack, KIND_MESSAGE, KIND_HELLO, KIND_SEQ,
+                       KIND_ACK, SEQ_HEADER, ACK_HEADER, FLAG_COMPRESSED, FLAG_BINARY)
+
+# Reconnect delays grow from BACKOFF_INITIAL, doubling up to BACKOFF_MAX
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+CONNECT_TIMEOUT = 10.0
+
+# Messages kept while reconnecting
+OFFLINE_QUEUE_SIZE = 1000
+
+# Received messages between cumulative acks
+ACK_EVERY = 32
+
+class ChatClient:
+    """Client network handler with XOR encryption
+
+    With `reconnect`, a lost connection is not the end of the client: it
+    retries with jittered exponential backoff until disconnect() is
+    called, reporting each wait to `on_reconnecting` and calling
+    `on_connect` again once back. Messages sent meanwhile wait in a queue
+    of up to `offline_queue_size` messages and go out in order, ahead of
+    anything newer, as soon as the connection is back. on_disconnect is
+    then only called by disconnect().
+
+    Reconnecting clients also ask the server to number messages. Each
+    message sent carries the client's own number and is kept until the
+    server acknowledges it, then resent after a reconnect; the server
+    relays it only once. send() fails while `offline_queue_size`
+    messages are unacknowledged. Received messages carry the server's number,
+    which the client acknowledges every ACK_EVERY messages and reports
+    back on reconnecting so the server replays what was missed (its own
+    messages included), and repeats are dropped. Servers that do not number
+    messages are served as before.
+    """
+
+    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
+                 cipher: Optional[XorCipher] = None, reconnect: bool = False,
+                 offline_queue_size: int = OFFLINE_QUEUE_SIZE,
+                 on_reconnecting: Optional[Callable[[float], None]] = None):
+        self.host = host
+        self.port = port
+        self.logger = logger
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.on_receive = on_receive
+        self.on_reconnecting = on_reconnecting
+        self.reconnect = reconnect
+
+        self.cipher = cipher or get_cipher()
+        self.client_socket: Optional[socket.socket] = None
+        self.receive_thread: Optional[threading.Thread] = None
+        self.running = False
+        self.connected = False
+        self.features = 0  # feature flags the server agreed to
+
+        self.offline_queue: deque = deque()
+        self.offline_queue_size = offline_queue_size
+
+        # Sequencing state; it outlives connections so a reconnect can
+        # pick up where the last one stopped
+        self.client_id = uuid.uuid4().hex
+        self.epoch: Optional[str] = None  # server run the numbers below belong to
+        self.last_seq = 0  # highest server sequence number received
+        self.sequenced = False  # whether the server numbers messages
+        self._next_seq = 1
+        self._unacked: deque = deque()  # (client seq, message) sent but not acknowledged
+        # Held while writing to the socket, so queued messages are flushed
+        # before any newer one can be sent
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def connect(self) -> bool:
+        """Connect to server"""
+        try:
+            self._stopped.clear()
+            self._open()
+
+            self.running = True
+            self.logger.output(f"Connected to server at {self.host}:{self.port} (XOR encryption enabled)", "system", "System")
+
+            # Notify GUI
+            self.on_connect()
+
+            # Start receive thread
+            self.receive_thread = threading.Thread(target=self._run, daemon=True)
+            self.receive_thread.start()
+            return True
+
+        except Exception as e:
+            self.logger.output(f"Connection failed: {e}", "error", "System")
+            return False
+
+    def _open(self) -> None:
+        """Open the socket, offer protocol features and flush the offline queue"""
+        sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._send_lock:
+            try:
+                # Offer compression and binary frames; until the server answers, send plain ones
+                self.features = 0
+                if self.reconnect:
+                    sock.sendall(client_hello(seq=True, client_id=self.client_id,
+                                              epoch=self.epoch, last_seq=self.last_seq))
+                    # Unacknowledged messages may not have arrived; the
+                    # server drops any that did by their numbers
+                    for seq, message in self._unacked:
+                        for frame in self._frames(message, seq):
+                            sock.sendall(frame)
+                else:
+                    sock.sendall(client_hello())
+                while self.offline_queue:
+                    message = self.offline_queue[0]
+                    for frame in self._frames(message, self._track(message)):
+                        sock.sendall(frame)
+                    self.offline_queue.popleft()
+            except OSError:
+                sock.close()
+                raise
+            self.client_socket = sock
+            self.connected = True
+
+    def _run(self) -> None:
+        """Receive until the connection drops, then reconnect if enabled"""
+        while True:
+            self._receive_messages()
+            with self._send_lock:
+                self.connected = False
+            if not self.running:
+                return
+            if not self.reconnect:
+                self.running = False
+                self.on_disconnect()
+                return
+            if not self._reconnect():
+                return
+
+    def _reconnect(self) -> bool:
+        """Retry with full-jitter exponential backoff until connected or stopped"""
+        attempt = 0
+        while self.running:
+            # A random delay spreads out clients that all lost the same server
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** attempt))
+            attempt += 1
+            self.logger.output(f"Reconnecting in {delay:.1f}s (attempt {attempt})", "system", "System")
+            if self.on_reconnecting:
+                self.on_reconnecting(delay)
+            if self._stopped.wait(delay):
+                return False
+            try:
+                self._open()
+            except OSError as e:
+                self.logger.output(f"Reconnect failed: {e}", "error", "System")
+                continue
+            if not self.running:
+                self.client_socket.close()
+                return False
+            self.logger.output(f"Reconnected to server at {self.host}:{self.port}", "system", "System")
+            self.on_connect()
+            return True
+        return False
+
+    def _receive_messages(self) -> None:
+        """Receive and decrypt messages from server"""
+        decoder = FrameDecoder()
+        assembler = MessageAssembler(self.cipher)
+        seq = None  # number of the message now arriving
+        unacked = 0  # messages received since the last ack
+        try:
+            while self.running:
+                data = self.client_socket.recv(65536)
+                if not data:
+                    if self.running:
+                        self.logger.output("Server disconnected", "system", "System")
+                    break
+
+                for frame in decoder.feed(data):
+                    if frame.kind == KIND_HELLO:
+                        self._handle_hello(decode_hello(frame.payload))
+                        continue
+                    if frame.kind == KIND_SEQ and len(frame.payload) == SEQ_HEADER.size:
+                        seq = SEQ_HEADER.unpack(frame.payload)[0]
+                        continue
+                    if frame.kind == KIND_ACK and len(frame.payload) == ACK_HEADER.size:
+                        self._handle_ack(*ACK_HEADER.unpack(frame.payload))
+                        continue
+                    if frame.kind != KIND_MESSAGE:
+                        continue
+
+                    # Decrypt received data, joining fragments of large messages
+                    try:
+                        decrypted = assembler.feed(frame)
+                    except ValueError as e:
+                        self.logger.output(f"Dropped message: {e}", "error", "System")
+                        seq = None
+                        continue
+                    if decrypted is None:
+                        continue
+
+                    number, seq = seq, None
+                    if number is not None:
+                        if number <= self.last_seq:
+                            continue  # already received before a reconnect
+                        self.last_seq = number
+                        unacked += 1
+                        if unacked >= ACK_EVERY:
+                            unacked = 0
+                            self._send_ack()
+
+                    # Show only chat content in the UI (no encrypted/base64 payload)
+                    self.logger.output(decrypted, "received", "Server", seq=number)
+
+        except Exception as e:
+            if self.running:
+                self.logger.output(f"Receive error: {e}", "error", "System")
+
+    def _handle_hello(self, reply: dict) -> None:
+        self.features = accepted_features(reply)
+        with self._send_lock:
+            self.sequenced = reply.get('seq') is True
+            if not self.sequenced:
+                # Nothing will be acknowledged, nor recognised if resent
+                self._unacked.clear()
+            elif reply.get('epoch') != self.epoch:
+                # A new server run: earlier numbers mean nothing to it
+                self.epoch = reply.get('epoch')
+                self.last_seq = reply.get('last_seq', 0)
+
+    def _handle_ack(self, acked: int, seq: int) -> None:
+        """Forget messages the server has acknowledged"""
+        with self._send_lock:
+            while self._unacked and self._unacked[0][0] <= acked:
+                self._unacked.popleft()
+            # The client never receives its own messages, so it counts them
+            # as seen through the server's numbers for them
+            self.last_seq = max(self.last_seq, seq)
+
+    def _send_ack(self) -> None:
+        """Tell the server every message up to last_seq has arrived"""
+        # Acks are cumulative, so one skipped while a send holds the
+        # socket is covered by the next
+        if not self._send_lock.acquire(blocking=False):
+            return
+        try:
+            if self.connected and self.sequenced:
+                self.client_socket.sendall(encode_ack(self.last_seq))
+        except OSError:
+            pass  # The receive loop notices the dead connection
+        finally:
+            self._send_lock.release()
+
+    def _track(self, message: str) -> Optional[int]:
+        """Number a message to be sent and keep it until acknowledged"""
+        if not self.sequenced:
+            return None
+        seq = self._next_seq
+        self._next_seq += 1
+        self._unacked.append((seq, message))
+        return seq
+
+    def _frames(self, message: str, seq: Optional[int]):
+        """Yield the frames of a message, numbered if `seq` is given"""
+        if seq is not None:
+            yield encode_seq(seq)
+        compress = bool(self.features & FLAG_COMPRESSED)
+        binary = bool(self.features & FLAG_BINARY)
+        yield from iter_message_frames(self.cipher, message, compress=compress, binary=binary)
+
+    def send(self, message: str) -> bool:
+        """Send encrypted message to server, or queue it while reconnecting"""
+        if not self.running:
+            return False
+        seq = None
+        with self._send_lock:
+            if self.sequenced and len(self._unacked) >= self.offline_queue_size:
+                # Each one may need resending, so none can be let go
+                self.logger.output("Send failed: too many messages waiting for the server to acknowledge them",
+                                   "error", "System")
+                return False
+            if self.connected:
+                seq = self._track(message)
                 try:
-                    decrypted = self.cipher.decrypt(data)
-                except Exception:
-                    # Fallback: treat as plain text
-                    decrypted = data.decode('utf-8')
-
-                # Show only chat content in the UI (no encrypted/base64 payload)
-                self.logger.output(decrypted, "received", "Server")
-                    
-        except Exception as e:
-            if self.running:
-                self.logger.output(f"Receive error: {e}", "error", "System")
-                self.on_disconnect()
-                
-    def send(self, message: str) -> bool:
-        """Send encrypted message to server"""
-        if self.client_socket and self.running:
-            try:
-                # Encrypt message
-                encrypted = self.cipher.encrypt(message)
-                self.client_socket.sendall(encrypted)
-                self.logger.output(message, "sent", "You")
-                return True
-            except Exception as e:
-                self.logger.output(f"Send failed: {e}", "error", "System")
-                return False
-        return False
-        
-    def disconnect(self) -> None:
-        """Disconnect from server"""
-        self.running = False
-        if self.client_socket:
-            try:
-                self.client_socket.close()
-            except:
-                pass
-        self.logger.output("Disconnected from server", "system", "System")
-        self.on_disconnect()
-        
-    def set_encryption_key(self, key: str) -> None:
-        """Update encryption key"""
-        self.cipher.set_key(key)
+                    # Encrypt message; large ones are streamed in fragments
+                    for frame in self._frames(message, seq):
+                        self.client_socket.sendall(frame)
+                    self.logger.output(message, "sent", "You")
+                    return True
+                except Exception as e:
+                    if not self.reconnect:
+                        self.logger.output(f"Send failed: {e}", "error", "System")
+                        return False
+                    # Wake the receive thread so it starts reconnecting
+                    self.connected = False
+                    try:
+                        self.client_socket.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+            elif not self.reconnect:
+                return False
+
+            # A numbered message stays unacknowledged and is resent anyway
+            if seq is None:
+                if len(self.offline_queue) >= self.offline_queue_size:
+                    self.logger.output("Send failed: offline queue is full", "error", "System")
+                    return False
+                self.offline_queue.append(message)
+        self.logger.output(message, "sent", "You")
+        self.logger.output("Not connected; message will be sent after reconnecting", "system", "System")
+        return True
+
+    def disconnect(self) -> None:
+        """Disconnect from server"""
+        self.running = False
+        self._stopped.set()
+        if self.client_socket:
+            try:
+                self.client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self.client_socket.close()
+            except:
+                pass
+        self.logger.output("Disconnected from server", "system", "System")
+        self.on_disconnect()
+
+    def set_encryption_key(self, key: str) -> None:
+        """Update encryption key"""
+        self.cipher.set_key(key)
         self.logger.output(f"Encryption key updated", "system", "System")
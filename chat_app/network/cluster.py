@@ -0,0 +1,226 @@
+# chat_app/network/cluster.py
+"""
+Pre-fork multi-process server
+
+run_cluster() forks N worker processes that each run their own ChatServer
+bound to the same port with SO_REUSEPORT, so the kernel spreads incoming
+connections across them and decryption and persistence run on every
+core. Each worker is linked to the parent over a Unix socket pair; the
+parent runs a ClusterHub that relays every complete message from one
+worker to all the others, so a broadcast reaches clients on every worker.
+
+Messages cross the hub still encrypted, as ordinary frames. Workers only
+decrypt what their own clients send.
+
+The hub bounds what it queues for each worker the way ChatServer bounds
+client queues, with the same overflow policies: drop the oldest queued
+messages, disconnect the stalled worker's link, or stop reading from
+the workers feeding it until it catches up.
+"""
+
+import os
+import selectors
+import signal
+import socket
+import sys
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from ..utils.logger import DualOutput
+from ..utils.metrics import REGISTRY
+from .outbound import OutboundQueues, MAX_QUEUE_BYTES, OVERFLOW_POLICIES
+from .protocol import FrameDecoder, FrameError, encode_frame, FLAG_MORE
+
+_bytes_relayed = REGISTRY.counter("chat_cluster_bytes_relayed_total", "Bytes queued for worker processes")
+_bytes_dropped = REGISTRY.counter("chat_cluster_bytes_dropped_total", "Queued bytes dropped for slow workers")
+_slow_disconnects = REGISTRY.counter("chat_cluster_slow_disconnects_total", "Worker links dropped for not reading")
+
+
+class _Worker:
+    """Hub side of the link to one worker process"""
+
+    __slots__ = ('pid', 'sock', 'decoder', 'relay', 'outq', 'queued', 'partial', 'events',
+                 'paused', 'blocked')
+
+    def __init__(self, pid: int, sock: socket.socket):
+        self.pid = pid
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.relay: List[bytes] = []
+        self.outq: deque = deque()  # whole messages waiting to be written
+        self.queued = 0  # bytes in outq
+        self.partial = False  # outq[0] is partly written
+        self.events = selectors.EVENT_READ
+        self.paused = 0  # congested workers holding this one back
+        self.blocked: List['_Worker'] = []  # workers this one is holding back
+
+
+class ClusterHub(OutboundQueues):
+    """Relays complete messages between worker processes
+
+    Like ChatServer, the hub buffers output per worker and never blocks on
+    a slow one; fragments of a large message are forwarded together once
+    the final one has arrived. A worker's queue holds at most
+    `max_queue_bytes` (0 for no limit); `overflow` says what happens then.
+    Dropped links and held-back workers are reported through `logger`,
+    standard error by default.
+    """
+
+    RECV_SIZE = 262144
+
+    queued_counter = _bytes_relayed
+    dropped_counter = _bytes_dropped
+    disconnect_counter = _slow_disconnects
+
+    def __init__(self, max_queue_bytes: int = MAX_QUEUE_BYTES, overflow: str = 'drop_oldest',
+                 logger=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.max_queue_bytes = max_queue_bytes
+        self.overflow = overflow
+        self.logger = logger or DualOutput(None, stream=sys.stderr)
+        self.selector = selectors.DefaultSelector()
+        self.workers: Dict[socket.socket, _Worker] = {}
+        self.running = False
+        self._producer: Optional[_Worker] = None  # worker whose messages are being relayed
+        self._congested: Dict[socket.socket, _Worker] = {}
+
+    def add_worker(self, pid: int, sock: socket.socket) -> None:
+        sock.setblocking(False)
+        worker = _Worker(pid, sock)
+        self.workers[sock] = worker
+        self.selector.register(sock, selectors.EVENT_READ, worker)
+
+    def run(self, stop_sock: socket.socket) -> None:
+        """Relay until stop_sock becomes readable or every worker is gone"""
+        self.selector.register(stop_sock, selectors.EVENT_READ, None)
+        self.running = True
+        while self.running and self.workers:
+            for key, mask in self.selector.select():
+                if key.data is None:
+                    self.running = False
+                    break
+                worker = key.data
+                if mask & selectors.EVENT_READ and worker.sock in self.workers:
+                    self._read(worker)
+                if mask & selectors.EVENT_WRITE and worker.sock in self.workers:
+                    self._flush_queue(worker)
+        self.selector.unregister(stop_sock)
+
+    def _read(self, worker: _Worker) -> None:
+        try:
+            data = worker.sock.recv(self.RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        try:
+            frames = worker.decoder.feed(data) if data else None
+        except FrameError:
+            frames = None
+        if frames is None:
+            self._remove(worker)
+            return
+
+        relay = []
+        for frame in frames:
+            worker.relay.append(encode_frame(frame.payload, frame.kind, frame.flags))
+            if not frame.flags & FLAG_MORE:
+                relay += worker.relay
+                worker.relay.clear()
+        if relay:
+            data = b''.join(relay)
+            self._producer = worker
+            try:
+                for other in list(self.workers.values()):
+                    if other is not worker:
+                        self._queue_data(other, data)
+            finally:
+                self._producer = None
+
+    def _is_open(self, worker: _Worker) -> bool:
+        return worker.sock in self.workers
+
+    def _close_connection(self, worker: _Worker) -> None:
+        self._remove(worker)
+
+    def _describe(self, worker: _Worker) -> str:
+        return f"worker {worker.pid}"
+
+    def _remove(self, worker: _Worker) -> None:
+        if self.workers.pop(worker.sock, None) is None:
+            return
+        if worker.blocked or worker.sock in self._congested:
+            self._release(worker)
+        if worker.events:
+            self.selector.unregister(worker.sock)
+        worker.sock.close()
+
+    def close(self) -> None:
+        for worker in list(self.workers.values()):
+            self._remove(worker)
+        self.selector.close()
+
+
+def run_cluster(workers: int, worker_main: Callable[[int, socket.socket], int],
+                max_queue_bytes: int = MAX_QUEUE_BYTES, overflow: str = 'drop_oldest',
+                logger=None) -> int:
+    """Fork `workers` processes and relay between them until signalled
+
+    worker_main(index, link) runs in each child and should start a
+    ChatServer with reuse_port=True, pass `link` to its add_link(), and
+    return an exit status once it has been asked to stop. It must open
+    its own database connection: SQLite handles do not survive fork().
+    max_queue_bytes and overflow bound the hub's queue for each worker;
+    the hub reports through `logger`.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT') or not hasattr(os, 'fork'):
+        raise RuntimeError("Multi-process mode needs fork() and SO_REUSEPORT")
+
+    hub = ClusterHub(max_queue_bytes, overflow, logger)
+    pids = []
+    for index in range(workers):
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        pid = os.fork()
+        if pid == 0:
+            # Child: drop the hub and every other worker's link
+            parent_sock.close()
+            for worker in hub.workers.values():
+                worker.sock.close()
+            status = 1
+            try:
+                status = worker_main(index, child_sock)
+            finally:
+                sys.stdout.flush()
+                os._exit(status)
+        child_sock.close()
+        hub.add_worker(pid, parent_sock)
+        pids.append(pid)
+
+    # Signals only need to wake the hub loop; workers get their own copy
+    stop_r, stop_w = socket.socketpair()
+    stop_w.setblocking(False)
+    previous_handlers = {signum: signal.signal(signum, lambda *_: None)
+                         for signum in (signal.SIGINT, signal.SIGTERM)}
+    previous_wakeup = signal.set_wakeup_fd(stop_w.fileno())
+    try:
+        hub.run(stop_r)
+    finally:
+        hub.close()
+        status = 0
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # The handlers stay installed until every worker is reaped, so a
+        # second Ctrl+C during shutdown cannot leave children behind
+        for pid in pids:
+            _, code = os.waitpid(pid, 0)
+            status = status or os.waitstatus_to_exitcode(code)
+
+        signal.set_wakeup_fd(previous_wakeup)
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        stop_r.close()
+        stop_w.close()
+    return status
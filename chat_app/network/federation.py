@@ -0,0 +1,166 @@
+# chat_app/network/federation.py
+"""
+Multi-node server federation
+
+A FederatedServer is a ChatServer that also links to other server nodes
+over TCP, so clients connected to different nodes can talk to each
+other. A node dials the peers it is given and accepts links from nodes
+that dial it; any connected graph of nodes works, cycles included.
+
+Every message a node's own clients send gets a (node id, message id)
+pair and is forwarded to all linked nodes behind a KIND_RELAY envelope.
+A node that receives a relayed message passes it to its local clients
+and floods it on to its other links. Loops are broken twice over:
+- every node remembers the ids it has seen in a bounded LRU set and
+  drops duplicates;
+- the envelope's hop count is decremented at each node, and a message
+  whose count runs out is not forwarded again.
+
+An inbound connection is kept out of client broadcasts until its first
+frame shows whether it is a node or a client, so a dialling node never
+receives client traffic as if it were a client.
+
+Messages cross nodes still encrypted, and compressed if their sender
+compressed them; only the node a client is connected to decrypts, shows
+and records what that client sends. A node decodes a relayed message only
+to re-encode it for local clients that did not negotiate compression.
+
+    # three nodes on one machine
+    python -m chat_app serve --port 7001 --federate
+    python -m chat_app serve --port 7002 --peer 127.0.0.1:7001
+    python -m chat_app serve --port 7003 --peer 127.0.0.1:7001 --peer 127.0.0.1:7002
+"""
+
+import itertools
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+from ..utils.crypto import XorCipher
+from .protocol import (RelayMessage, encode_frame, HEADER, HEADER_SIZE, RELAY_HEADER, KIND_LINK, KIND_RELAY,
+                       FLAG_MORE, FEATURE_FLAGS)
+from .server import ChatServer, _Peer, MAX_QUEUE_BYTES
+
+
+class FederatedServer(ChatServer):
+    """ChatServer that relays messages to and from other server nodes"""
+
+    DEFAULT_TTL = 8
+    SEEN_SIZE = 65536
+    CONNECT_TIMEOUT = 5.0
+
+    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
+                 cipher: Optional[XorCipher] = None, backlog: int = socket.SOMAXCONN,
+                 peers: Iterable[Tuple[str, int]] = (), node_id: Optional[bytes] = None,
+                 ttl: int = DEFAULT_TTL, max_queue_bytes: int = MAX_QUEUE_BYTES,
+                 overflow: str = 'drop_oldest',
+                 replay_source: Optional[Callable[[int, int], List[Tuple[int, str]]]] = None):
+        super().__init__(host, port, logger, on_connect, on_disconnect, on_receive,
+                         cipher=cipher, backlog=backlog, max_queue_bytes=max_queue_bytes,
+                         overflow=overflow, replay_source=replay_source)
+        self.node_id = node_id or uuid.uuid4().bytes
+        self.peer_addresses = list(peers)
+        self.ttl = ttl
+        self._seen: "OrderedDict[Tuple[bytes, int], None]" = OrderedDict()
+        # Ids keep growing across restarts, so peers never mistake a new
+        # message for one they saw before this node restarted
+        self._message_ids = itertools.count(time.time_ns())
+
+    def start(self) -> bool:
+        """Start the server, then link to the configured peers"""
+        if not super().start():
+            return False
+        for host, port in self.peer_addresses:
+            self.connect_peer(host, port)
+        return True
+
+    def connect_peer(self, host: str, port: int) -> bool:
+        """Open a link to another node"""
+        try:
+            sock = socket.create_connection((host, port), timeout=self.CONNECT_TIMEOUT)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # The handshake proves the nodes share an encryption key
+            sock.sendall(encode_frame(self.cipher.encrypt(self.node_id.hex()), KIND_LINK))
+        except OSError as e:
+            self.logger.output(f"Could not link to node {host}:{port}: {e}", "error", "System")
+            return False
+        self.add_link(sock)
+        self.logger.output(f"Linked to node {host}:{port}", "system", "System")
+        return True
+
+    def _handle_control(self, peer: _Peer, frame) -> None:
+        if frame.kind != KIND_LINK:
+            super()._handle_control(peer, frame)
+            return
+        try:
+            node_id = bytes.fromhex(self.cipher.decrypt(frame.payload))
+            if len(node_id) != 16:
+                raise ValueError("bad node id")
+        except ValueError:
+            self.logger.output(f"Rejected node link from {peer.addr[0]}:{peer.addr[1]}: bad handshake", "error", "System")
+            self._close_peer(peer)
+            return
+
+        peer.is_link = True
+        peer.accepts = FEATURE_FLAGS
+        # Client broadcasts held back during the handshake are not for links
+        self._end_handshake(peer, deliver=False)
+        self._link_count += 1
+        self.logger.output(f"Node {node_id.hex()[:8]} linked from {peer.addr[0]}:{peer.addr[1]}", "system", "System")
+        # No longer counted as a client
+        self.on_disconnect()
+
+    def _relay(self, messages: List[RelayMessage], sender: Optional[_Peer] = None) -> None:
+        """Deliver local messages to local clients and every linked node"""
+        self._deliver(messages, exclude=sender, links=False)
+        for message in messages:
+            message_id = next(self._message_ids)
+            self._remember((self.node_id, message_id))
+            self._forward(self.node_id, message_id, self.ttl, message.frames)
+
+    def _handle_link(self, peer: _Peer, frames) -> None:
+        """Deliver relayed messages once and flood them on to other nodes"""
+        local = []
+        for frame in frames:
+            peer.relay.append(encode_frame(frame.payload, frame.kind, frame.flags))
+            if frame.flags & FLAG_MORE:
+                continue
+            envelope, *message = peer.relay
+            peer.relay.clear()
+
+            if HEADER.unpack_from(envelope)[1] != KIND_RELAY:
+                # Not federated (e.g. a cluster worker link): deliver only
+                data = envelope + b''.join(message)
+            else:
+                origin, message_id, ttl = RELAY_HEADER.unpack_from(envelope, HEADER_SIZE)
+                if not self._remember((origin, message_id)):
+                    continue
+                data = b''.join(message)
+                self._forward(origin, message_id, ttl - 1, data, exclude=peer)
+            message = RelayMessage(self.cipher, data, HEADER.unpack_from(data)[2] & FEATURE_FLAGS)
+            self._sequence(message)
+            local.append(message)
+
+        if local:
+            self._deliver(local, exclude=peer, links=False)
+
+    def _forward(self, origin: bytes, message_id: int, ttl: int, data: bytes,
+                 exclude: Optional[_Peer] = None) -> None:
+        if ttl <= 0 or not self._link_count:
+            return
+        envelope = encode_frame(RELAY_HEADER.pack(origin, message_id, ttl), KIND_RELAY, FLAG_MORE)
+        packet = envelope + data
+        for peer in list(self.peers.values()):
+            if peer.is_link and peer is not exclude:
+                self._queue_data(peer, packet)
+
+    def _remember(self, key: Tuple[bytes, int]) -> bool:
+        """Record a message id; False if it was already seen"""
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self.SEEN_SIZE:
+            self._seen.popitem(last=False)
+        return True
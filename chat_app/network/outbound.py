@@ -0,0 +1,161 @@
+# chat_app/network/outbound.py
+"""
+Bounded per-connection output for selector loops
+
+ChatServer and ClusterHub never block on a slow reader: whatever a
+non-blocking send() does not take is queued for that connection and
+written with sendmsg() once the socket is writable again. OutboundQueues
+holds that logic once, including what happens when a queue would grow
+past its limit:
+- 'drop_oldest' discards the oldest whole queued messages;
+- 'disconnect' closes the connection;
+- 'backpressure' keeps the data but stops reading from whichever
+  connection produced it until the queue has drained to half its limit.
+"""
+
+import itertools
+import selectors
+
+# What to do when a connection's outbound queue would exceed its limit
+OVERFLOW_POLICIES = ('drop_oldest', 'disconnect', 'backpressure')
+MAX_QUEUE_BYTES = 4 * 1024 * 1024
+
+# Most buffers one sendmsg() call accepts
+IOV_MAX = 1024
+
+
+class OutboundQueues:
+    """Mixin queueing and flushing output for the connections of a selector loop
+
+    Connections carry `sock`, `outq` (a deque of whole messages), `queued`
+    (bytes in outq), `partial` (outq[0] is partly written), `events`,
+    `paused` (congested connections holding back reads from this one) and
+    `blocked` (producers paused until this one drains).
+
+    The host sets `selector`, `max_queue_bytes`, `overflow`, `logger`,
+    `_producer` (the connection whose input is being handled) and
+    `_congested`, names its counters in the class attributes below, and
+    implements _is_open(), _close_connection() and _describe(). Queues of
+    connections for which _unbounded() is true are never limited.
+    """
+
+    queued_counter = None  # bytes passed to _queue_data()
+    dropped_counter = None  # bytes discarded by 'drop_oldest'
+    disconnect_counter = None  # connections closed by 'disconnect'
+
+    def _is_open(self, conn) -> bool:
+        raise NotImplementedError
+
+    def _close_connection(self, conn) -> None:
+        raise NotImplementedError
+
+    def _describe(self, conn) -> str:
+        """Name of the connection in log lines, such as client 10.0.0.1:5000"""
+        raise NotImplementedError
+
+    def _unbounded(self, conn) -> bool:
+        return False
+
+    def _queue_data(self, conn, data: bytes) -> None:
+        self.queued_counter.inc(len(data))
+        if not conn.outq:
+            # Optimistic write: most sends complete without touching the selector
+            try:
+                sent = conn.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self._close_connection(conn)
+                return
+            if sent == len(data):
+                return
+            data = data[sent:]
+            conn.partial = sent > 0
+
+        if (not self._unbounded(conn) and self.max_queue_bytes
+                and conn.queued + len(data) > self.max_queue_bytes
+                and not self._overflow(conn, len(data))):
+            return
+        conn.outq.append(data)
+        conn.queued += len(data)
+        self._update_events(conn)
+
+    def _overflow(self, conn, size: int) -> bool:
+        """Apply the overflow policy to a full queue; False drops `size` new bytes"""
+        if self.overflow == 'disconnect':
+            self.disconnect_counter.inc()
+            self.logger.output(f"Disconnected slow {self._describe(conn)} "
+                               f"({conn.queued} bytes queued)", "error", "System")
+            self._close_connection(conn)
+            return False
+
+        if self.overflow == 'drop_oldest':
+            # Only whole messages go; a partly written one has to finish
+            keep = 1 if conn.partial else 0
+            while len(conn.outq) > keep and conn.queued + size > self.max_queue_bytes:
+                dropped = len(conn.outq.popleft())
+                conn.queued -= dropped
+                self.dropped_counter.inc(dropped)
+            return True
+
+        # Backpressure: keep the data, stop reading from whoever produced it
+        if conn.sock not in self._congested:
+            self._congested[conn.sock] = conn
+            self.logger.output(f"Holding back senders: {self._describe(conn)} is not keeping up",
+                               "system", "System")
+        producer = self._producer
+        if producer is not None and producer is not conn and producer not in conn.blocked:
+            conn.blocked.append(producer)
+            producer.paused += 1
+            self._update_events(producer)
+        return True
+
+    def _release(self, conn) -> None:
+        """Resume the producers a congested connection held back"""
+        self._congested.pop(conn.sock, None)
+        blocked, conn.blocked = conn.blocked, []
+        for producer in blocked:
+            producer.paused -= 1
+            if self._is_open(producer):
+                self._update_events(producer)
+
+    def _update_events(self, conn) -> None:
+        """Watch for reads unless paused, and for writes while data is queued"""
+        events = (0 if conn.paused else selectors.EVENT_READ) | (selectors.EVENT_WRITE if conn.outq else 0)
+        if events == conn.events:
+            return
+        if not events:
+            self.selector.unregister(conn.sock)
+        elif not conn.events:
+            self.selector.register(conn.sock, events, conn)
+        else:
+            self.selector.modify(conn.sock, events, conn)
+        conn.events = events
+
+    def _flush_queue(self, conn) -> None:
+        """Write as much queued data as the socket takes"""
+        queue = conn.outq
+        while queue:
+            try:
+                sent = conn.sock.sendmsg(itertools.islice(queue, IOV_MAX))
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self._close_connection(conn)
+                return
+            conn.queued -= sent
+            while sent:
+                head = queue[0]
+                if sent < len(head):
+                    queue[0] = memoryview(head)[sent:]
+                    conn.partial = True
+                    break
+                sent -= len(head)
+                queue.popleft()
+                conn.partial = False
+            if queue and conn.partial:
+                break  # The socket buffer is full
+
+        if conn.sock in self._congested and conn.queued <= self.max_queue_bytes // 2:
+            self._release(conn)
+        self._update_events(conn)
@@ -0,0 +1,429 @@
+# chat_app/network/protocol.py
+"""
+Length-prefixed framing for the chat wire protocol
+
+Every frame starts with a fixed binary header followed by the payload:
+
+    +----------------+--------+--------+-----------------+
+    | length (u32be) | kind   | flags  | payload ...     |
+    +----------------+--------+--------+-----------------+
+
+`length` counts payload bytes only. Frames never exceed the decoder's
+maximum frame size, so a corrupt or hostile length cannot make a peer
+buffer unbounded amounts of data.
+
+Large messages are split into fragments: every fragment but the last
+carries FLAG_MORE, and the concatenated fragment payloads form the same
+base64 text a single-frame message would carry.
+
+Federated servers (see federation.py) open a server-to-server link with a
+KIND_LINK frame and precede every message they forward with a KIND_RELAY
+envelope frame naming its origin node, message id and remaining hops.
+The envelope carries FLAG_MORE so it always travels together with the
+message frames that follow it.
+
+Optional features are negotiated with a KIND_HELLO frame whose payload is
+a small JSON object. A client that supports them sends one right after
+connecting, listing what it can decode:
+
+    {"version": 2, "compression": ["zlib"], "binary": true}
+
+and the server answers with what it picked, e.g. {"version": 2,
+"compression": "zlib", "binary": true}. Peers predating the handshake
+ignore the unknown frame kind and never answer, so both sides keep
+sending plain frames.
+
+Clients may also ask for sequencing by sending "seq": true with their
+client id and, when reconnecting, the "epoch" and "last_seq" they last
+saw. The server then numbers every message it sends them with a KIND_SEQ
+envelope (carrying FLAG_MORE, like KIND_RELAY) and replays the messages
+after `last_seq` if the epoch still matches, the client's own messages
+included. Sequenced clients number
+their own messages the same way. Each side acknowledges with KIND_ACK
+frames holding the highest number it has received. The server's acks
+also carry the sequence number it gave the acknowledged message; clients
+ack periodically, so the server can drop buffered messages that every
+client has.
+
+Once binary mode is agreed, message frames may carry FLAG_BINARY: their
+payload is the raw XOR output rather than its base64 text, a third
+smaller and without an encode/decode pass on either side.
+
+Once compression is agreed, message frames above COMPRESS_THRESHOLD bytes
+may carry FLAG_COMPRESSED: the UTF-8 text is deflated against the shared
+PRESET_DICTIONARY before XOR and base64. Fragmented messages are deflated
+as one stream, with FLAG_COMPRESSED on every fragment.
+"""
+
+import base64
+import codecs
+import json
+import struct
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+HEADER = struct.Struct('!IBB')
+HEADER_SIZE = HEADER.size
+
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# Frame kinds
+KIND_MESSAGE = 0x01
+KIND_RELAY = 0x02
+KIND_LINK = 0x03
+KIND_HELLO = 0x04
+KIND_SEQ = 0x05
+KIND_ACK = 0x06
+
+# Frame flags
+FLAG_MORE = 0x01
+FLAG_COMPRESSED = 0x02
+FLAG_BINARY = 0x04
+
+# Flags that change how a message payload is encoded, and so must be
+# negotiated before a peer is sent them
+FEATURE_FLAGS = FLAG_COMPRESSED | FLAG_BINARY
+
+PROTOCOL_VERSION = 2
+
+# Codecs this build can negotiate, in order of preference
+COMPRESSION_CODECS = ('zlib',)
+
+# Messages shorter than this gain too little from deflate to be worth it
+COMPRESS_THRESHOLD = 256
+COMPRESS_LEVEL = 6
+
+# Shared zlib dictionary: text both sides expect to see often, so even
+# short messages find back-references. Deflate favours the end of the
+# dictionary, so the most common strings come last. Changing it breaks
+# compatibility with peers that use the current one.
+PRESET_DICTIONARY = (
+    b'Traceback (most recent call last):\n  File "", line , in \n'
+    b'    raise Error: Exception: ValueError: KeyError: TypeError: '
+    b'DEBUG INFO WARNING ERROR CRITICAL 2025-01-01T00:00:00Z '
+    b'def return import from class self None True False '
+    b'function const let var => { } ( ) [ ] ; == != <= >= && || '
+    b'http://https://www..com/.org/ '
+    b'I think that we should do it. Can you please check the '
+    b'Thanks! Yes, no, okay, sure. What do you mean? '
+    b'is not the and to of in for on with that this it you '
+)
+
+# Plaintext bytes per fragment; a multiple of 3 keeps base64 groups aligned
+STREAM_CHUNK_SIZE = 48 * 1024
+
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Federation envelope: origin node id, message id, remaining hops
+RELAY_HEADER = struct.Struct('!16sQB')
+
+# Sequencing: the envelope's sequence number; an ack's cumulative number
+# and, from servers, the sequence number given to the acked message
+SEQ_HEADER = struct.Struct('!Q')
+ACK_HEADER = struct.Struct('!QQ')
+
+
+class FrameError(ValueError):
+    """Raised when the incoming byte stream violates the framing protocol"""
+
+
+class Frame(NamedTuple):
+    kind: int
+    flags: int
+    payload: bytes
+
+
+def encode_frame(payload: bytes, kind: int = KIND_MESSAGE, flags: int = 0) -> bytes:
+    """Prefix payload with a frame header"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds maximum of {MAX_FRAME_SIZE}")
+    return HEADER.pack(len(payload), kind, flags) + payload
+
+
+class FrameDecoder:
+    """Incremental decoder that reassembles frames from arbitrary chunks
+
+    Bytes are appended to a single reusable buffer; complete frames are
+    sliced out and the consumed prefix is dropped once per feed() call, so
+    pipelined frames arriving in one recv() cost one buffer compaction.
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Frame]:
+        """Consume a chunk of stream data and return every completed frame"""
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        offset = 0
+        available = len(buffer)
+
+        while available - offset >= HEADER_SIZE:
+            length, kind, flags = HEADER.unpack_from(buffer, offset)
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame of {length} bytes exceeds maximum of {self.max_frame_size}")
+            end = offset + HEADER_SIZE + length
+            if end > available:
+                break
+            frames.append(Frame(kind, flags, bytes(buffer[offset + HEADER_SIZE:end])))
+            offset = end
+
+        if offset:
+            del buffer[:offset]
+        return frames
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered bytes not yet forming a complete frame"""
+        return len(self._buffer)
+
+    def reset(self) -> None:
+        """Discard any partially received frame"""
+        self._buffer.clear()
+
+
+def iter_message_frames(cipher, message: str, chunk_size: int = STREAM_CHUNK_SIZE,
+                        compress: bool = False, binary: bool = False) -> Iterator[bytes]:
+    """Encrypt a message and yield its wire frames
+
+    Messages up to `chunk_size` bytes become one frame. Larger ones are
+    encrypted incrementally and yielded fragment by fragment, so the sender
+    never holds the whole base64 expansion in memory.
+
+    With `compress`, messages of at least COMPRESS_THRESHOLD bytes are
+    deflated first, unless that would not make them smaller. With
+    `binary`, payloads are raw XOR output instead of base64.
+    """
+    data = message.encode('utf-8')
+    flags = FLAG_BINARY if binary else 0
+    if compress and len(data) >= COMPRESS_THRESHOLD:
+        if len(data) > chunk_size:
+            yield from _iter_compressed_frames(cipher, data, chunk_size, flags | FLAG_COMPRESSED)
+            return
+        deflater = zlib.compressobj(COMPRESS_LEVEL, zdict=PRESET_DICTIONARY)
+        compressed = deflater.compress(data) + deflater.flush()
+        if len(compressed) < len(data):
+            data, flags = compressed, flags | FLAG_COMPRESSED
+
+    if len(data) <= chunk_size:
+        if flags == 0:
+            yield encode_frame(cipher.encrypt(message))
+        elif binary:
+            yield encode_frame(cipher.encrypt_bytes(data), flags=flags)
+        else:
+            yield encode_frame(base64.b64encode(cipher.encrypt_bytes(data)), flags=flags)
+        return
+
+    encryptor = cipher.encryptor('raw' if binary else 'base64')
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        yield encode_frame(encryptor.update(view[start:start + chunk_size]), flags=flags | FLAG_MORE)
+    yield encode_frame(encryptor.finalize(), flags=flags)
+
+
+def _iter_compressed_frames(cipher, data: bytes, chunk_size: int, flags: int) -> Iterator[bytes]:
+    """Deflate and encrypt a large message as a stream of fragments"""
+    deflater = zlib.compressobj(COMPRESS_LEVEL, zdict=PRESET_DICTIONARY)
+    encryptor = cipher.encryptor('raw' if flags & FLAG_BINARY else 'base64')
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        payload = encryptor.update(deflater.compress(view[start:start + chunk_size]))
+        if payload:
+            yield encode_frame(payload, flags=flags | FLAG_MORE)
+    yield encode_frame(encryptor.update(deflater.flush()) + encryptor.finalize(), flags=flags)
+
+
+def encode_hello(**fields) -> bytes:
+    """Build a KIND_HELLO frame carrying `fields` as JSON"""
+    return encode_frame(json.dumps(fields, separators=(',', ':')).encode('utf-8'), KIND_HELLO)
+
+
+def decode_hello(payload: bytes) -> dict:
+    """Parse a KIND_HELLO payload; malformed ones read as an empty hello"""
+    try:
+        fields = json.loads(payload.decode('utf-8'))
+    except ValueError:
+        return {}
+    return fields if isinstance(fields, dict) else {}
+
+
+def client_hello(**fields) -> bytes:
+    """The hello a client sends after connecting, offering every codec it has"""
+    return encode_hello(version=PROTOCOL_VERSION, compression=list(COMPRESSION_CODECS), binary=True, **fields)
+
+
+def encode_seq(seq: int) -> bytes:
+    """KIND_SEQ envelope numbering the message frames that follow it"""
+    return encode_frame(SEQ_HEADER.pack(seq), KIND_SEQ, FLAG_MORE)
+
+
+def encode_ack(acked: int, seq: int = 0) -> bytes:
+    """KIND_ACK frame acknowledging everything up to `acked`"""
+    return encode_frame(ACK_HEADER.pack(acked, seq), KIND_ACK)
+
+
+def negotiate(hello: dict) -> Tuple[int, dict]:
+    """Pick features for a client hello
+
+    Returns the feature flags the client may be sent and the fields of
+    the hello to answer it with.
+    """
+    offered = hello.get('compression')
+    offered = offered if isinstance(offered, list) else []
+    codec = next((codec for codec in COMPRESSION_CODECS if codec in offered), None)
+    binary = hello.get('binary') is True
+    reply = {'version': PROTOCOL_VERSION, 'compression': codec, 'binary': binary}
+    return accepted_features(reply), reply
+
+
+def accepted_features(hello: dict) -> int:
+    """Feature flags a server's hello reply enables"""
+    features = 0
+    if hello.get('compression') in COMPRESSION_CODECS:
+        features |= FLAG_COMPRESSED
+    if hello.get('binary') is True:
+        features |= FLAG_BINARY
+    return features
+
+
+class MessageAssembler:
+    """Decrypts message frames from one connection, joining fragments
+
+    Fragment payloads are decrypted as they arrive with a streaming
+    decryptor, so only the decoded text is retained until the final frame.
+    Compressed messages are inflated on the fly; both the wire size and
+    the inflated size are held to `max_message_size`.
+    Payloads that fail to decrypt raise ValueError.
+    """
+
+    def __init__(self, cipher, max_message_size: int = MAX_MESSAGE_SIZE):
+        self.cipher = cipher
+        self.max_message_size = max_message_size
+        self._decryptor = None
+        self._inflater = None
+        self._text = None
+        self._parts: List[str] = []
+        self._size = 0
+        self._inflated = 0
+
+    def feed(self, frame: Frame) -> Optional[str]:
+        """Process one message frame; returns the text once a message is complete"""
+        if self._decryptor is None and not frame.flags & (FLAG_MORE | FLAG_COMPRESSED):
+            if frame.flags & FLAG_BINARY:
+                return self.cipher.decrypt_bytes(frame.payload).decode('utf-8', errors='replace')
+            return self.cipher.decrypt(frame.payload)
+
+        if self._decryptor is None:
+            self._decryptor = self.cipher.decryptor('raw' if frame.flags & FLAG_BINARY else 'base64')
+            self._text = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            if frame.flags & FLAG_COMPRESSED:
+                self._inflater = zlib.decompressobj(zdict=PRESET_DICTIONARY)
+
+        self._size += len(frame.payload)
+        if self._size > self.max_message_size:
+            self.reset()
+            raise FrameError(f"Message exceeds maximum of {self.max_message_size} bytes")
+
+        final = not frame.flags & FLAG_MORE
+        try:
+            data = self._decryptor.update(frame.payload)
+            if final:
+                data += self._decryptor.finalize()
+            if self._inflater is not None:
+                data = self._inflate(data, final)
+            self._parts.append(self._text.decode(data, final=final))
+        except ValueError:
+            self.reset()
+            raise
+        if not final:
+            return None
+
+        message = ''.join(self._parts)
+        self.reset()
+        return message
+
+    def _inflate(self, data: bytes, final: bool) -> bytes:
+        # Never inflate past the limit, whatever the compressed size
+        room = self.max_message_size - self._inflated
+        try:
+            output = self._inflater.decompress(data, room + 1)
+            if final and not self._inflater.unconsumed_tail:
+                output += self._inflater.flush()
+        except zlib.error as e:
+            raise ValueError(f"Decompression failed: {e}")
+        self._inflated += len(output)
+        if self._inflated > self.max_message_size or self._inflater.unconsumed_tail:
+            self.reset()
+            raise FrameError(f"Message inflates past maximum of {self.max_message_size} bytes")
+        return output
+
+    def reset(self) -> None:
+        """Drop any partially assembled message"""
+        self._decryptor = None
+        self._inflater = None
+        self._text = None
+        self._parts = []
+        self._size = 0
+        self._inflated = 0
+
+
+class RelayMessage:
+    """A complete message on its way to several peers
+
+    `frames` is the message as it arrived, `features` the FEATURE_FLAGS
+    it was encoded with. encoded() hands each peer the original frames
+    when it accepts those features and otherwise re-encodes the text,
+    once per distinct feature set, so a fan-out to mixed peers costs at
+    most one extra encoding.
+    """
+
+    __slots__ = ('cipher', 'frames', 'features', 'text', 'seq', '_encodings')
+
+    def __init__(self, cipher, frames: bytes, features: int, text: Optional[str] = None):
+        self.cipher = cipher
+        self.frames = frames
+        self.features = features
+        self.text = text
+        self.seq: Optional[int] = None  # sequence number given by this server
+        self._encodings: Optional[Dict[int, bytes]] = None
+
+    @classmethod
+    def from_text(cls, cipher, text: str, features: int = 0) -> 'RelayMessage':
+        """Encode a message sent by this node using the given feature flags"""
+        frames = b''.join(iter_message_frames(cipher, text, compress=bool(features & FLAG_COMPRESSED),
+                                              binary=bool(features & FLAG_BINARY)))
+        return cls(cipher, frames, HEADER.unpack_from(frames)[2] & FEATURE_FLAGS, text)
+
+    def encoded(self, accepts: int) -> bytes:
+        """Frames for a peer that accepts the `accepts` feature flags"""
+        if not self.features & ~accepts:
+            return self.frames
+        features = self.features & accepts
+        if self._encodings is None:
+            self._encodings = {}
+        data = self._encodings.get(features)
+        if data is None:
+            if self.text is None:
+                self.text = self._decode()
+            if self.text is None:
+                data = b''
+            else:
+                data = b''.join(iter_message_frames(self.cipher, self.text,
+                                                    compress=bool(features & FLAG_COMPRESSED),
+                                                    binary=bool(features & FLAG_BINARY)))
+            self._encodings[features] = data
+        return data
+
+    def _decode(self) -> Optional[str]:
+        assembler = MessageAssembler(self.cipher)
+        try:
+            for frame in FrameDecoder().feed(self.frames):
+                if frame.kind == KIND_MESSAGE:
+                    text = assembler.feed(frame)
+                    if text is not None:
+                        return text
+        except ValueError:
+            pass
+        return None
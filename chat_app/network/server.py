@@ -1,127 +1,702 @@
-# chat_app/network/server.py
-import socket
-import threading
-from typing import Optional, Callable
-from ..utils.crypto import XorCipher, get_cipher
-
-class ChatServer:
-    """Server network handler with XOR encryption"""
-    
-    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive, 
-                 cipher: Optional[XorCipher] = None):
-        self.host = host
-        self.port = port
-        self.logger = logger
-        self.on_connect = on_connect
-        self.on_disconnect = on_disconnect
-        self.on_receive = on_receive
-        
-        self.cipher = cipher or get_cipher()
-        self.server_socket: Optional[socket.socket] = None
-        self.client_conn: Optional[socket.socket] = None
-        self.client_addr = None
-        self.running = False
-        
-    def start(self) -> bool:
-        """Start the server"""
-        try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(1)
-            
-            self.running = True
-            self.logger.output(f"Server started on {self.host}:{self.port} (XOR encryption enabled)", "system", "System")
-            
-            # Start accept thread
-            accept_thread = threading.Thread(target=self._accept_clients, daemon=True)
-            accept_thread.start()
-            return True
-            
-        except Exception as e:
-            self.logger.output(f"Failed to start server: {e}", "error", "System")
-            return False
-            
-    def _accept_clients(self) -> None:
-        """Accept incoming connections"""
-        try:
-            self.server_socket.settimeout(1.0)
-            while self.running:
-                try:
-                    conn, addr = self.server_socket.accept()
-                    self.client_conn = conn
-                    self.client_addr = addr
-                    self.logger.output(f"Client connected from {addr[0]}:{addr[1]}", "system", "System")
-                    
-                    # Notify GUI
-                    self.on_connect(addr)
-                    
-                    # Handle client
-                    self._handle_client(conn, addr)
-                    break
-                except socket.timeout:
-                    continue
-        except Exception as e:
-            if self.running:
-                self.logger.output(f"Accept error: {e}", "error", "System")
-                
-    def _handle_client(self, conn: socket.socket, addr) -> None:
-        """Handle client communication with decryption"""
-        try:
-            while self.running:
-                data = conn.recv(4096)  # Larger buffer for base64
-                if not data:
-                    self.logger.output("Client disconnected", "system", "System")
-                    break
-                    
-                # Decrypt received data
+# chat_app/network/server.py
+import itertools
+import socket
+import selectors
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, List, Tuple
+from ..utils.crypto import XorCipher, get_cipher
+from ..utils.metrics import REGISTRY
+from .outbound import OutboundQueues, OVERFLOW_POLICIES, MAX_QUEUE_BYTES
+from .protocol import (FrameDecoder, FrameError, MessageAssembler, RelayMessage, encode_frame,
+                       encode_hello, decode_hello, negotiate, encode_seq, encode_ack, KIND_MESSAGE,
+                       KIND_HELLO, KIND_SEQ, KIND_ACK, SEQ_HEADER, ACK_HEADER, FLAG_MORE, FEATURE_FLAGS)
+
+
+_bytes_received = REGISTRY.counter("chat_server_bytes_received_total", "Bytes read from peers")
+_bytes_queued = REGISTRY.counter("chat_server_bytes_sent_total", "Bytes queued for peers")
+_messages_received = REGISTRY.counter("chat_server_messages_received_total", "Messages received from clients")
+_bytes_dropped = REGISTRY.counter("chat_server_bytes_dropped_total", "Queued bytes dropped for slow clients")
+_slow_disconnects = REGISTRY.counter("chat_server_slow_disconnects_total", "Clients disconnected for not reading")
+_duplicates = REGISTRY.counter("chat_server_duplicate_messages_total", "Resent client messages dropped as duplicates")
+_replayed = REGISTRY.counter("chat_server_replayed_messages_total", "Messages replayed to reconnecting clients")
+# Labelled with each running server's address
+_clients = REGISTRY.gauge("chat_server_clients", "Connected clients")
+_queued_bytes = REGISTRY.gauge("chat_server_queued_bytes", "Bytes queued for all clients")
+_max_queued_bytes = REGISTRY.gauge("chat_server_max_queued_bytes", "Bytes queued for the most backed-up client")
+
+# Recent messages kept in memory for replay, and the most replayed at once
+REPLAY_BUFFER_SIZE = 4096
+MAX_REPLAY = 10000
+
+# Sequenced clients whose last message number is remembered for dedup,
+# and whose acks are remembered for trimming the replay buffer
+CLIENT_STATE_SIZE = 65536
+
+# Seconds between trims of the replay buffer
+HISTORY_TRIM_INTERVAL = 1.0
+
+# Seconds a new connection may take to say what it is before it is taken
+# for a client that only listens
+HANDSHAKE_TIMEOUT = 0.5
+
+
+class _Peer:
+    """Per-connection state owned by the server event loop"""
+
+    __slots__ = ('sock', 'addr', 'decoder', 'assembler', 'outq', 'queued', 'partial', 'events',
+                 'paused', 'blocked', 'relay', 'is_link', 'accepts', 'client_id', 'sequenced',
+                 'pending_seq', 'held', 'held_bytes', 'deadline', 'replaying', 'held_ack')
+
+    def __init__(self, sock: socket.socket, addr, cipher: XorCipher, is_link: bool = False):
+        self.sock = sock
+        self.addr = addr
+        self.decoder = FrameDecoder()
+        self.assembler = MessageAssembler(cipher)
+        self.outq: deque = deque()  # whole messages waiting to be written
+        self.queued = 0  # bytes in outq
+        self.partial = False  # the head of outq is partly written
+        self.events = selectors.EVENT_READ
+        self.paused = 0  # congested peers holding back reads from this one
+        self.blocked: List['_Peer'] = []  # producers paused until this peer drains
+        self.relay: List[bytes] = []  # frames of a fragmented message still arriving
+        self.is_link = is_link
+        # Feature flags the peer negotiated; server links understand them all
+        self.accepts = FEATURE_FLAGS if is_link else 0
+        self.client_id: Optional[str] = None  # from the hello of a sequenced client
+        self.sequenced = False
+        self.pending_seq: Optional[int] = None  # number of the message now arriving
+        # Broadcasts kept back until the handshake says what the peer is;
+        # None once it has
+        self.held: Optional[List[RelayMessage]] = None
+        self.held_bytes = 0
+        self.deadline = 0.0  # when the handshake times out
+        self.replaying = False  # older messages are being loaded for it
+        self.held_ack: Optional[Tuple[int, int]] = None  # ack to send once the replay is queued
+
+
+class ChatServer(OutboundQueues):
+    """Multi-client server handler with XOR encryption
+
+    A single selectors-based event loop owns the listening socket and every
+    client connection. Messages received from one client are fanned out to
+    all other clients, and outgoing data is buffered per peer so a slow
+    reader never blocks the loop or the caller of send().
+
+    Links added with add_link() connect the server to other servers (for
+    example sibling worker processes). Messages from clients are also
+    relayed over every link, and messages arriving on a link are passed
+    to local clients only, still encrypted and without being decrypted.
+
+    Clients that send a KIND_HELLO get compressed, binary messages; the
+    others are sent plain base64 frames, re-encoded once per message when
+    needed.
+
+    Each client's outbound queue holds at most `max_queue_bytes`. When a
+    client stops reading and its queue fills up, `overflow` decides what
+    gives:
+    - 'drop_oldest' discards its oldest queued messages;
+    - 'disconnect' closes the connection;
+    - 'backpressure' stops reading from whichever client is producing
+      the traffic, and refuses send(), until the queue has drained to
+      half its limit.
+    Server links are never dropped or disconnected.
+
+    A new connection gets no broadcasts until its first frame (or
+    HANDSHAKE_TIMEOUT) shows whether it is a client or a server link;
+    what it missed meanwhile is then delivered to clients.
+
+    Every message delivered to clients gets the next sequence number of
+    this server's `epoch`. Clients that ask for sequencing in their hello
+    receive the numbers with each message, and on reconnecting are
+    replayed what they missed: from a ring buffer of the latest
+    REPLAY_BUFFER_SIZE messages, or, further back, from `replay_source`,
+    a callable returning the (seq, text) rows with after < seq < before
+    that this server recorded. Messages every sequenced client has
+    acknowledged leave the ring buffer early. replay_source runs on a worker thread, and
+    broadcasts to the client are held back until its replay is queued.
+    A replay holds the client's own messages too, from either source,
+    since the database does not record which client sent a message.
+    Messages a sequenced client resends after a reconnect are recognised
+    by its own numbering and relayed only once.
+    """
+
+    RECV_SIZE = 65536
+
+    queued_counter = _bytes_queued
+    dropped_counter = _bytes_dropped
+    disconnect_counter = _slow_disconnects
+
+    def __init__(self, host: str, port: int, logger, on_connect, on_disconnect, on_receive,
+                 cipher: Optional[XorCipher] = None, backlog: int = socket.SOMAXCONN,
+                 reuse_port: bool = False, max_queue_bytes: int = MAX_QUEUE_BYTES,
+                 overflow: str = 'drop_oldest',
+                 replay_source: Optional[Callable[[int, int], List[Tuple[int, str]]]] = None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.host = host
+        self.port = port
+        self.logger = logger
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.on_receive = on_receive
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self.max_queue_bytes = max_queue_bytes
+        self.overflow = overflow
+        self.replay_source = replay_source
+
+        self.cipher = cipher or get_cipher()
+        self.server_socket: Optional[socket.socket] = None
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.peers: Dict[socket.socket, _Peer] = {}
+        self.running = False
+
+        self._loop_thread: Optional[threading.Thread] = None
+        self._calls: deque = deque()
+        self._wakeup_r: Optional[socket.socket] = None
+        self._wakeup_w: Optional[socket.socket] = None
+        self._links: List[socket.socket] = []
+        self._link_count = 0
+        self._producer: Optional[_Peer] = None  # peer whose data is being handled
+        self._congested: Dict[socket.socket, _Peer] = {}
+        self._handshaking: "OrderedDict[socket.socket, _Peer]" = OrderedDict()
+        self._metric_labels: Dict[str, str] = {}  # this server's labels on the shared gauges
+
+        # Sequence numbers restart with every server, so they are scoped
+        # to an epoch clients must match before being replayed anything
+        self.epoch = uuid.uuid4().hex
+        self.last_seq = 0
+        self._history: deque = deque(maxlen=REPLAY_BUFFER_SIZE)
+        # client id -> (its last message number, the sequence number given to it)
+        self._client_seqs: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+        # client id -> highest sequence number it has acknowledged
+        self._client_acks: "OrderedDict[str, int]" = OrderedDict()
+        self._trim_at = 0.0
+        self._replay_pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def client_count(self) -> int:
+        """Number of currently connected clients"""
+        return len(self.peers) - self.link_count
+
+    @property
+    def link_count(self) -> int:
+        """Number of connected server links"""
+        return self._link_count
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Bytes queued for each client, keyed by host:port"""
+        return {f"{peer.addr[0]}:{peer.addr[1]}": peer.queued
+                for peer in list(self.peers.values()) if not peer.is_link}
+
+    def add_link(self, sock: socket.socket) -> None:
+        """Relay messages to and from another server over a connected socket"""
+        if self.running:
+            self._call_soon(lambda: self._register_link(sock))
+        else:
+            self._links.append(sock)
+
+    def _register_link(self, sock: socket.socket) -> None:
+        sock.setblocking(False)
+        peer = _Peer(sock, ('link', sock.fileno()), self.cipher, is_link=True)
+        self.peers[sock] = peer
+        self._link_count += 1
+        self.selector.register(sock, selectors.EVENT_READ, peer)
+
+    def start(self) -> bool:
+        """Start the server"""
+        try:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                # Several processes accept on the same port; the kernel spreads connections
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(self.backlog)
+            self.server_socket.setblocking(False)
+
+            # Self-pipe used by other threads to wake the event loop
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._wakeup_r.setblocking(False)
+            self._wakeup_w.setblocking(False)
+
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.server_socket, selectors.EVENT_READ, self._accept_clients)
+            self.selector.register(self._wakeup_r, selectors.EVENT_READ, self._drain_wakeup)
+            for sock in self._links:
+                self._register_link(sock)
+            self._links.clear()
+
+            self.running = True
+            self._metric_labels = {"server": f"{self.host}:{self.server_socket.getsockname()[1]}"}
+            _clients.labels(**self._metric_labels).set_function(lambda: self.client_count)
+            _queued_bytes.labels(**self._metric_labels).set_function(lambda: sum(self.queue_depths().values()))
+            _max_queued_bytes.labels(**self._metric_labels).set_function(
+                lambda: max(self.queue_depths().values(), default=0))
+            self.logger.output(f"Server started on {self.host}:{self.port} (XOR encryption enabled)", "system", "System")
+
+            # Start event loop thread
+            self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+            self._loop_thread.start()
+            return True
+
+        except Exception as e:
+            self.logger.output(f"Failed to start server: {e}", "error", "System")
+            self._close_sockets()
+            return False
+
+    def _run_loop(self) -> None:
+        """Dispatch socket readiness events until the server stops"""
+        try:
+            while self.running:
+                timeout = 1.0
+                if self._handshaking:
+                    deadline = next(iter(self._handshaking.values())).deadline
+                    timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+                for key, mask in self.selector.select(timeout=timeout):
+                    if isinstance(key.data, _Peer):
+                        self._service_peer(key.data, mask)
+                    else:
+                        key.data()
+                if self._handshaking:
+                    self._expire_handshakes()
+                if self._client_acks and time.monotonic() >= self._trim_at:
+                    self._trim_history()
+        except Exception as e:
+            if self.running:
+                self.logger.output(f"Event loop error: {e}", "error", "System")
+        finally:
+            for peer in list(self.peers.values()):
+                self._close_peer(peer, notify=False)
+            self._close_sockets()
+            if self._replay_pool is not None:
+                self._replay_pool.shutdown(wait=False)
+                self._replay_pool = None
+
+    def _call_soon(self, callback: Callable[[], None]) -> None:
+        """Schedule a callback on the event loop thread"""
+        self._calls.append(callback)
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Loop is already awake or shutting down
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        while self._calls:
+            self._calls.popleft()()
+
+    def _accept_clients(self) -> None:
+        """Accept all pending incoming connections"""
+        while True:
+            try:
+                conn, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.running:
+                    self.logger.output(f"Accept error: {e}", "error", "System")
+                return
+
+            conn.setblocking(False)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            peer = _Peer(conn, addr, self.cipher)
+            peer.held = []
+            peer.deadline = time.monotonic() + HANDSHAKE_TIMEOUT
+            self.peers[conn] = peer
+            self._handshaking[conn] = peer
+            self.selector.register(conn, selectors.EVENT_READ, peer)
+            self.logger.output(f"Client connected from {addr[0]}:{addr[1]}", "system", "System")
+
+            # Notify GUI
+            self.on_connect(addr)
+
+    def _service_peer(self, peer: _Peer, mask: int) -> None:
+        if mask & selectors.EVENT_READ:
+            # Whatever this read makes us queue is this peer's doing
+            self._producer = peer
+            try:
+                self._handle_client(peer)
+            finally:
+                self._producer = None
+        if mask & selectors.EVENT_WRITE and peer.sock in self.peers:
+            self._flush_queue(peer)
+
+    def _handle_client(self, peer: _Peer) -> None:
+        """Read from a client, decrypt and fan the message out to the others"""
+        try:
+            data = peer.sock.recv(self.RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            if self.running:
+                self.logger.output(f"Client error: {e}", "error", "System")
+            self._close_peer(peer)
+            return
+
+        if not data:
+            if peer.is_link:
+                self.logger.output("Server link closed", "system", "System")
+            else:
+                self.logger.output(f"Client {peer.addr[0]}:{peer.addr[1]} disconnected", "system", "System")
+            self._close_peer(peer)
+            return
+
+        _bytes_received.inc(len(data))
+        try:
+            frames = peer.decoder.feed(data)
+        except FrameError as e:
+            self.logger.output(f"Protocol error from {peer.addr[0]}:{peer.addr[1]}: {e}", "error", "System")
+            self._close_peer(peer)
+            return
+
+        if peer.is_link:
+            self._handle_link(peer, frames)
+            return
+
+        relay = []
+        ack = None
+        for index, frame in enumerate(frames):
+            if frame.kind != KIND_MESSAGE:
+                self._handle_control(peer, frame)
+                if peer.sock not in self.peers:
+                    return
+                if peer.is_link:
+                    # Handshake turned the connection into a server link
+                    self._handle_link(peer, frames[index + 1:])
+                    break
+                continue
+
+            if peer.held is not None and not peer.replaying:
+                self._end_handshake(peer)  # A client that never says hello
+
+            # Decrypt received data, joining fragments of large messages
+            try:
+                decrypted = peer.assembler.feed(frame)
+            except FrameError as e:
+                self.logger.output(f"Protocol error from {peer.addr[0]}:{peer.addr[1]}: {e}", "error", "System")
+                self._close_peer(peer)
+                return
+            except ValueError as e:
+                self.logger.output(f"Dropped message from {peer.addr[0]}: {e}", "error", "System")
+                peer.relay.clear()
+                peer.pending_seq = None
+                continue
+
+            # Fragments are held back until their message is complete, so
+            # messages from different senders never interleave on the wire
+            peer.relay.append(encode_frame(frame.payload, flags=frame.flags))
+            if frame.flags & FLAG_MORE:
+                continue
+            message = RelayMessage(self.cipher, b''.join(peer.relay), frame.flags & FEATURE_FLAGS, decrypted)
+            peer.relay.clear()
+
+            client_seq, peer.pending_seq = peer.pending_seq, None
+            if client_seq is not None:
+                seen = self._client_seqs.get(peer.client_id)
+                if seen is not None and client_seq <= seen[0]:
+                    # Resent after a reconnect; it was relayed the first time
+                    _duplicates.inc()
+                    ack = seen
+                    continue
+            self._sequence(message)
+            if client_seq is not None:
+                ack = self._client_seqs[peer.client_id] = (client_seq, message.seq)
+                self._client_seqs.move_to_end(peer.client_id)
+                if len(self._client_seqs) > CLIENT_STATE_SIZE:
+                    self._client_seqs.popitem(last=False)
+            relay.append(message)
+
+            # Show only chat content in the UI (no encrypted/base64 payload)
+            _messages_received.inc()
+            self.logger.output(decrypted, "received", f"Client({peer.addr[0]})", seq=message.seq)
+
+        # Relay the still-encrypted frames to every other client in one write
+        if relay:
+            self._relay(relay, peer)
+        if ack is not None and peer.sock in self.peers:
+            if peer.replaying:
+                # Its sequence number would make the client drop the replay
+                peer.held_ack = ack
+            else:
+                self._queue_data(peer, encode_ack(*ack))
+
+    def _handle_control(self, peer: _Peer, frame) -> None:
+        """Handle a non-message frame from a client; unknown kinds are ignored"""
+        if frame.kind == KIND_SEQ and peer.sequenced and len(frame.payload) == SEQ_HEADER.size:
+            peer.pending_seq = SEQ_HEADER.unpack(frame.payload)[0]
+        elif frame.kind == KIND_ACK and peer.sequenced and len(frame.payload) == ACK_HEADER.size:
+            self._note_ack(peer.client_id, min(ACK_HEADER.unpack(frame.payload)[0], self.last_seq))
+        elif frame.kind == KIND_HELLO:
+            hello = decode_hello(frame.payload)
+            peer.accepts, reply = negotiate(hello)
+            last_seq = hello.get('last_seq')
+            replay = False
+            if hello.get('seq') is True and isinstance(hello.get('client_id'), str):
+                peer.sequenced = True
+                peer.client_id = hello['client_id'][:64]
+                replay = hello.get('epoch') == self.epoch and isinstance(last_seq, int)
+                # A new client takes everything up to last_seq as seen, so
+                # broadcasts held back since it connected are numbered after it
+                seen = self.last_seq
+                if not replay and peer.held:
+                    seen = peer.held[0].seq - 1
+                reply.update(seq=True, epoch=self.epoch, last_seq=seen)
+                self._note_ack(peer.client_id, min(last_seq, self.last_seq) if replay else seen)
+            self._queue_data(peer, encode_hello(**reply))
+            if replay:
+                self._replay(peer, last_seq)
+            elif peer.held is not None:
+                self._end_handshake(peer)
+
+    def _end_handshake(self, peer: _Peer, deliver: bool = True) -> None:
+        """Add a new connection to broadcasts, first delivering what it missed"""
+        held, peer.held = peer.held, None
+        peer.held_bytes = 0
+        self._handshaking.pop(peer.sock, None)
+        if deliver and held:
+            data = b''.join(self._encode(held, peer.accepts, peer.sequenced))
+            if data:
+                self._queue_data(peer, data)
+
+    def _release_held(self, peer: _Peer, covered: int) -> None:
+        """End a replayed client's handshake; messages up to `covered` were replayed"""
+        if peer.held:
+            peer.held = [message for message in peer.held if message.seq > covered]
+        self._end_handshake(peer)
+
+    def _expire_handshakes(self) -> None:
+        """Treat connections that stayed silent as clients"""
+        now = time.monotonic()
+        while self._handshaking:
+            peer = next(iter(self._handshaking.values()))
+            if peer.deadline > now:
+                break
+            self._end_handshake(peer)
+
+    def _sequence(self, message: RelayMessage) -> None:
+        """Give a message delivered to clients the next sequence number"""
+        self.last_seq += 1
+        message.seq = self.last_seq
+        self._history.append(message)
+
+    def _note_ack(self, client_id: str, seq: int) -> None:
+        """Remember that a sequenced client has every message up to `seq`"""
+        self._client_acks[client_id] = seq
+        self._client_acks.move_to_end(client_id)
+        if len(self._client_acks) > CLIENT_STATE_SIZE:
+            self._client_acks.popitem(last=False)
+
+    def _trim_history(self) -> None:
+        """Drop buffered messages every known sequenced client has acknowledged
+
+        Only those clients are ever replayed anything; one forgotten
+        since is served from replay_source.
+        """
+        self._trim_at = time.monotonic() + HISTORY_TRIM_INTERVAL
+        floor = min(self._client_acks.values())
+        while self._history and self._history[0].seq <= floor:
+            self._history.popleft()
+
+    def _replay(self, peer: _Peer, after: int) -> None:
+        """Queue the messages numbered after `after` for a reconnected client
+
+        Everything up to the current sequence number is replayed; newer
+        broadcasts stay held back until then so the client receives its
+        messages in order.
+        """
+        covered = self.last_seq
+        after = max(after, covered - MAX_REPLAY)
+        oldest = self._history[0].seq if self._history else covered + 1
+        recent = list(itertools.islice(self._history, max(0, after + 1 - oldest), None))
+        if after + 1 >= oldest or self.replay_source is None:
+            self._queue_replay(peer, recent, covered)
+            return
+
+        # Older messages come from replay_source, which may block on the
+        # database, so they are loaded off the event loop
+        if peer.held is None:
+            peer.held = []
+        self._handshaking.pop(peer.sock, None)
+        peer.replaying = True
+        if self._replay_pool is None:
+            self._replay_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ChatReplay")
+        accepts = peer.accepts
+
+        def load() -> None:
+            try:
+                rows = self.replay_source(after, oldest)
+            except Exception as e:
+                self.logger.output(f"Could not load messages to replay: {e}", "error", "System")
+                rows = []
+            older = []
+            for seq, text in rows:
+                message = RelayMessage.from_text(self.cipher, text, accepts)
+                message.seq = seq
+                older.append(message)
+            self._call_soon(lambda: self._queue_replay(peer, older + recent, covered))
+
+        self._replay_pool.submit(load)
+
+    def _queue_replay(self, peer: _Peer, messages: List[RelayMessage], covered: int) -> None:
+        peer.replaying = False
+        if peer.sock not in self.peers:
+            return
+        data = b''.join(self._encode(messages, peer.accepts, True))
+        if data:
+            _replayed.inc(len(messages))
+            self.logger.output(f"Replaying {len(messages)} message(s) to {peer.addr[0]}:{peer.addr[1]}",
+                               "system", "System")
+            self._queue_data(peer, data)
+        if peer.held is not None:
+            self._release_held(peer, covered)
+        if peer.held_ack is not None:
+            self._queue_data(peer, encode_ack(*peer.held_ack))
+            peer.held_ack = None
+
+    def _handle_link(self, peer: _Peer, frames) -> None:
+        """Pass complete messages from a server link on to local clients
+
+        Links carry messages already shown and recorded by the server
+        they came from, so they are not decrypted here.
+        """
+        relay = []
+        for frame in frames:
+            peer.relay.append(encode_frame(frame.payload, frame.kind, frame.flags))
+            if not frame.flags & FLAG_MORE:
+                message = RelayMessage(self.cipher, b''.join(peer.relay), frame.flags & FEATURE_FLAGS)
+                self._sequence(message)
+                relay.append(message)
+                peer.relay.clear()
+        if relay:
+            self._deliver(relay, exclude=peer, links=False)
+
+    def _relay(self, messages: List[RelayMessage], sender: Optional[_Peer] = None) -> None:
+        """Send one or more complete messages to everyone but their sender"""
+        self._deliver(messages, exclude=sender)
+
+    def _deliver(self, messages: List[RelayMessage], exclude: Optional[_Peer] = None,
+                 links: bool = True) -> None:
+        """Queue messages for every peer except `exclude`, encoded as each accepts"""
+        encoded: Dict[Tuple[int, bool], bytes] = {}
+        for peer in list(self.peers.values()):
+            if peer is exclude or (peer.is_link and not links):
+                continue
+            if peer.held is not None:
+                peer.held += messages
+                peer.held_bytes += sum(len(message.frames) for message in messages)
+                # While its replay loads, the client must wait for it
+                if (self.max_queue_bytes and peer.held_bytes > self.max_queue_bytes
+                        and not peer.replaying):
+                    # Let the queue's overflow policy deal with it
+                    self._end_handshake(peer)
+                continue
+            key = (peer.accepts, peer.sequenced)
+            data = encoded.get(key)
+            if data is None:
+                data = encoded[key] = b''.join(self._encode(messages, peer.accepts, peer.sequenced))
+            if data:
+                self._queue_data(peer, data)
+
+    @staticmethod
+    def _encode(messages: List[RelayMessage], accepts: int, sequenced: bool):
+        """Yield each message's frames for a peer, numbered if it is sequenced"""
+        for message in messages:
+            frames = message.encoded(accepts)
+            if frames and sequenced and message.seq is not None:
+                yield encode_seq(message.seq)
+            yield frames
+
+    def _is_open(self, peer: _Peer) -> bool:
+        return peer.sock in self.peers
+
+    def _close_connection(self, peer: _Peer) -> None:
+        self._close_peer(peer)
+
+    def _describe(self, peer: _Peer) -> str:
+        return f"client {peer.addr[0]}:{peer.addr[1]}"
+
+    def _unbounded(self, peer: _Peer) -> bool:
+        # Server links are never dropped or disconnected
+        return peer.is_link
+
+    def _close_peer(self, peer: _Peer, notify: bool = True) -> None:
+        if self.peers.pop(peer.sock, None) is None:
+            return
+        self._handshaking.pop(peer.sock, None)
+        if peer.is_link:
+            self._link_count -= 1
+        if peer.blocked or peer.sock in self._congested:
+            self._release(peer)
+        try:
+            self.selector.unregister(peer.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            peer.sock.close()
+        except OSError:
+            pass
+        if notify and not peer.is_link:
+            self.on_disconnect()
+
+    def send(self, message: str) -> bool:
+        """Broadcast encrypted message to all connected clients"""
+        if self.peers and self.running:
+            if self._congested:
+                self.logger.output(f"Send held back: {len(self._congested)} client(s) not keeping up", "error", "System")
+                return False
+            try:
+                # Encrypt once, queue for every peer on the loop thread;
+                # all fragments go out together so relayed messages cannot
+                # land between them
+                relay = RelayMessage.from_text(self.cipher, message, FEATURE_FLAGS)
+                self._call_soon(lambda: self._send_local(relay))
+                return True
+            except Exception as e:
+                self.logger.output(f"Send failed: {e}", "error", "System")
+                return False
+        return False
+
+    def _send_local(self, message: RelayMessage) -> None:
+        # Numbered on the loop thread, so sequence numbers follow wire order
+        self._sequence(message)
+        self.logger.output(message.text, "sent", "You", seq=message.seq)
+        self._relay([message])
+
+    def _close_sockets(self) -> None:
+        for sock in (self.server_socket, self._wakeup_r, self._wakeup_w):
+            if sock:
                 try:
-                    decrypted = self.cipher.decrypt(data)
-                except Exception:
-                    # Fallback: treat as plain text for backward compatibility
-                    decrypted = data.decode('utf-8')
-
-                # Show only chat content in the UI (no encrypted/base64 payload)
-                self.logger.output(decrypted, "received", f"Client({addr[0]})")
-                    
-        except Exception as e:
-            if self.running:
-                self.logger.output(f"Client error: {e}", "error", "System")
-        finally:
-            conn.close()
-            self.client_conn = None
-            self.on_disconnect()
-            
-    def send(self, message: str) -> bool:
-        """Send encrypted message to client"""
-        if self.client_conn and self.running:
-            try:
-                # Encrypt message
-                encrypted = self.cipher.encrypt(message)
-                self.client_conn.sendall(encrypted)
-                self.logger.output(message, "sent", "You")
-                return True
-            except Exception as e:
-                self.logger.output(f"Send failed: {e}", "error", "System")
-                return False
-        return False
-        
-    def stop(self) -> None:
-        """Stop the server"""
-        self.running = False
-        if self.client_conn:
-            try:
-                self.client_conn.close()
-            except:
-                pass
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-            except:
-                pass
-        self.logger.output("Server stopped", "system", "System")
-        
-    def set_encryption_key(self, key: str) -> None:
-        """Update encryption key"""
-        self.cipher.set_key(key)
+                    sock.close()
+                except OSError:
+                    pass
+        if self.selector:
+            try:
+                self.selector.close()
+            except Exception:
+                pass
+
+    def stop(self) -> None:
+        """Stop the server"""
+        if not self.running:
+            return
+        self.running = False
+        self._call_soon(lambda: None)
+        if self._loop_thread and self._loop_thread is not threading.current_thread():
+            self._loop_thread.join(timeout=2.0)
+        for gauge in (_clients, _queued_bytes, _max_queued_bytes):
+            gauge.remove(**self._metric_labels)
+        self.logger.output("Server stopped", "system", "System")
+
+    def set_encryption_key(self, key: str) -> None:
+        """Update encryption key"""
+        self.cipher.set_key(key)
         self.logger.output(f"Encryption key updated", "system", "System")
@@ -1,5 +1,7 @@
-# chat_app/utils/__init__.py
-from .logger import DualOutput, setup_logging
-from .crypto import XorCipher, set_global_key, get_cipher
-
-__all__ = ['DualOutput', 'setup_logging', 'XorCipher', 'set_global_key', 'get_cipher']
\ No newline at end of file
+# chat_app/utils/__init__.py
+from .logger import DualOutput, setup_logging
+from .crypto import XorCipher, XorStream, set_global_key, get_cipher
+from .metrics import REGISTRY, Registry, start_http_server
+
+__all__ = ['DualOutput', 'setup_logging', 'XorCipher', 'XorStream', 'set_global_key', 'get_cipher',
+           'REGISTRY', 'Registry', 'start_http_server']
\ No newline at end of file
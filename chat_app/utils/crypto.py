@@ -1,74 +1,284 @@
-# chat_app/utils/crypto.py
-"""
-XOR Encryption utilities for secure message transfer
-"""
-
-class XorCipher:
-    """Simple XOR cipher for message encryption/decryption"""
-    
-    def __init__(self, key: str = "default_key_123"):
-        self.key = key
-        self.key_bytes = key.encode('utf-8')
-        
-    def set_key(self, key: str) -> None:
-        """Update encryption key"""
-        self.key = key
-        self.key_bytes = key.encode('utf-8')
-        
-    def encrypt(self, plaintext: str) -> bytes:
-        """
-        Encrypt string using XOR with key
-        Returns base64 encoded bytes for safe transmission
-        """
-        plaintext_bytes = plaintext.encode('utf-8')
-        encrypted = bytearray()
-        
-        for i, byte in enumerate(plaintext_bytes):
-            key_byte = self.key_bytes[i % len(self.key_bytes)]
-            encrypted.append(byte ^ key_byte)
-            
-        # Convert to base64 for safe string transmission
-        import base64
-        return base64.b64encode(bytes(encrypted))
-    
-    def decrypt(self, encrypted_b64: bytes) -> str:
-        """
-        Decrypt base64 encoded XOR encrypted message
-        """
-        import base64
-        
-        try:
-            encrypted = base64.b64decode(encrypted_b64)
-            decrypted = bytearray()
-            
-            for i, byte in enumerate(encrypted):
-                key_byte = self.key_bytes[i % len(self.key_bytes)]
-                decrypted.append(byte ^ key_byte)
-                
-            return decrypted.decode('utf-8')
-        except Exception as e:
-            raise ValueError(f"Decryption failed: {e}")
-        
-    def encrypt_bytes(self, data: bytes) -> bytes:
-        """Raw XOR encryption without base64"""
-        encrypted = bytearray()
-        for i, byte in enumerate(data):
-            key_byte = self.key_bytes[i % len(self.key_bytes)]
-            encrypted.append(byte ^ key_byte)
-        return bytes(encrypted)
-    
-    def decrypt_bytes(self, data: bytes) -> bytes:
-        """Raw XOR decryption"""
-        return self.encrypt_bytes(data)  # XOR is symmetric
-
-
-# Global cipher instance (can be configured)
-_default_cipher = XorCipher()
-
-def set_global_key(key: str) -> None:
-    """Set global encryption key"""
-    _default_cipher.set_key(key)
-    
-def get_cipher() -> XorCipher:
-    """Get default cipher instance"""
-    return _default_cipher
\ No newline at end of file
+# chat_app/utils/crypto.py
+"""
+XOR Encryption utilities for secure message transfer
+"""
+
+import base64
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+from .metrics import REGISTRY
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# Keystreams up to this many bytes are cached and reused across calls
+KEYSTREAM_CACHE_LIMIT = 4 * 1024 * 1024
+
+# Total size of the keystream integers kept per cipher, one per key offset
+KEYSTREAM_INT_CACHE_BYTES = 8 * 1024 * 1024
+
+# Payloads at least this large use NumPy when it is installed
+NUMPY_THRESHOLD = 64 * 1024
+
+# Without NumPy, keys up to this long XOR payloads of at least this many
+# bytes per key byte one key position at a time, through translation tables
+TRANSLATE_MAX_KEY = 32
+TRANSLATE_BYTES_PER_KEY_BYTE = 4096
+
+_numpy = None
+_numpy_checked = False
+
+# Cover base64 (encrypt/decrypt) and raw (encrypt_bytes/decrypt_bytes,
+# so binary frames and stream chunks too) calls alike
+_encrypt_time = REGISTRY.histogram("chat_cipher_encrypt_seconds", "XorCipher encryption duration, base64 or raw")
+_decrypt_time = REGISTRY.histogram("chat_cipher_decrypt_seconds", "XorCipher decryption duration, base64 or raw")
+
+
+def _get_numpy():
+    """Import NumPy lazily so small-message users never pay its import cost"""
+    global _numpy, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = None
+        _numpy_checked = True
+    return _numpy
+
+
+class XorCipher:
+    """Simple XOR cipher for message encryption/decryption
+
+    Whole buffers are XOR'd against a cached repeated-key keystream, either
+    as single big integers or with NumPy for large payloads, so the work
+    happens in C rather than one Python-level iteration per byte. Without
+    NumPy, large payloads under short keys are instead run through a
+    256-byte translation table per key position, one strided slice each.
+    """
+
+    def __init__(self, key: str = "default_key_123"):
+        # Ciphers are shared between threads; guards the keystream integer LRU
+        self._ints_lock = threading.Lock()
+        self.set_key(key)
+
+    def set_key(self, key: str) -> None:
+        """Update encryption key"""
+        self.key = key
+        self.key_bytes = key.encode('utf-8')
+        # (span, repeated key bytes, LRU of {key offset: keystream integer of `span` bytes})
+        self._keystream_cache = (0, b'', OrderedDict())
+        # XOR translation table for each key position, built on first use
+        self._tables = None
+
+    def _keystream(self, length: int):
+        """Return the cached (span, stream, ints) triple covering `length` bytes"""
+        key_len = len(self.key_bytes)
+        if not key_len:
+            raise ValueError("Encryption key must not be empty")
+
+        cache = self._keystream_cache
+        if length > cache[0]:
+            span = max(4096, 1 << (length - 1).bit_length())
+            # Extra key length lets every start offset slice a full span
+            stream = self.key_bytes * (span // key_len + 2)
+            cache = (span, stream, OrderedDict())
+            if span <= KEYSTREAM_CACHE_LIMIT:
+                self._keystream_cache = cache
+        return cache
+
+    def transform(self, data: Buffer, offset: int = 0) -> memoryview:
+        """
+        XOR any bytes-like object with the keystream
+        `offset` is the keystream position of data[0]; returns a read-only memoryview
+        """
+        length = len(data)
+        if not length:
+            return memoryview(b'')
+        span, stream, ints = self._keystream(length)
+        key_len = len(self.key_bytes)
+        start = offset % key_len
+
+        if length >= NUMPY_THRESHOLD:
+            np = _get_numpy()
+            if np is not None:
+                keystream = np.frombuffer(stream, dtype=np.uint8, count=length, offset=start)
+                result = np.bitwise_xor(np.frombuffer(data, dtype=np.uint8), keystream)
+                return memoryview(result).toreadonly()
+
+        if key_len <= TRANSLATE_MAX_KEY and length >= key_len * TRANSLATE_BYTES_PER_KEY_BYTE:
+            return memoryview(self._translate(data, start)).toreadonly()
+
+        with self._ints_lock:
+            keystream = ints.get(start)
+            if keystream is not None:
+                ints.move_to_end(start)
+        if keystream is None:
+            keystream = int.from_bytes(stream[start:start + span], 'big')
+            with self._ints_lock:
+                ints[start] = keystream
+                # Streams walk through every key offset; keep only the recent ones
+                while len(ints) > max(1, KEYSTREAM_INT_CACHE_BYTES // span):
+                    ints.popitem(last=False)
+        if length < span:
+            # Dropping trailing bytes of a big-endian integer is a cheap shift
+            keystream >>= 8 * (span - length)
+        result = int.from_bytes(data, 'big') ^ keystream
+        return memoryview(result.to_bytes(length, 'big'))
+
+    def _translate(self, data: Buffer, start: int) -> bytearray:
+        """XOR every key_len-th byte at once with the table for its key byte"""
+        tables = self._tables
+        if tables is None:
+            tables = self._tables = [bytes(value ^ byte for value in range(256)) for byte in self.key_bytes]
+        step = len(tables)
+        result = bytearray(data)
+        for i in range(step):
+            result[i::step] = result[i::step].translate(tables[(start + i) % step])
+        return result
+
+    def transform_into(self, buffer: Union[bytearray, memoryview], offset: int = 0) -> None:
+        """XOR a writable buffer in place"""
+        if len(buffer):
+            buffer[:] = self.transform(buffer, offset)
+
+    def encrypt(self, plaintext: str) -> bytes:
+        """
+        Encrypt string using XOR with key
+        Returns base64 encoded bytes for safe transmission
+        """
+        start = time.perf_counter_ns()
+        encrypted = self.transform(plaintext.encode('utf-8'))
+        # Convert to base64 for safe string transmission
+        result = base64.b64encode(encrypted)
+        _encrypt_time.record(time.perf_counter_ns() - start)
+        return result
+
+    def decrypt(self, encrypted_b64: bytes) -> str:
+        """
+        Decrypt base64 encoded XOR encrypted message
+        """
+        start = time.perf_counter_ns()
+        try:
+            encrypted = base64.b64decode(encrypted_b64)
+            return str(self.transform(encrypted), 'utf-8')
+        except Exception as e:
+            raise ValueError(f"Decryption failed: {e}")
+        finally:
+            _decrypt_time.record(time.perf_counter_ns() - start)
+
+    def encrypt_bytes(self, data: Buffer, offset: int = 0) -> bytes:
+        """Raw XOR encryption without base64"""
+        start = time.perf_counter_ns()
+        result = self._transform_bytes(data, offset)
+        _encrypt_time.record(time.perf_counter_ns() - start)
+        return result
+
+    def decrypt_bytes(self, data: Buffer, offset: int = 0) -> bytes:
+        """Raw XOR decryption"""
+        start = time.perf_counter_ns()
+        result = self._transform_bytes(data, offset)  # XOR is symmetric
+        _decrypt_time.record(time.perf_counter_ns() - start)
+        return result
+
+    def _transform_bytes(self, data: Buffer, offset: int) -> bytes:
+        view = self.transform(data, offset)
+        return view.obj if type(view.obj) is bytes else view.tobytes()
+
+    def encryptor(self, encoding: str = "base64") -> 'XorStream':
+        """Create an incremental encryptor ('base64' or 'raw' output)"""
+        return XorStream(self, decrypt=False, encoding=encoding)
+
+    def decryptor(self, encoding: str = "base64") -> 'XorStream':
+        """Create an incremental decryptor ('base64' or 'raw' input)"""
+        return XorStream(self, decrypt=True, encoding=encoding)
+
+
+class XorStream:
+    """Incremental XOR encryptor/decryptor for chunked payloads
+
+    The keystream position carries over between update() calls, so a
+    payload fed in pieces produces exactly the same output as encrypting it
+    in one go. In base64 mode only complete 3-byte (encrypt) or 4-character
+    (decrypt) groups are emitted per call; finalize() flushes the rest,
+    padded or not.
+    """
+
+    def __init__(self, cipher: XorCipher, decrypt: bool = False, encoding: str = "base64",
+                 offset: int = 0):
+        if encoding not in ("base64", "raw"):
+            raise ValueError(f"Unsupported stream encoding: {encoding}")
+        self.cipher = cipher
+        self.decrypt = decrypt
+        self.encoding = encoding
+        self.position = offset
+        self._pending = b''
+        self._finalized = False
+
+    def update(self, chunk: Buffer) -> bytes:
+        """Process the next chunk and return whatever output is ready"""
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        if self.encoding == "raw":
+            return self._xor(chunk)
+        if self.decrypt:
+            return self._decode(chunk)
+        return self._encode(chunk)
+
+    def finalize(self) -> bytes:
+        """Flush buffered output; the stream cannot be updated afterwards"""
+        if self._finalized:
+            return b''
+        self._finalized = True
+        pending, self._pending = self._pending, b''
+        if not pending:
+            return b''
+        if self.decrypt:
+            try:
+                # Input without '=' padding ends in a short group
+                return self._xor(base64.b64decode(pending + b'=' * (-len(pending) % 4)))
+            except Exception as e:
+                raise ValueError(f"Decryption failed: {e}")
+        return base64.b64encode(pending)
+
+    def _xor(self, data: Buffer) -> bytes:
+        if self.decrypt:
+            result = self.cipher.decrypt_bytes(data, self.position)
+        else:
+            result = self.cipher.encrypt_bytes(data, self.position)
+        self.position += len(result)
+        return result
+
+    def _encode(self, chunk: Buffer) -> bytes:
+        encrypted = self._xor(chunk)
+        if self._pending:
+            encrypted = self._pending + encrypted
+        usable = len(encrypted) - len(encrypted) % 3
+        self._pending = encrypted[usable:]
+        if not usable:
+            return b''
+        return base64.b64encode(memoryview(encrypted)[:usable])
+
+    def _decode(self, chunk: Buffer) -> bytes:
+        data = self._pending + bytes(chunk) if self._pending else chunk
+        usable = len(data) - len(data) % 4
+        self._pending = bytes(data[usable:])
+        if not usable:
+            return b''
+        try:
+            return self._xor(base64.b64decode(memoryview(data)[:usable]))
+        except Exception as e:
+            raise ValueError(f"Decryption failed: {e}")
+
+
+# Global cipher instance (can be configured)
+_default_cipher = XorCipher()
+
+def set_global_key(key: str) -> None:
+    """Set global encryption key"""
+    _default_cipher.set_key(key)
+
+def get_cipher() -> XorCipher:
+    """Get default cipher instance"""
+    return _default_cipher
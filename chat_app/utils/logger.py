@@ -1,44 +1,58 @@
-# chat_app/utils/logger.py
-import sys
-import time
-from typing import Optional, Callable, Any
-
-class DualOutput:
-    """Helper class to output to both GUI and terminal"""
-    
-    def __init__(self, 
-                 gui_add_message_func: Callable[[str, str], None], 
-                 db_manager: Optional[Any] = None, 
-                 session_id: Optional[int] = None):
-        self.gui_add_message = gui_add_message_func
-        self.db_manager = db_manager
-        self.session_id = session_id
-        
-    def set_session(self, session_id: int) -> None:
-        """Set current session ID"""
-        self.session_id = session_id
-        
-    def output(self, text: str, msg_type: str = "system", sender: Optional[str] = None) -> None:
-        """Output to terminal, database, and GUI"""
-        # Print to terminal with timestamp
-        timestamp = time.strftime("%H:%M:%S")
-        prefix = {
-            "received": "[RECV]",
-            "sent": "[SENT]",
-            "error": "[ERROR]",
-            "system": "[INFO]"
-        }.get(msg_type, "[INFO]")
-        
-        print(f"[{timestamp}] {prefix} {text}")
-        sys.stdout.flush()  # Ensure immediate output
-        
-        # Save to database
-        if self.db_manager and self.session_id and sender:
-            self.db_manager.save_message(self.session_id, sender, text, msg_type)
-        
-        # Add to GUI queue
-        self.gui_add_message(text, msg_type)
-
-def setup_logging():
-    """Setup basic logging configuration"""
+# chat_app/utils/logger.py
+import sys
+import time
+from typing import Optional, Callable, Any, TextIO
+from .metrics import REGISTRY
+
+_output_time = REGISTRY.histogram("chat_log_output_seconds", "DualOutput.output duration")
+
+class DualOutput:
+    """Helper class to output to both GUI and terminal
+
+    Headless servers pass no GUI function and may log to a file instead
+    of stdout.
+    """
+    
+    def __init__(self, 
+                 gui_add_message_func: Optional[Callable[[str, str], None]], 
+                 db_manager: Optional[Any] = None, 
+                 session_id: Optional[int] = None,
+                 stream: Optional[TextIO] = None):
+        self.gui_add_message = gui_add_message_func
+        self.db_manager = db_manager
+        self.session_id = session_id
+        self.stream = stream
+        
+    def set_session(self, session_id: int) -> None:
+        """Set current session ID"""
+        self.session_id = session_id
+        
+    def output(self, text: str, msg_type: str = "system", sender: Optional[str] = None,
+               seq: Optional[int] = None) -> None:
+        """Output to terminal, database, and GUI; `seq` is the message's wire sequence number"""
+        start = time.perf_counter_ns()
+        # Print to terminal with timestamp
+        timestamp = time.strftime("%H:%M:%S")
+        prefix = {
+            "received": "[RECV]",
+            "sent": "[SENT]",
+            "error": "[ERROR]",
+            "system": "[INFO]"
+        }.get(msg_type, "[INFO]")
+        
+        stream = self.stream or sys.stdout
+        print(f"[{timestamp}] {prefix} {text}", file=stream)
+        stream.flush()  # Ensure immediate output
+        
+        # Queue for batched background persistence; never block on disk here
+        if self.db_manager and self.session_id and sender:
+            self.db_manager.enqueue_message(self.session_id, sender, text, msg_type, seq)
+        
+        # Add to GUI queue
+        if self.gui_add_message:
+            self.gui_add_message(text, msg_type)
+        _output_time.record(time.perf_counter_ns() - start)
+
+def setup_logging():
+    """Setup basic logging configuration"""
     pass  # Placeholder for future logging setup
\ No newline at end of file
@@ -0,0 +1,307 @@
+# chat_app/utils/metrics.py
+"""
+Lightweight in-process metrics
+
+Counters, gauges and latency histograms live in a Registry; the module
+level REGISTRY is the one the application instruments. Recording is a
+lock-protected integer update, cheap enough to leave on in production.
+
+Histograms record integer values (nanoseconds for timings) into
+HDR-style log-linear buckets: every power of two is split into
+2 ** SUB_BUCKET_BITS equal sub-buckets, so any recorded value is known to
+within about 6% while the bucket count stays small whatever the range.
+
+snapshot() returns plain data for logging or tests; to_prometheus()
+renders the Prometheus text format, which start_http_server() serves on
+a local port at /metrics.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+EXACT_LIMIT = SUB_BUCKETS << 1
+
+# Bucket bounds exported to Prometheus, in seconds
+PROMETHEUS_BOUNDS = tuple(base * 10.0 ** exp for exp in range(-6, 1) for base in (1, 2.5, 5)) + (10.0,)
+
+
+class Counter:
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Value that goes up and down, or is read from a callback when sampled
+
+    labels() returns a child gauge per set of label values, so several
+    owners in one process (two servers, say) can each export their own
+    series under the same name; remove() drops an owner's series.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = "", fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.value = 0
+        self._lock = threading.Lock()
+        self._children: Dict[str, "Gauge"] = {}
+
+    def labels(self, **labels: str) -> "Gauge":
+        """Child gauge for these label values, created on first use"""
+        key = _label_text(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = Gauge(self.name, self.help)
+            return child
+
+    def remove(self, **labels: str) -> None:
+        """Forget the child for these label values, and its callback"""
+        with self._lock:
+            self._children.pop(_label_text(labels), None)
+
+    def children(self) -> Dict[str, "Gauge"]:
+        """Children keyed by their labels as rendered for Prometheus"""
+        with self._lock:
+            return dict(self._children)
+
+    def set(self, value) -> None:
+        self.value = value
+
+    def inc(self, amount=1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, fn: Optional[Callable[[], float]]) -> None:
+        """Sample fn() instead of the stored value; None reverts to the value"""
+        self.fn = fn
+
+    def snapshot(self):
+        children = self.children()
+        if children:
+            return {labels: child.snapshot() for labels, child in children.items()}
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return None
+        return self.value
+
+
+def _label_text(labels: Dict[str, str]) -> str:
+    """Labels in exposition format: name="value" pairs sorted by name"""
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ",".join(f'{name}="{escape(value)}"' for name, value in sorted(labels.items()))
+
+
+def _bucket_index(value: int) -> int:
+    if value < EXACT_LIMIT:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+
+def _bucket_upper(index: int) -> int:
+    """Largest value that falls into a bucket"""
+    if index < EXACT_LIMIT:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    mantissa = index - (shift << SUB_BUCKET_BITS)
+    return ((mantissa + 1) << shift) - 1
+
+
+class Histogram:
+    """Log-linear histogram of non-negative integers (ns for timings)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", unit: float = 1e-9):
+        self.name = name
+        self.help = help
+        self.unit = unit  # multiplier from recorded integers to exported units
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._buckets: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, value: int) -> None:
+        index = _bucket_index(value)
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def time(self) -> "_Timer":
+        """Context manager recording the elapsed time of its block"""
+        return _Timer(self)
+
+    def percentile(self, percent: float) -> int:
+        """Upper bound of the bucket holding the given percentile"""
+        with self._lock:
+            buckets = sorted(self._buckets.items())
+            count, peak = self.count, self.max
+        if not count:
+            return 0
+        rank = max(1, int(percent / 100.0 * count + 0.5))
+        seen = 0
+        for index, bucket_count in buckets:
+            seen += bucket_count
+            if seen >= rank:
+                return min(_bucket_upper(index), peak)
+        return peak
+
+    def cumulative(self, bounds: Iterable[float]):
+        """(bound, count of values <= bound) pairs, bounds in exported units"""
+        with self._lock:
+            buckets = sorted(self._buckets.items())
+        result = []
+        seen = 0
+        position = 0
+        for bound in bounds:
+            limit = bound / self.unit
+            while position < len(buckets) and _bucket_upper(buckets[position][0]) <= limit:
+                seen += buckets[position][1]
+                position += 1
+            result.append((bound, seen))
+        return result
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.total * self.unit,
+            "max": self.max * self.unit,
+            "p50": self.percentile(50) * self.unit,
+            "p90": self.percentile(90) * self.unit,
+            "p99": self.percentile(99) * self.unit,
+            "p999": self.percentile(99.9) * self.unit,
+        }
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+        return False
+
+
+class Registry:
+    """Named collection of metrics; asking twice for a name returns the same metric"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "", fn: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._get(Gauge, name, help)
+        if fn is not None:
+            gauge.set_function(fn)
+        return gauge
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self._get(Histogram, name, help)
+
+    def snapshot(self) -> Dict[str, object]:
+        """Current value of every metric"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            children = metric.children() if isinstance(metric, Gauge) else None
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                for bound, count in metric.cumulative(PROMETHEUS_BOUNDS):
+                    lines.append(f'{metric.name}_bucket{{le="{bound:g}"}} {count}')
+                lines.append(f'{metric.name}_bucket{{le="+Inf"}} {metric.count}')
+                lines.append(f"{metric.name}_sum {metric.total * metric.unit:.9g}")
+                lines.append(f"{metric.name}_count {metric.count}")
+            elif children:
+                for labels, child in sorted(children.items()):
+                    value = child.snapshot()
+                    lines.append(f"{metric.name}{{{labels}}} {'NaN' if value is None else value}")
+            else:
+                value = metric.snapshot()
+                lines.append(f"{metric.name} {'NaN' if value is None else value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve registry.to_prometheus() at http://host:port/metrics from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the chat log
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="MetricsHTTP", daemon=True).start()
+    return server
@@ -0,0 +1,46 @@
+"""Pooled reader connections of ChatDatabase"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.database import ChatDatabase
+
+
+class ReaderPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = ChatDatabase(os.path.join(tmp.name, "chat.db"))
+        self.addCleanup(self.db.close)
+        self.session = self.db.create_session("server", "127.0.0.1", 5000)
+        self.db.save_message(self.session, "alice", "hello", "received")
+
+    def test_exited_threads_release_their_readers(self):
+        pooled = []
+
+        def read():
+            pooled.append(self.db._reader() is not None)
+            self.assertEqual(len(self.db.get_session_history(self.session)), 1)
+
+        for _ in range(3 * ChatDatabase.MAX_READERS):
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join()
+        self.assertTrue(all(pooled))
+        self.db.get_session_history(self.session)
+        self.assertEqual(list(self.db._readers), [threading.get_ident()])
+
+    def test_reads_after_close_reopen(self):
+        self.assertEqual(len(self.db.get_session_history(self.session)), 1)
+        self.db.close()
+        self.assertEqual(len(self.db.get_session_history(self.session)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
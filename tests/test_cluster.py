@@ -0,0 +1,83 @@
+"""ClusterHub overflow handling for a worker that stops reading"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.network import ClusterHub
+from chat_app.network.cluster import _bytes_dropped
+from chat_app.network.protocol import encode_frame
+
+QUEUE_LIMIT = 256 * 1024
+MESSAGES = 2000
+
+
+class _Logger:
+
+    def __init__(self):
+        self.lines = []
+
+    def output(self, text, kind="system", sender=None, **fields):
+        self.lines.append((kind, text))
+
+
+class ClusterHubTest(unittest.TestCase):
+
+    def run_hub(self, overflow: str):
+        """Relay from one worker to a fast and a stalled one; return the hub"""
+        logger = _Logger()
+        hub = ClusterHub(QUEUE_LIMIT, overflow, logger)
+        ends = []
+        for pid in (1, 2, 3):
+            hub_end, worker_end = socket.socketpair()
+            hub.add_worker(pid, hub_end)
+            ends.append(worker_end)
+            self.addCleanup(worker_end.close)
+        sender, fast, _ = ends
+        stop_r, stop_w = socket.socketpair()
+        self.addCleanup(stop_r.close)
+        self.addCleanup(stop_w.close)
+        thread = threading.Thread(target=hub.run, args=(stop_r,))
+        thread.start()
+
+        message = encode_frame(b'x' * 1000)
+        received = [0]
+
+        def drain():
+            while received[0] < MESSAGES * len(message):
+                data = fast.recv(65536)
+                if not data:
+                    break
+                received[0] += len(data)
+
+        reader = threading.Thread(target=drain, daemon=True)
+        reader.start()
+        sender.sendall(message * MESSAGES)
+        reader.join(5.0)
+        self.assertEqual(received[0], MESSAGES * len(message))
+        time.sleep(0.1)
+        stop_w.send(b'x')
+        thread.join()
+        self.addCleanup(hub.close)
+        return hub, logger
+
+    def test_drop_oldest_counts_dropped_bytes(self):
+        before = _bytes_dropped.value
+        hub, _ = self.run_hub('drop_oldest')
+        stalled = [worker for worker in hub.workers.values() if worker.pid == 3][0]
+        self.assertLessEqual(stalled.queued, QUEUE_LIMIT)
+        self.assertGreater(_bytes_dropped.value - before, 0)
+
+    def test_disconnect_is_logged(self):
+        hub, logger = self.run_hub('disconnect')
+        self.assertEqual(sorted(worker.pid for worker in hub.workers.values()), [1, 2])
+        self.assertEqual([kind for kind, text in logger.lines if "worker 3" in text], ["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+"""XorCipher against the original per-byte loop, and XorStream chunking"""
+
+import base64
+import os
+import random
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.utils import crypto
+from chat_app.utils.crypto import XorCipher
+
+KEYS = ["k", "abcd", "default_key_123", "a key of thirty-two bytes long!!", "é" * 40, "x" * 300]
+SIZES = [1, 2, 3, 17, 4095, 4096, 4097, 70000, 200000]
+
+
+def reference(key: bytes, data: bytes, offset: int = 0) -> bytes:
+    """The cipher as it was: one Python-level XOR per byte"""
+    return bytes(byte ^ key[(offset + i) % len(key)] for i, byte in enumerate(data))
+
+
+class TransformTest(unittest.TestCase):
+
+    def test_matches_reference_loop(self):
+        rng = random.Random(1)
+        for key in KEYS:
+            cipher = XorCipher(key)
+            for size in SIZES:
+                data = rng.randbytes(size)
+                for offset in (0, 1, len(cipher.key_bytes) - 1, len(cipher.key_bytes) + 5, 123457):
+                    with self.subTest(key_len=len(cipher.key_bytes), size=size, offset=offset):
+                        expected = reference(cipher.key_bytes, data, offset)
+                        self.assertEqual(bytes(cipher.transform(data, offset)), expected)
+                        self.assertEqual(cipher.encrypt_bytes(memoryview(data), offset), expected)
+
+    def test_every_path_matches_reference_loop(self):
+        data = random.Random(2).randbytes(150000)
+        for key in ("abcd", "default_key_123"):
+            cipher = XorCipher(key)
+            expected = reference(cipher.key_bytes, data, 7)
+            # Big integers, translation tables and NumPy (when installed)
+            for patches in ({'TRANSLATE_MAX_KEY': 0, 'NUMPY_THRESHOLD': 1 << 30},
+                            {'NUMPY_THRESHOLD': 1 << 30},
+                            {'NUMPY_THRESHOLD': crypto.NUMPY_THRESHOLD}):
+                with self.subTest(key=key, **patches), mock.patch.multiple(crypto, **patches):
+                    self.assertEqual(bytes(cipher.transform(data, 7)), expected)
+
+    def test_base64_api(self):
+        cipher = XorCipher("default_key_123")
+        text = "héllo wörld 中文 \U0001f600 " * 50
+        encrypted = cipher.encrypt(text)
+        self.assertEqual(encrypted, base64.b64encode(reference(cipher.key_bytes, text.encode())))
+        self.assertEqual(cipher.decrypt(encrypted), text)
+        self.assertEqual(cipher.encrypt(""), b"")
+        with self.assertRaises(ValueError):
+            cipher.decrypt(b"abc")  # bad padding
+
+    def test_transform_into_and_views(self):
+        cipher = XorCipher("default_key_123")
+        data = bytearray(os.urandom(5000))
+        original = bytes(data)
+        cipher.transform_into(memoryview(data)[100:], 100)
+        self.assertEqual(bytes(data), original[:100] + reference(cipher.key_bytes, original, 0)[100:])
+        self.assertTrue(cipher.transform(b"abc").readonly)
+
+    def test_set_key_drops_cached_keystreams(self):
+        cipher = XorCipher("first")
+        data = os.urandom(100000)
+        cipher.transform(data, 3)
+        cipher.set_key("second key")
+        self.assertEqual(bytes(cipher.transform(data, 3)), reference(b"second key", data, 3))
+
+    def test_empty_key_is_rejected(self):
+        with self.assertRaises(ValueError):
+            XorCipher("").encrypt_bytes(b"data")
+
+
+class XorStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cipher = XorCipher("stream_key_17_byte")
+        self.rng = random.Random(4)
+
+    def chunks(self, data: bytes):
+        """Split data at random points, including empty chunks"""
+        offset = 0
+        while offset < len(data):
+            size = self.rng.choice((0, 1, 2, 3, 4, 5, self.rng.randint(1, 5000)))
+            yield data[offset:offset + size]
+            offset += size
+
+    def stream(self, xor_stream, data: bytes) -> bytes:
+        return b''.join(xor_stream.update(chunk) for chunk in self.chunks(data)) + xor_stream.finalize()
+
+    def test_chunked_matches_one_shot(self):
+        for size in (0, 1, 2, 3, 4, 100, 4097, 70001, 150002):
+            data = self.rng.randbytes(size)
+            raw = self.cipher.encrypt_bytes(data)
+            encoded = base64.b64encode(raw)
+            with self.subTest(size=size):
+                self.assertEqual(self.stream(self.cipher.encryptor('raw'), data), raw)
+                self.assertEqual(self.stream(self.cipher.decryptor('raw'), raw), data)
+                self.assertEqual(self.stream(self.cipher.encryptor('base64'), data), encoded)
+                self.assertEqual(self.stream(self.cipher.decryptor('base64'), encoded), data)
+
+    def test_finalize_flushes_encrypt_remainder(self):
+        for extra in (1, 2):
+            data = self.rng.randbytes(300 + extra)
+            encryptor = self.cipher.encryptor()
+            head = encryptor.update(data)
+            self.assertEqual(len(head), 400)  # 300 bytes in complete groups, `extra` held back
+            tail = encryptor.finalize()
+            self.assertEqual(tail, base64.b64encode(self.cipher.encrypt_bytes(data))[400:])
+            self.assertTrue(tail.endswith(b'=' * (3 - extra)))
+
+    def test_finalize_flushes_decrypt_remainder(self):
+        data = self.rng.randbytes(302)
+        encoded = base64.b64encode(self.cipher.encrypt_bytes(data))
+        for cut in (1, 2, 3):
+            decryptor = self.cipher.decryptor()
+            head = decryptor.update(encoded[:-cut])
+            self.assertEqual(head, data[:len(head)])
+            self.assertEqual(head + decryptor.update(encoded[-cut:]) + decryptor.finalize(), data)
+        for extra in (1, 2):
+            # Unpadded input leaves 2 or 3 characters for finalize()
+            unpadded = base64.b64encode(self.cipher.encrypt_bytes(data[:300 + extra])).rstrip(b'=')
+            decryptor = self.cipher.decryptor()
+            head = decryptor.update(unpadded)
+            self.assertEqual(len(head), 300)
+            self.assertEqual(head + decryptor.finalize(), data[:300 + extra])
+
+    def test_truncated_input_fails_on_finalize(self):
+        decryptor = self.cipher.decryptor()
+        decryptor.update(base64.b64encode(b'abcdef')[:5])
+        with self.assertRaises(ValueError):
+            decryptor.finalize()
+
+    def test_update_after_finalize_raises(self):
+        for encoding in ('base64', 'raw'):
+            for xor_stream in (self.cipher.encryptor(encoding), self.cipher.decryptor(encoding)):
+                with self.subTest(encoding=encoding, decrypt=xor_stream.decrypt):
+                    xor_stream.update(b'QUJD')
+                    xor_stream.finalize()
+                    with self.assertRaises(ValueError):
+                        xor_stream.update(b'QUJD')
+                    self.assertEqual(xor_stream.finalize(), b'')
+
+    def test_rejects_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            self.cipher.encryptor('hex')
+
+
+class SharedCipherTest(unittest.TestCase):
+
+    @mock.patch.object(crypto, 'KEYSTREAM_INT_CACHE_BYTES', 4 * 4096)
+    @mock.patch.object(crypto, 'TRANSLATE_MAX_KEY', 0)
+    def test_threads_sharing_the_keystream_lru(self):
+        # A 4-entry LRU walked at every key offset by 8 threads at once
+        cipher = XorCipher("a shared key of 23 bytes")
+        key = cipher.key_bytes
+        failures = []
+
+        def work(seed: int):
+            rng = random.Random(seed)
+            try:
+                for _ in range(300):
+                    data = rng.randbytes(rng.choice((10, 1000, 4096)))
+                    offset = rng.randrange(10000)
+                    if bytes(cipher.transform(data, offset)) != reference(key, data, offset):
+                        failures.append((len(data), offset))
+            except Exception as e:
+                failures.append(repr(e))
+
+        threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+        self.assertLessEqual(len(cipher._keystream_cache[2]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""MessageWriter overflow and failed batches"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.database import MessageWriter
+
+
+class _Database:
+    """Stands in for ChatDatabase, rejecting any batch holding a "bad" row"""
+
+    def __init__(self):
+        self.rows = []
+        self.batches = 0
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def save_messages(self, rows):
+        self.unblocked.wait()
+        rows = list(rows)
+        self.batches += 1
+        if any(row[2] == "bad" for row in rows):
+            raise ValueError("bad row")
+        self.rows.extend(rows)
+
+
+class MessageWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = _Database()
+
+    def writer(self, **options) -> MessageWriter:
+        writer = MessageWriter(self.db, **options)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        writer = self.writer(batch_size=1, max_queue=5)
+        self.db.unblocked.clear()  # a disk that has stalled
+        start = time.monotonic()
+        accepted = [writer.enqueue(1, "alice", f"message {i}", "received") for i in range(50)]
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertFalse(all(accepted))
+        self.assertGreaterEqual(sum(accepted), 5)
+
+        self.db.unblocked.set()
+        writer.flush()
+        self.assertEqual([row[2] for row in self.db.rows],
+                         [f"message {i}" for i, ok in enumerate(accepted) if ok])
+
+    def test_bad_row_costs_only_itself(self):
+        writer = self.writer(batch_size=256, flush_interval=10)
+        messages = [f"message {i}" for i in range(100)]
+        messages[40] = "bad"
+        for message in messages:
+            self.assertTrue(writer.enqueue(1, "alice", message, "received"))
+        writer.flush()
+        self.assertEqual([row[2] for row in self.db.rows], [m for m in messages if m != "bad"])
+        self.assertEqual(self.db.batches, 1 + len(messages))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Labelled gauges, and servers sharing the process registry"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.network import ChatServer
+from chat_app.utils.metrics import REGISTRY, Registry
+
+
+class _Logger:
+
+    def output(self, text, kind="system", sender=None, **fields):
+        pass
+
+
+class LabelledGaugeTest(unittest.TestCase):
+
+    def test_children_export_their_own_series(self):
+        registry = Registry()
+        gauge = registry.gauge("workers", "Busy workers")
+        gauge.labels(pool="a").set(3)
+        gauge.labels(pool='b"c').set_function(lambda: 5)
+        self.assertEqual(registry.snapshot()["workers"], {'pool="a"': 3, 'pool="b\\"c"': 5})
+        self.assertIn('workers{pool="a"} 3\n', registry.to_prometheus())
+
+        gauge.remove(pool="a")
+        gauge.remove(pool='b"c')
+        self.assertEqual(registry.snapshot()["workers"], 0)
+
+
+class ServerGaugeTest(unittest.TestCase):
+
+    def start_server(self) -> ChatServer:
+        server = ChatServer("127.0.0.1", 0, _Logger(), lambda addr: None, lambda: None, None)
+        self.assertTrue(server.start())
+        self.addCleanup(server.stop)
+        return server
+
+    def test_each_server_has_its_own_series_until_stopped(self):
+        clients = REGISTRY.gauge("chat_server_clients")
+        first, second = self.start_server(), self.start_server()
+        labels = [f'server="127.0.0.1:{server.server_socket.getsockname()[1]}"' for server in (first, second)]
+        self.assertEqual({label: clients.children()[label].snapshot() for label in labels},
+                         dict.fromkeys(labels, 0))
+
+        first.stop()
+        self.assertNotIn(labels[0], clients.children())
+        self.assertIn(labels[1], clients.children())
+
+
+if __name__ == "__main__":
+    unittest.main()
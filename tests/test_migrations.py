@@ -0,0 +1,81 @@
+"""Schema migrations when several processes open a new database at once"""
+
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.database import ChatDatabase, chat_db
+from chat_app.database.migrations import SCHEMA_VERSION, migrate
+
+PROCESSES = 4
+ROUNDS = 10
+
+
+def _open(db_file, barrier, errors):
+    barrier.wait()
+    try:
+        ChatDatabase(db_file).close()
+    except Exception as e:
+        errors.put(repr(e))
+
+
+class ConcurrentMigrationTest(unittest.TestCase):
+
+    def test_processes_opening_a_new_database_together(self):
+        context = multiprocessing.get_context("spawn")
+        errors = context.Queue()
+        with tempfile.TemporaryDirectory() as tmp:
+            for round_ in range(ROUNDS):
+                db_file = os.path.join(tmp, f"fresh{round_}.db")
+                barrier = context.Barrier(PROCESSES)
+                workers = [context.Process(target=_open, args=(db_file, barrier, errors))
+                           for _ in range(PROCESSES)]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join(60)
+                    self.assertEqual(worker.exitcode, 0)
+                self.assertTrue(errors.empty(), errors.get() if not errors.empty() else "")
+
+                conn = sqlite3.connect(db_file)
+                try:
+                    self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], SCHEMA_VERSION)
+                    columns = [row[1] for row in conn.execute('PRAGMA table_info(chat_messages)')]
+                    self.assertEqual(columns.count('seq'), 1)
+                finally:
+                    conn.close()
+
+    def test_migrate_is_idempotent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, "chat.db"))
+            try:
+                self.assertEqual(migrate(conn), SCHEMA_VERSION)
+                self.assertEqual(migrate(conn), SCHEMA_VERSION)
+            finally:
+                conn.close()
+
+
+class HistoryIndexTest(unittest.TestCase):
+
+    def test_history_queries_are_covered(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ChatDatabase(os.path.join(tmp, "chat.db"))
+            try:
+                for name in ('SESSION_HISTORY_SQL', 'HISTORY_PAGE_FIRST_SQL', 'HISTORY_PAGE_AFTER_SQL',
+                             'HISTORY_PAGE_LAST_SQL', 'HISTORY_PAGE_BEFORE_SQL'):
+                    sql = getattr(chat_db, name)
+                    plan = db._writer.execute('EXPLAIN QUERY PLAN ' + sql, (1,) * sql.count('?')).fetchall()
+                    with self.subTest(query=name):
+                        self.assertIn('USING COVERING INDEX idx_chat_messages_session_history', plan[0][3])
+                        self.assertNotIn('TEMP B-TREE', ' '.join(row[3] for row in plan))
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
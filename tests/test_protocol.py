@@ -0,0 +1,279 @@
+"""Wire framing, message assembly and a relay through a live server"""
+
+import os
+import queue
+import random
+import socket
+import sys
+import time
+import unittest
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_app.network import ChatClient, ChatServer
+from chat_app.network.protocol import (FLAG_BINARY, FLAG_COMPRESSED, FLAG_MORE, HEADER_SIZE, KIND_MESSAGE,
+                                       MAX_FRAME_SIZE, FrameDecoder, FrameError, MessageAssembler,
+                                       encode_frame, encode_hello, iter_message_frames)
+from chat_app.utils.crypto import XorCipher
+
+TIMEOUT = 5.0
+
+
+def _frames(data: bytes):
+    return FrameDecoder().feed(data)
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.payloads = [b'', b'a', b'hello', os.urandom(5000), b'x' * 70000]
+        self.stream = b''.join(encode_frame(payload, KIND_MESSAGE, i) for i, payload in enumerate(self.payloads))
+
+    def test_byte_by_byte(self):
+        decoder = FrameDecoder()
+        frames = []
+        for i in range(len(self.stream)):
+            frames.extend(decoder.feed(self.stream[i:i + 1]))
+        self.assertEqual([frame.payload for frame in frames], self.payloads)
+        self.assertEqual([frame.flags for frame in frames], list(range(len(self.payloads))))
+        self.assertEqual(decoder.pending, 0)
+
+    def test_random_chunk_boundaries(self):
+        rng = random.Random(2)
+        for _ in range(50):
+            decoder = FrameDecoder()
+            frames = []
+            offset = 0
+            while offset < len(self.stream):
+                size = rng.randint(1, 9000)
+                frames.extend(decoder.feed(self.stream[offset:offset + size]))
+                offset += size
+            self.assertEqual([frame.payload for frame in frames], self.payloads)
+
+    def test_pipelined_frames_in_one_chunk(self):
+        self.assertEqual([frame.payload for frame in _frames(self.stream)], self.payloads)
+
+    def test_partial_header_stays_pending(self):
+        decoder = FrameDecoder()
+        self.assertEqual(decoder.feed(self.stream[:HEADER_SIZE - 1]), [])
+        self.assertEqual(decoder.pending, HEADER_SIZE - 1)
+        decoder.reset()
+        self.assertEqual(decoder.pending, 0)
+
+    def test_rejects_oversized_frames(self):
+        decoder = FrameDecoder(max_frame_size=1024)
+        self.assertEqual(len(decoder.feed(encode_frame(b'y' * 1024))), 1)
+        with self.assertRaises(FrameError):
+            # Rejected from the header alone, before the payload arrives
+            decoder.feed(encode_frame(b'y' * 1025)[:HEADER_SIZE])
+
+    def test_encode_rejects_oversized_payloads(self):
+        with self.assertRaises(FrameError):
+            encode_frame(bytes(MAX_FRAME_SIZE + 1))
+
+
+class MessageAssemblerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cipher = XorCipher("protocol_test_key")
+
+    def roundtrip(self, message: str, chunk_size: int, compress: bool = False, binary: bool = False):
+        wire = b''.join(iter_message_frames(self.cipher, message, chunk_size, compress, binary))
+        frames = _frames(wire)
+        assembler = MessageAssembler(self.cipher)
+        results = [assembler.feed(frame) for frame in frames]
+        self.assertEqual(results[:-1], [None] * (len(frames) - 1))
+        self.assertEqual(results[-1], message)
+        return frames
+
+    def test_single_frame(self):
+        frames = self.roundtrip("hello there", 48)
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0].flags, 0)
+
+    def test_reassembles_fragments(self):
+        message = ''.join(random.Random(3).choice('abé中\U0001f600') for _ in range(5000))
+        frames = self.roundtrip(message, 48)
+        self.assertGreater(len(frames), 2)
+        self.assertTrue(all(frame.flags & FLAG_MORE for frame in frames[:-1]))
+        self.assertFalse(frames[-1].flags & FLAG_MORE)
+
+    def test_compressed_and_binary_roundtrips(self):
+        text = "2025-01-01T00:00:00Z INFO Thanks! I think that we should do it. " * 200
+        for binary in (False, True):
+            for chunk_size in (48 * 1024, 999):
+                with self.subTest(binary=binary, chunk_size=chunk_size):
+                    frames = self.roundtrip(text, chunk_size, compress=True, binary=binary)
+                    self.assertTrue(all(frame.flags & FLAG_COMPRESSED for frame in frames))
+                    self.assertEqual(all(frame.flags & FLAG_BINARY for frame in frames), binary)
+                    self.assertLess(sum(len(frame.payload) for frame in frames), len(text))
+                with self.subTest(binary=binary, chunk_size=chunk_size, compress=False):
+                    self.roundtrip(text, chunk_size, binary=binary)
+
+    def test_short_messages_are_not_compressed(self):
+        frames = self.roundtrip("too short to deflate", 48 * 1024, compress=True, binary=True)
+        self.assertEqual(frames[0].flags, FLAG_BINARY)
+
+    def test_rejects_oversized_messages(self):
+        assembler = MessageAssembler(self.cipher, max_message_size=1000)
+        with self.assertRaises(FrameError):
+            for frame in _frames(b''.join(iter_message_frames(self.cipher, 'z' * 3000, 300))):
+                assembler.feed(frame)
+        # The assembler starts over with the next message
+        self.assertEqual(assembler.feed(_frames(encode_frame(self.cipher.encrypt("ok")))[0]), "ok")
+
+    def test_rejects_inflation_past_the_limit(self):
+        assembler = MessageAssembler(self.cipher, max_message_size=10000)
+        wire = b''.join(iter_message_frames(self.cipher, 'a' * 100000, compress=True))
+        with self.assertRaises(FrameError):
+            for frame in _frames(wire):
+                assembler.feed(frame)
+
+    def test_undecryptable_payload_raises(self):
+        with self.assertRaises(ValueError):
+            MessageAssembler(self.cipher).feed(_frames(encode_frame(b'not base64!'))[0])
+
+
+class _Logger:
+    """Collects received messages so a test can wait for them"""
+
+    def __init__(self):
+        self.received = queue.Queue()
+        self.rows = {}  # seq -> text, as a database would record them
+
+    def output(self, text, kind="system", sender=None, seq=None, **fields):
+        if kind == "received":
+            self.received.put(text)
+        if seq is not None:
+            self.rows[seq] = text
+
+
+class RelayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cipher = XorCipher("relay_test_key")
+        self.server = ChatServer("127.0.0.1", 0, _Logger(), lambda addr: None, lambda: None, None,
+                                 cipher=self.cipher)
+        self.assertTrue(self.server.start())
+        self.addCleanup(self.server.stop)
+        self.port = self.server.server_socket.getsockname()[1]
+
+    def connect(self, **options):
+        logger = _Logger()
+        client = ChatClient("127.0.0.1", self.port, logger, lambda: None, lambda: None, None,
+                            cipher=self.cipher, **options)
+        self.assertTrue(client.connect())
+        self.addCleanup(client.disconnect)
+        return client, logger
+
+    def wait_for_clients(self, count: int):
+        deadline = time.monotonic() + TIMEOUT
+        while self.server.client_count < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.server.client_count, count)
+
+    def test_messages_are_relayed_in_order(self):
+        sender, _ = self.connect()
+        _, plain = self.connect()
+        _, sequenced = self.connect(reconnect=True)
+        self.wait_for_clients(3)
+
+        messages = [f"message {i}" for i in range(200)]
+        messages.append("big " + "0123456789abcdef" * 20000)  # fragmented on the wire
+        messages.append("after the big one")
+        for message in messages:
+            self.assertTrue(sender.send(message))
+
+        for logger in (plain, sequenced):
+            received = [logger.received.get(timeout=TIMEOUT) for _ in messages]
+            self.assertEqual(received, messages)
+
+
+    def test_client_acks_trim_the_replay_buffer(self):
+        _, plain = self.connect()
+        client, sequenced = self.connect(reconnect=True)
+        self.wait_for_clients(2)
+        for i in range(100):
+            self.assertTrue(self.server.send(f"message {i}"))
+        for logger in (plain, sequenced):
+            for _ in range(100):
+                logger.received.get(timeout=TIMEOUT)
+
+        deadline = time.monotonic() + TIMEOUT
+        while self.server._client_acks.get(client.client_id, 0) < 96 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.server._client_acks[client.client_id], 96)  # every ACK_EVERY messages
+        while self.server._history and self.server._history[0].seq <= 96 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual([message.seq for message in self.server._history], [97, 98, 99, 100])
+
+
+class ReplayTest(unittest.TestCase):
+
+    def replay_after_lost_acks(self, buffer_size: int):
+        """Reconnect a client claiming to have seen nothing; return what it is replayed"""
+        cipher = XorCipher("replay_test_key")
+        logger = _Logger()
+        server = ChatServer("127.0.0.1", 0, logger, lambda addr: None, lambda: None, None, cipher=cipher,
+                            replay_source=lambda after, before: [(seq, text) for seq, text in
+                                                                 sorted(logger.rows.items()) if after < seq < before])
+        self.assertTrue(server.start())
+        self.addCleanup(server.stop)
+        server._history = deque(maxlen=buffer_size)
+        port = server.server_socket.getsockname()[1]
+        clients = []
+        for reconnect in (True, False):
+            client_logger = _Logger()
+            client = ChatClient("127.0.0.1", port, client_logger, lambda: None, lambda: None, None,
+                                cipher=cipher, reconnect=reconnect)
+            self.assertTrue(client.connect())
+            self.addCleanup(client.disconnect)
+            clients.append((client, client_logger))
+        (client, received), (other, _) = clients
+        while server.client_count < 2:
+            time.sleep(0.01)
+
+        self.assertTrue(client.send("mine"))
+        self.assertEqual(logger.received.get(timeout=TIMEOUT), "mine")
+        self.assertTrue(other.send("theirs"))
+        self.assertEqual(received.received.get(timeout=TIMEOUT), "theirs")
+        with client._send_lock:
+            client.last_seq = 0
+        client.client_socket.shutdown(socket.SHUT_RDWR)
+        return [received.received.get(timeout=TIMEOUT) for _ in range(2)]
+
+    def test_own_messages_are_replayed_from_the_ring_buffer(self):
+        self.assertEqual(self.replay_after_lost_acks(100), ["mine", "theirs"])
+
+    def test_own_messages_are_replayed_from_replay_source(self):
+        self.assertEqual(self.replay_after_lost_acks(1), ["mine", "theirs"])
+
+
+class UnacknowledgedSendTest(unittest.TestCase):
+
+    def test_send_fails_once_the_unacked_limit_is_reached(self):
+        # A server that agrees to sequencing but never acknowledges anything
+        listener = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(listener.close)
+        logger = _Logger()
+        errors = []
+        logger.output = lambda text, kind="system", *args, **fields: errors.append(text) if kind == "error" else None
+        client = ChatClient("127.0.0.1", listener.getsockname()[1], logger, lambda: None, lambda: None, None,
+                            reconnect=True, offline_queue_size=3)
+        self.assertTrue(client.connect())
+        self.addCleanup(client.disconnect)
+        conn, _ = listener.accept()
+        self.addCleanup(conn.close)
+        conn.sendall(encode_hello(seq=True, epoch="e", last_seq=0))
+        deadline = time.monotonic() + TIMEOUT
+        while not client.sequenced and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual([client.send(f"message {i}") for i in range(5)], [True, True, True, False, False])
+        self.assertEqual([message for _, message in client._unacked], ["message 0", "message 1", "message 2"])
+        self.assertEqual(len(errors), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()